@@ -1,13 +1,18 @@
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Depends, BackgroundTasks
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Depends, Query
+from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 from typing import List, Dict, Any, Optional
 import os
+import json
 import shutil
-from pydantic import BaseModel
+import uuid
+from pydantic import BaseModel, Field
 
 from app.core.config import settings
 from app.services.rag_service import rag_service
 from app.services.conversation import conversation_service
+from app.services.vector_store import vector_store, make_filters
+from app.services.job_queue import JobQueueFullError
 
 router = APIRouter()
 
@@ -16,6 +21,12 @@ class QueryRequest(BaseModel):
     query: str
     session_id: str
     top_k: int = 3
+    use_cache: bool = True
+    # Weight of BM25 results in hybrid search: 0 = dense only, 1 = lexical only
+    lexical_weight: Optional[float] = Field(None, ge=0.0, le=1.0)
+    # Restrict retrieval to these source file names and/or document types ("pdf", "docx", "txt")
+    sources: Optional[List[str]] = None
+    doc_types: Optional[List[str]] = None
 
 class QueryResponse(BaseModel):
     """Response model for RAG queries."""
@@ -23,6 +34,32 @@ class QueryResponse(BaseModel):
     contextualized_query: str
     response: str
     sources: List[Dict[str, Any]]
+    cached: bool = False
+
+class BatchQueryRequest(BaseModel):
+    """Request model for answering many independent questions at once."""
+    queries: List[str] = Field(..., min_length=1)
+    top_k: int = 3
+    use_cache: bool = True
+    # Weight of BM25 results in hybrid search: 0 = dense only, 1 = lexical only
+    lexical_weight: Optional[float] = Field(None, ge=0.0, le=1.0)
+    # Restrict retrieval to these source file names and/or document types ("pdf", "docx", "txt")
+    sources: Optional[List[str]] = None
+    doc_types: Optional[List[str]] = None
+    # Answers generated at once, defaults to BATCH_QUERY_MAX_CONCURRENCY
+    max_concurrency: Optional[int] = Field(None, ge=1)
+
+class BatchQueryResult(BaseModel):
+    """Result for one question of a batch query."""
+    query: str
+    response: str
+    sources: List[Dict[str, Any]]
+    cached: bool = False
+    error: Optional[str] = None
+
+class BatchQueryResponse(BaseModel):
+    """Response model for batch queries, in the order of the request."""
+    results: List[BatchQueryResult]
 
 class SessionResponse(BaseModel):
     """Response model for session creation."""
@@ -30,75 +67,169 @@ class SessionResponse(BaseModel):
 
 class MatchRequest(BaseModel):
     """Request model for matching profiles to SOW."""
-    profile_ids: List[str]
+    # Profiles to rank; omit to rank every indexed profile
+    profile_ids: Optional[List[str]] = None
     sow_id: str
+    # Number of matches to return (default: all listed profiles, or PROFILE_MATCH_TOP_K)
+    top_k: Optional[int] = Field(None, ge=1)
 
 class MatchResponse(BaseModel):
     """Response model for profile matching."""
     matches: List[Dict[str, Any]]
 
+class ProfileIndexRequest(BaseModel):
+    """Request model for indexing uploaded documents as profiles."""
+    profile_ids: List[str] = Field(..., min_length=1)
+
 class DocumentResponse(BaseModel):
     """Response model for document processing."""
     success: bool
     message: str
     document_id: Optional[str] = None
+    # Ingestion job of an upload, see GET /jobs/{job_id}
+    job_id: Optional[str] = None
+
+class JobResponse(BaseModel):
+    """Response model for an ingestion job."""
+    id: str
+    document_id: str
+    # queued, running, succeeded or failed
+    status: str
+    # queued, parsing, chunking, embedding, upserting or done
+    stage: str
+    # Chunks read and upserted so far
+    chunks: int
+    stored: int
+    error: Optional[str] = None
+    attempts: int
+    # Unix timestamps
+    created_at: float
+    started_at: Optional[float] = None
+    updated_at: float
+    finished_at: Optional[float] = None
+
+class JobListResponse(BaseModel):
+    """Response model for listing ingestion jobs."""
+    jobs: List[JobResponse]
+    # Number of jobs per status
+    counts: Dict[str, int]
+
+def save_upload(file: UploadFile, file_path: str) -> None:
+    """Copy an uploaded file to disk."""
+    with open(file_path, "wb") as buffer:
+        shutil.copyfileobj(file.file, buffer)
+
+def queue_upload(temp_path: str, file_path: str) -> Dict[str, Any]:
+    """
+    Queue a saved upload for ingestion, moving it into place once accepted.
+    
+    The file replaces the previous version only inside the queue's
+    transaction, so it is never overwritten for an upload that gets
+    rejected, and no worker can claim the job before the file is there.
+    
+    Args:
+        temp_path: Where the upload was saved
+        file_path: Final path of the document
+    
+    Returns:
+        The ingestion job
+    """
+    def move_into_place() -> None:
+        os.replace(temp_path, file_path)
+        rag_service.forget_parsed(file_path)
+    
+    try:
+        return rag_service.job_queue.submit(file_path, prepare=move_into_place)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
 
 @router.post("/sessions", response_model=SessionResponse)
 async def create_session():
     """Create a new conversation session."""
-    session_id = conversation_service.create_session()
+    session_id = await run_in_threadpool(conversation_service.create_session)
     return {"session_id": session_id}
 
+def queue_full_error(error: JobQueueFullError) -> HTTPException:
+    """The response for an upload rejected by admission control."""
+    return HTTPException(status_code=503, detail=str(error), headers={"Retry-After": "30"})
+
 @router.post("/upload", response_model=DocumentResponse)
-async def upload_document(
-    file: UploadFile = File(...),
-    background_tasks: BackgroundTasks = None
-):
+async def upload_document(file: UploadFile = File(...)):
     """
-    Upload and process a document.
+    Upload a document and queue it for processing.
+    
+    The document is ingested by the job workers; poll GET /jobs/{job_id}
+    for its progress. Uploads are rejected with 503 while the queue is full.
     
     Args:
         file: The document file
-        background_tasks: Background tasks runner
-        
+    
     Returns:
-        Document processing result
+        Document upload result with the ingestion job ID
     """
+    # Admission control: don't even store the file if it can't be queued
+    if await run_in_threadpool(rag_service.job_queue.is_full):
+        raise queue_full_error(JobQueueFullError("Ingestion queue is full, retry later"))
+    
     try:
         # Create uploads directory if it doesn't exist
         os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
         
-        # Save the file
+        # Save the file without blocking the event loop, under a temporary
+        # name (ignored by the document listing) until its job is queued
         file_path = os.path.join(settings.UPLOAD_DIR, file.filename)
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        
-        # Process the document (can be done in background for large files)
-        if background_tasks:
-            background_tasks.add_task(rag_service.process_and_store_document, file_path)
-            return {
-                "success": True,
-                "message": f"Document {file.filename} uploaded and processing started",
-                "document_id": file.filename
-            }
-        else:
-            success = rag_service.process_and_store_document(file_path)
-            if success:
-                return {
-                    "success": True,
-                    "message": f"Document {file.filename} uploaded and processed successfully",
-                    "document_id": file.filename
-                }
-            else:
-                return {
-                    "success": False,
-                    "message": f"Failed to process document {file.filename}",
-                    "document_id": file.filename
-                }
+        temp_path = f"{file_path}.{uuid.uuid4().hex}.part"
+        await run_in_threadpool(save_upload, file, temp_path)
         
+        job = await run_in_threadpool(queue_upload, temp_path, file_path)
+        return {
+            "success": True,
+            "message": f"Document {file.filename} uploaded and queued for processing",
+            "document_id": file.filename,
+            "job_id": job["id"]
+        }
+    
+    except JobQueueFullError as e:
+        raise queue_full_error(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error uploading document: {str(e)}")
 
+@router.get("/jobs", response_model=JobListResponse)
+async def list_jobs(
+    status: Optional[str] = Query(None, pattern="^(queued|running|succeeded|failed)$"),
+    limit: int = Query(50, ge=1, le=1000)
+):
+    """
+    List ingestion jobs, newest first.
+    
+    Args:
+        status: Only jobs with this status
+        limit: Maximum number of jobs
+    
+    Returns:
+        Jobs and the number of jobs per status
+    """
+    jobs = await run_in_threadpool(rag_service.job_queue.list_jobs, status, limit)
+    counts = await run_in_threadpool(rag_service.job_queue.counts)
+    return {"jobs": jobs, "counts": counts}
+
+@router.get("/jobs/{job_id}", response_model=JobResponse)
+async def get_job(job_id: str):
+    """
+    Get the status and progress of an ingestion job.
+    
+    Args:
+        job_id: The job ID
+    
+    Returns:
+        The job
+    """
+    job = await run_in_threadpool(rag_service.job_queue.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job
+
 @router.post("/query", response_model=QueryResponse)
 async def query(request: QueryRequest):
     """
@@ -111,10 +242,13 @@ async def query(request: QueryRequest):
         Query response
     """
     try:
-        result = rag_service.query(
+        result = await rag_service.aquery(
             query=request.query,
             session_id=request.session_id,
-            top_k=request.top_k
+            top_k=request.top_k,
+            use_cache=request.use_cache,
+            lexical_weight=request.lexical_weight,
+            filters=make_filters(request.sources, request.doc_types)
         )
         
         return result
@@ -122,6 +256,73 @@ async def query(request: QueryRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error querying RAG system: {str(e)}")
 
+@router.post("/query/batch", response_model=BatchQueryResponse)
+async def query_batch(request: BatchQueryRequest):
+    """
+    Answer many independent questions in one request.
+    
+    Queries are embedded and searched in batches and answered with bounded
+    concurrency; no conversation session is involved. A question that
+    fails gets an error in its result instead of failing the request.
+    
+    Args:
+        request: Batch query request
+        
+    Returns:
+        One result per query, in request order
+    """
+    if len(request.queries) > settings.BATCH_QUERY_MAX_SIZE:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch of {len(request.queries)} queries exceeds the limit of {settings.BATCH_QUERY_MAX_SIZE}"
+        )
+    
+    try:
+        results = await rag_service.aquery_batch(
+            queries=request.queries,
+            top_k=request.top_k,
+            use_cache=request.use_cache,
+            lexical_weight=request.lexical_weight,
+            filters=make_filters(request.sources, request.doc_types),
+            max_concurrency=request.max_concurrency
+        )
+        
+        return {"results": results}
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error querying RAG system: {str(e)}")
+
+@router.post("/query/stream")
+async def query_stream(request: QueryRequest):
+    """
+    Query the RAG system and stream the answer as Server-Sent Events.
+    
+    Emits a "sources" event after retrieval, "token" events as the model
+    generates text and a final "done" event with the full response.
+    
+    Args:
+        request: Query request
+        
+    Returns:
+        Event stream response
+    """
+    async def event_stream():
+        async for event in rag_service.stream_query(
+            query=request.query,
+            session_id=request.session_id,
+            top_k=request.top_k,
+            use_cache=request.use_cache,
+            lexical_weight=request.lexical_weight,
+            filters=make_filters(request.sources, request.doc_types)
+        ):
+            yield f"event: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @router.post("/match", response_model=MatchResponse)
 async def match_profiles(request: MatchRequest):
     """
@@ -135,17 +336,21 @@ async def match_profiles(request: MatchRequest):
     """
     try:
         # Get file paths from IDs
-        profile_file_paths = [
-            os.path.join(settings.UPLOAD_DIR, profile_id)
-            for profile_id in request.profile_ids
-        ]
+        profile_file_paths = None
+        if request.profile_ids is not None:
+            profile_file_paths = [
+                os.path.join(settings.UPLOAD_DIR, profile_id)
+                for profile_id in request.profile_ids
+            ]
         
         sow_file_path = os.path.join(settings.UPLOAD_DIR, request.sow_id)
         
         # Match profiles to SOW
-        matches = rag_service.match_profiles_to_sow(
+        matches = await run_in_threadpool(
+            rag_service.match_profiles_to_sow,
             profile_file_paths=profile_file_paths,
-            sow_file_path=sow_file_path
+            sow_file_path=sow_file_path,
+            top_k=request.top_k
         )
         
         return {"matches": matches}
@@ -153,6 +358,29 @@ async def match_profiles(request: MatchRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error matching profiles: {str(e)}")
 
+@router.post("/profiles/index")
+async def index_profiles(request: ProfileIndexRequest):
+    """
+    Index uploaded documents as profiles, so /match can rank them without listing them.
+    
+    Args:
+        request: Profile index request
+        
+    Returns:
+        Number of profiles (re-)indexed and the total indexed
+    """
+    try:
+        profile_file_paths = [
+            os.path.join(settings.UPLOAD_DIR, profile_id)
+            for profile_id in request.profile_ids
+        ]
+        indexed = await run_in_threadpool(rag_service.index_profiles, profile_file_paths)
+        
+        return {"indexed": indexed, "total": len(rag_service.profile_index)}
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error indexing profiles: {str(e)}")
+
 @router.get("/documents")
 async def list_documents():
     """
@@ -201,6 +429,9 @@ async def delete_document(document_id: str):
             raise HTTPException(status_code=404, detail=f"Document {document_id} not found")
         
         os.remove(file_path)
+        await run_in_threadpool(rag_service.remove_document, document_id)
+        await run_in_threadpool(rag_service.remove_profile, document_id)
+        await run_in_threadpool(rag_service.forget_parsed, file_path)
         
         return {"success": True, "message": f"Document {document_id} deleted successfully"}
         
@@ -221,7 +452,7 @@ async def delete_session(session_id: str):
         Deletion result
     """
     try:
-        success = conversation_service.delete_session(session_id)
+        success = await run_in_threadpool(conversation_service.delete_session, session_id)
         
         if success:
             return {"success": True, "message": f"Session {session_id} deleted successfully"}
@@ -232,3 +463,19 @@ async def delete_session(session_id: str):
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error deleting session: {str(e)}")
+
+@router.get("/stats")
+async def get_stats():
+    """
+    Get cache statistics.
+    
+    Returns:
+        Hit/miss counters for the in-process caches
+    """
+    stats = {
+        "query_embedding_cache": vector_store.query_cache.stats()
+    }
+    if rag_service.answer_cache is not None:
+        stats["answer_cache"] = rag_service.answer_cache.stats()
+    
+    return stats
@@ -0,0 +1,146 @@
+from pydantic import model_validator
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+class Settings(BaseSettings):
+    """Application settings loaded from environment variables and .env."""
+
+    model_config = SettingsConfigDict(env_file=".env", case_sensitive=True, extra="ignore")
+
+    # API settings
+    PROJECT_NAME: str = "RAG Chatbot"
+    VERSION: str = "1.0.0"
+    API_PREFIX: str = "/api"
+    DEBUG: bool = False
+    UPLOAD_DIR: str = "uploads"
+
+    # Azure OpenAI settings
+    AZURE_OPENAI_ENDPOINT: str = ""
+    AZURE_OPENAI_API_KEY: str = ""
+    AZURE_OPENAI_API_VERSION: str = "2023-05-15"
+    AZURE_OPENAI_CHAT_MODEL: str = "gpt-4o"
+    AZURE_OPENAI_EMBEDDING_MODEL: str = "text-embedding-3-large"
+
+    # Embedding settings
+    # Shortened embeddings via the model's dimensions parameter (0 = full size)
+    EMBEDDING_DIMENSIONS: int = 0
+    EMBEDDING_BATCH_SIZE: int = 16
+    EMBEDDING_MAX_CONCURRENCY: int = 4
+    EMBEDDING_CACHE_ENABLED: bool = True
+    EMBEDDING_CACHE_PATH: str = "data/embedding_cache.sqlite"
+    EMBEDDING_CACHE_MAX_ENTRIES: int = 200000
+    QUERY_CACHE_MAX_ENTRIES: int = 1024
+    QUERY_CACHE_TTL_SECONDS: int = 3600
+
+    # Chunk store settings (chunk texts kept out of vector database payloads)
+    CHUNK_STORE_ENABLED: bool = True
+    CHUNK_STORE_PATH: str = "data/chunks.sqlite"
+    CHUNK_STORE_COMPRESSION_LEVEL: int = 6
+
+    # Retrieval settings
+    SPECULATIVE_RETRIEVAL: bool = False
+    LEXICAL_INDEX_ENABLED: bool = True
+    LEXICAL_INDEX_PATH: str = "data/bm25_index.sqlite"
+    HYBRID_LEXICAL_WEIGHT: float = 0.3
+    HYBRID_RRF_K: int = 60
+    HYBRID_CANDIDATE_MULTIPLIER: int = 4
+    LEXICAL_FAST_PATH_MAX_TERMS: int = 4
+    MMR_ENABLED: bool = True
+    MMR_LAMBDA: float = 0.7
+    MMR_CANDIDATE_MULTIPLIER: int = 4
+    MERGE_ADJACENT_CHUNKS: bool = True
+
+    # Prompt budget settings
+    PROMPT_TOKEN_BUDGET: int = 6000
+    PROMPT_HISTORY_TOKENS: int = 1500
+    CONVERSATION_SUMMARY_MAX_TOKENS: int = 300
+
+    # Conversation settings
+    CONVERSATION_STORE: str = "memory"
+    CONVERSATION_DB_PATH: str = "data/conversations.sqlite"
+    CONVERSATION_MAX_MESSAGES: int = 200
+    CONVERSATION_SESSION_TTL_SECONDS: int = 86400
+    CONVERSATION_MAX_MEMORY_MB: int = 256
+
+    # Batch query settings
+    BATCH_QUERY_MAX_SIZE: int = 1000
+    BATCH_QUERY_MAX_CONCURRENCY: int = 8
+    BATCH_QUERY_EMBEDDING_BATCH_SIZE: int = 256
+
+    # Answer cache settings
+    ANSWER_CACHE_ENABLED: bool = True
+    ANSWER_CACHE_MAX_ENTRIES: int = 1000
+    ANSWER_CACHE_TTL_SECONDS: int = 3600
+    ANSWER_CACHE_SIMILARITY_THRESHOLD: float = 0.95
+    # Shared by all processes, so their answer caches see other processes' uploads
+    CORPUS_VERSION_PATH: str = "data/corpus_version.sqlite"
+
+    # Vector database settings
+    VECTOR_DB_TYPE: str = "qdrant"
+    QDRANT_HOST: str = "localhost"
+    QDRANT_PORT: int = 6333
+    QDRANT_COLLECTION_NAME: str = "documents"
+    # 0 = EMBEDDING_DIMENSIONS, or 3072 (text-embedding-3-large) for full-size embeddings
+    QDRANT_VECTOR_SIZE: int = 0
+    QDRANT_PREFER_GRPC: bool = False
+    QDRANT_GRPC_PORT: int = 6334
+    QDRANT_TIMEOUT_SECONDS: int = 30
+    QDRANT_UPSERT_BATCH_SIZE: int = 128
+    QDRANT_UPSERT_PARALLELISM: int = 4
+    QDRANT_QUANTIZATION: str = "none"
+    QDRANT_QUANTIZATION_ALWAYS_RAM: bool = True
+    QDRANT_ON_DISK_VECTORS: bool = False
+    QDRANT_SEARCH_RESCORE: bool = True
+    QDRANT_SEARCH_OVERSAMPLING: float = 2.0
+
+    # FAISS settings (VECTOR_DB_TYPE=faiss)
+    FAISS_INDEX_DIR: str = "data/faiss"
+    FAISS_INDEX_TYPE: str = "flat"
+    FAISS_IVF_NLIST: int = 100
+    FAISS_IVF_NPROBE: int = 10
+    FAISS_MMAP: bool = True
+
+    # Document processing settings
+    CHUNK_SIZE: int = 500
+    CHUNK_OVERLAP: int = 50
+    CHUNK_SIZE_UNIT: str = "chars"
+    CHUNK_PRESERVE_PARAGRAPHS: bool = True
+    TOKENIZER_ENCODING: str = "o200k_base"
+    INGEST_MANIFEST_PATH: str = "data/ingest_manifest.sqlite"
+    INGEST_QUEUE_SIZE: int = 8
+    INGEST_UPSERT_CONCURRENCY: int = 4
+    INGEST_BATCH_SIZE: int = 64
+    INGEST_PREFETCH_BATCHES: int = 2
+    JOB_QUEUE_PATH: str = "data/jobs.sqlite"
+    JOB_WORKERS: int = 1
+    JOB_QUEUE_MAX_PENDING: int = 100
+    JOB_STALE_SECONDS: float = 120
+    JOB_MAX_ATTEMPTS: int = 3
+    JOB_RETENTION_HOURS: float = 24
+
+    # Profile matching settings
+    SKILL_TAXONOMY_PATH: str = ""
+    DOCUMENT_CACHE_ENABLED: bool = True
+    DOCUMENT_CACHE_PATH: str = "data/document_cache.sqlite"
+    PROFILE_MATCHING: str = "embedding"
+    PROFILE_INDEX_PATH: str = "data/profiles.sqlite"
+    PROFILE_KEYWORD_WEIGHT: float = 0.3
+    PROFILE_MATCH_TOP_K: int = 20
+    PROFILE_SECTION_EMBEDDINGS: bool = False
+    PROFILE_SECTION_SIZE: int = 2000
+    PROFILE_MAX_SECTIONS: int = 8
+    PROFILE_EMBEDDING_MAX_CHARS: int = 24000
+    PROFILE_INDEX_BATCH_SIZE: int = 64
+
+    @model_validator(mode="after")
+    def _match_vector_size(self) -> "Settings":
+        """Size vectors like the embeddings, rejecting a conflicting QDRANT_VECTOR_SIZE."""
+        if not self.QDRANT_VECTOR_SIZE:
+            self.QDRANT_VECTOR_SIZE = self.EMBEDDING_DIMENSIONS or 3072
+        elif self.EMBEDDING_DIMENSIONS and self.QDRANT_VECTOR_SIZE != self.EMBEDDING_DIMENSIONS:
+            raise ValueError(
+                f"EMBEDDING_DIMENSIONS is {self.EMBEDDING_DIMENSIONS} but QDRANT_VECTOR_SIZE is "
+                f"{self.QDRANT_VECTOR_SIZE}; set them to the same value or QDRANT_VECTOR_SIZE to 0"
+            )
+        return self
+
+settings = Settings()
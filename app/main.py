@@ -6,6 +6,7 @@ import os
 
 from app.core.config import settings
 from app.api.routes import router as api_router
+from app.services.vector_store import vector_store
 
 # Create FastAPI app
 app = FastAPI(
@@ -29,6 +30,11 @@ app.add_middleware(
 # Include API routes
 app.include_router(api_router, prefix=settings.API_PREFIX)
 
+# Close the async vector database connections opened on the server's event loop
+@app.on_event("shutdown")
+async def close_vector_store():
+    await vector_store.aclose()
+
 # Error handler
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
@@ -0,0 +1,169 @@
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from collections import OrderedDict
+import itertools
+import threading
+import time
+import numpy as np
+
+from app.core.config import settings
+
+class SemanticAnswerCache:
+    """Bounded, thread-safe LRU cache of generated answers, matched by meaning.
+
+    A cached answer is reused for a query whose embedding is within the
+    cosine similarity threshold of the cached query's, that retrieved
+    exactly the same chunks, while the corpus version is unchanged.
+    Entries are grouped by (corpus version, chunk IDs), so a lookup only
+    compares against the few queries that retrieved the same context.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float, threshold: float):
+        """
+        Initialize the cache.
+
+        Args:
+            max_entries: Maximum number of entries kept
+            ttl_seconds: Seconds after which an entry expires
+            threshold: Minimum cosine similarity for a query to match
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.threshold = threshold
+        self.hits = 0
+        self.misses = 0
+        # entry ID -> (expires_at, group key, unit query vector, answer)
+        self._entries = OrderedDict()
+        # group key -> entry IDs
+        self._groups = {}
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _group_key(chunk_ids: Iterable[str], corpus_version: int) -> Tuple[int, frozenset]:
+        return corpus_version, frozenset(chunk_ids)
+
+    @staticmethod
+    def _unit_vector(embedding: List[float]) -> Optional[np.ndarray]:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        # Zero vectors are the embedding error fallback
+        if norm == 0:
+            return None
+        return vector / norm
+
+    def _remove(self, entry_id: int) -> None:
+        _, group_key, _, _ = self._entries.pop(entry_id)
+        group = self._groups[group_key]
+        group.discard(entry_id)
+        if not group:
+            del self._groups[group_key]
+
+    def get(
+        self,
+        embedding: List[float],
+        chunk_ids: Iterable[str],
+        corpus_version: int
+    ) -> Optional[str]:
+        """
+        Get the answer cached for the most similar matching query.
+
+        Args:
+            embedding: Embedding of the (contextualized) query
+            chunk_ids: IDs of the chunks retrieved for the query
+            corpus_version: Current corpus version of the vector store
+
+        Returns:
+            The cached answer, or None if no entry matches
+        """
+        vector = self._unit_vector(embedding)
+        group_key = self._group_key(chunk_ids, corpus_version)
+
+        with self._lock:
+            best_id = None
+            best_score = self.threshold
+            now = time.monotonic()
+            candidates = list(self._groups.get(group_key, ())) if vector is not None else []
+
+            for entry_id in candidates:
+                expires_at, _, cached_vector, _ = self._entries[entry_id]
+                if expires_at < now:
+                    self._remove(entry_id)
+                    continue
+                score = float(np.dot(vector, cached_vector))
+                if score >= best_score:
+                    best_id, best_score = entry_id, score
+
+            if best_id is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(best_id)
+            self.hits += 1
+            return self._entries[best_id][3]
+
+    def set(
+        self,
+        embedding: List[float],
+        chunk_ids: Iterable[str],
+        corpus_version: int,
+        answer: str
+    ) -> None:
+        """
+        Store an answer, evicting the least recently used entry if full.
+
+        Args:
+            embedding: Embedding of the (contextualized) query
+            chunk_ids: IDs of the chunks retrieved for the query
+            corpus_version: Corpus version the answer was generated at
+            answer: The generated answer
+        """
+        vector = self._unit_vector(embedding)
+        if self.max_entries <= 0 or vector is None:
+            return
+
+        group_key = self._group_key(chunk_ids, corpus_version)
+
+        with self._lock:
+            entry_id = next(self._ids)
+            self._entries[entry_id] = (time.monotonic() + self.ttl_seconds, group_key, vector, answer)
+            self._groups.setdefault(group_key, set()).add(entry_id)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def clear(self) -> None:
+        """Remove all entries."""
+        with self._lock:
+            self._entries.clear()
+            self._groups.clear()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get cache statistics.
+
+        Returns:
+            Dictionary with size, hits, misses, hit rate and threshold
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "similarity_threshold": self.threshold
+            }
+
+def create_answer_cache() -> Optional[SemanticAnswerCache]:
+    """Create the answer cache from settings, or None if it is disabled."""
+    if not settings.ANSWER_CACHE_ENABLED:
+        return None
+    return SemanticAnswerCache(
+        max_entries=settings.ANSWER_CACHE_MAX_ENTRIES,
+        ttl_seconds=settings.ANSWER_CACHE_TTL_SECONDS,
+        threshold=settings.ANSWER_CACHE_SIMILARITY_THRESHOLD
+    )
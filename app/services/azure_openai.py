@@ -1,8 +1,15 @@
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple, AsyncIterator
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
 import openai
 import numpy as np
 
 from app.core.config import settings
+from app.services.embedding_cache import EmbeddingCache, create_embedding_cache
+from app.services.tokenizer import count_tokens
+
+# How each message role is labelled when history is rendered as text
+_SPEAKERS = {"user": "Human", "assistant": "Assistant", "system": "Context"}
 
 class AzureOpenAIService:
     """Service for interacting with Azure OpenAI API."""
@@ -13,45 +20,196 @@ class AzureOpenAIService:
         openai.api_base = settings.AZURE_OPENAI_ENDPOINT
         openai.api_key = settings.AZURE_OPENAI_API_KEY
         openai.api_version = settings.AZURE_OPENAI_API_VERSION
+        self.embedding_cache = create_embedding_cache()
+        self._rag_prompt_tokens = None
+    
+    @staticmethod
+    def _embedding_options() -> Dict[str, Any]:
+        """Extra embedding request parameters (shortened embeddings when configured)."""
+        if settings.EMBEDDING_DIMENSIONS:
+            return {"dimensions": settings.EMBEDDING_DIMENSIONS}
+        return {}
+    
+    @staticmethod
+    def embedding_model_key() -> str:
+        """Model identifier for embedding cache keys, including the dimensions."""
+        if settings.EMBEDDING_DIMENSIONS:
+            return f"{settings.AZURE_OPENAI_EMBEDDING_MODEL}@{settings.EMBEDDING_DIMENSIONS}"
+        return settings.AZURE_OPENAI_EMBEDDING_MODEL
+    
+    @staticmethod
+    def embedding_size() -> int:
+        """Length of the embeddings returned by the model."""
+        return settings.EMBEDDING_DIMENSIONS or settings.QDRANT_VECTOR_SIZE
+    
+    def _embed_batch(self, batch_texts: List[str]) -> List[List[float]]:
+        """Embed a single batch, falling back to zero vectors on error."""
+        try:
+            print(f"Generating embeddings for {len(batch_texts)} texts")
+            response = openai.Embedding.create(
+                input=batch_texts,
+                engine=settings.AZURE_OPENAI_EMBEDDING_MODEL,
+                **self._embedding_options()
+            )
+            
+            # Extract embeddings from response
+            batch_embeddings = [item["embedding"] for item in response["data"]]
+            print(f"Generated embeddings with dimension: {len(batch_embeddings[0])}")
+            return batch_embeddings
+            
+        except Exception as e:
+            print(f"Error generating embeddings: {str(e)}")
+            # Return empty embeddings for this batch
+            return [[0.0] * self.embedding_size()] * len(batch_texts)
+    
+    async def _aembed_batch(self, batch_texts: List[str]) -> List[List[float]]:
+        """Async counterpart of _embed_batch."""
+        try:
+            print(f"Generating embeddings for {len(batch_texts)} texts")
+            response = await openai.Embedding.acreate(
+                input=batch_texts,
+                engine=settings.AZURE_OPENAI_EMBEDDING_MODEL,
+                **self._embedding_options()
+            )
+            
+            return [item["embedding"] for item in response["data"]]
+            
+        except Exception as e:
+            print(f"Error generating embeddings: {str(e)}")
+            return [[0.0] * self.embedding_size()] * len(batch_texts)
+    
+    def _batches(self, texts: List[str], batch_size: Optional[int] = None) -> List[List[str]]:
+        """Split texts into embedding request batches."""
+        batch_size = batch_size or settings.EMBEDDING_BATCH_SIZE
+        return [texts[i:i+batch_size] for i in range(0, len(texts), batch_size)]
+    
+    def _split_cached(self, texts: List[str]) -> Tuple[List[str], Dict[str, List[float]], List[str]]:
+        """
+        Resolve texts against the embedding cache.
+        
+        Returns:
+            Tuple of (cache keys, cached embeddings by key, unique texts to embed)
+        """
+        model = self.embedding_model_key()
+        keys = [EmbeddingCache.make_key(model, text) for text in texts]
+        cached = self.embedding_cache.get_many(keys) if self.embedding_cache is not None else {}
+        
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+        
+        return keys, cached, list(missing.values())
+    
+    def _merge_cached(
+        self,
+        keys: List[str],
+        cached: Dict[str, List[float]],
+        missing_texts: List[str],
+        new_embeddings: List[List[float]]
+    ) -> List[List[float]]:
+        """Store freshly generated embeddings and assemble results in input order."""
+        model = self.embedding_model_key()
+        fresh = {
+            EmbeddingCache.make_key(model, text): embedding
+            for text, embedding in zip(missing_texts, new_embeddings)
+        }
+        
+        if self.embedding_cache is not None:
+            # Zero vectors are error fallbacks and must not be cached
+            self.embedding_cache.put_many({
+                key: embedding for key, embedding in fresh.items() if any(embedding)
+            })
+        
+        cached.update(fresh)
+        return [cached[key] for key in keys]
     
     def generate_embeddings(self, texts: List[str]) -> List[List[float]]:
         """
         Generate embeddings for a list of texts.
         
+        Cached embeddings are reused; only cache misses are sent to the API.
+        Batches are sent concurrently, with at most
+        EMBEDDING_MAX_CONCURRENCY requests in flight.
+        
+        Args:
+            texts: List of texts to generate embeddings for
+            
+        Returns:
+            List of embeddings, in the same order as texts
+        """
+        if not texts:
+            return []
+        
+        keys, cached, missing_texts = self._split_cached(texts)
+        
+        new_embeddings = []
+        batches = self._batches(missing_texts)
+        
+        if len(batches) == 1:
+            new_embeddings = self._embed_batch(batches[0])
+        elif batches:
+            max_workers = min(settings.EMBEDDING_MAX_CONCURRENCY, len(batches))
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                # map() yields results in submission order
+                for batch_embeddings in executor.map(self._embed_batch, batches):
+                    new_embeddings.extend(batch_embeddings)
+        
+        return self._merge_cached(keys, cached, missing_texts, new_embeddings)
+    
+    async def agenerate_embeddings(
+        self,
+        texts: List[str],
+        batch_size: Optional[int] = None
+    ) -> List[List[float]]:
+        """
+        Generate embeddings for a list of texts without blocking the event loop.
+        
         Args:
             texts: List of texts to generate embeddings for
+            batch_size: Texts per embedding request, defaults to EMBEDDING_BATCH_SIZE
             
         Returns:
-            List of embeddings
+            List of embeddings, in the same order as texts
         """
         if not texts:
             return []
         
-        # Process in batches to avoid API limits
-        batch_size = 16  # Azure OpenAI can handle larger batches, but we'll be conservative
-        all_embeddings = []
-        
-        for i in range(0, len(texts), batch_size):
-            batch_texts = texts[i:i+batch_size]
-            
-            try:
-                print(f"Generating embeddings for {len(batch_texts)} texts")
-                response = openai.Embedding.create(
-                    input=batch_texts,
-                    engine=settings.AZURE_OPENAI_EMBEDDING_MODEL
-                )
-                
-                # Extract embeddings from response
-                batch_embeddings = [item["embedding"] for item in response["data"]]
-                print(f"Generated embeddings with dimension: {len(batch_embeddings[0])}")
-                all_embeddings.extend(batch_embeddings)
-                
-            except Exception as e:
-                print(f"Error generating embeddings: {str(e)}")
-                # Return empty embeddings for this batch
-                all_embeddings.extend([[0.0] * settings.QDRANT_VECTOR_SIZE] * len(batch_texts))
-        
-        return all_embeddings
+        # Cache lookups hit SQLite, so keep them off the event loop
+        keys, cached, missing_texts = await asyncio.to_thread(self._split_cached, texts)
+        
+        semaphore = asyncio.Semaphore(settings.EMBEDDING_MAX_CONCURRENCY)
+        
+        async def embed(batch_texts: List[str]) -> List[List[float]]:
+            async with semaphore:
+                return await self._aembed_batch(batch_texts)
+        
+        # gather() preserves the order of its arguments
+        results = await asyncio.gather(*(embed(batch) for batch in self._batches(missing_texts, batch_size)))
+        
+        new_embeddings = []
+        for batch_embeddings in results:
+            new_embeddings.extend(batch_embeddings)
+        
+        return await asyncio.to_thread(self._merge_cached, keys, cached, missing_texts, new_embeddings)
+    
+    def _build_messages(
+        self,
+        system_prompt: str,
+        user_message: str,
+        conversation_history: Optional[List[Dict[str, str]]] = None
+    ) -> List[Dict[str, str]]:
+        """Assemble the chat messages for a completion request."""
+        messages = [{"role": "system", "content": system_prompt}]
+        
+        # Add conversation history if provided
+        if conversation_history:
+            messages.extend(conversation_history)
+        
+        # Add the user message
+        messages.append({"role": "user", "content": user_message})
+        
+        return messages
     
     def generate_chat_completion(
         self, 
@@ -74,14 +232,7 @@ class AzureOpenAIService:
         Returns:
             Generated response
         """
-        messages = [{"role": "system", "content": system_prompt}]
-        
-        # Add conversation history if provided
-        if conversation_history:
-            messages.extend(conversation_history)
-        
-        # Add the user message
-        messages.append({"role": "user", "content": user_message})
+        messages = self._build_messages(system_prompt, user_message, conversation_history)
         
         try:
             response = openai.ChatCompletion.create(
@@ -97,40 +248,157 @@ class AzureOpenAIService:
             print(f"Error generating chat completion: {str(e)}")
             return f"Error: Unable to generate response. {str(e)}"
     
-    def contextualize_query(self, query: str, conversation_history: List[Dict[str, str]]) -> str:
+    async def agenerate_chat_completion(
+        self,
+        system_prompt: str,
+        user_message: str,
+        conversation_history: Optional[List[Dict[str, str]]] = None,
+        temperature: float = 0.7,
+        max_tokens: int = 800
+    ) -> str:
         """
-        Convert follow-up questions into standalone queries.
+        Generate a chat completion without blocking the event loop.
         
         Args:
-            query: The user's query
-            conversation_history: The conversation history
+            system_prompt: The system prompt
+            user_message: The user message
+            conversation_history: Optional conversation history
+            temperature: Temperature for generation
+            max_tokens: Maximum tokens to generate
             
         Returns:
-            Contextualized query
+            Generated response
         """
-        if not conversation_history:
-            return query
+        messages = self._build_messages(system_prompt, user_message, conversation_history)
+        
+        try:
+            response = await openai.ChatCompletion.acreate(
+                engine=settings.AZURE_OPENAI_CHAT_MODEL,
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_tokens
+            )
+            
+            return response["choices"][0]["message"]["content"]
             
+        except Exception as e:
+            print(f"Error generating chat completion: {str(e)}")
+            return f"Error: Unable to generate response. {str(e)}"
+    
+    async def astream_chat_completion(
+        self,
+        system_prompt: str,
+        user_message: str,
+        conversation_history: Optional[List[Dict[str, str]]] = None,
+        temperature: float = 0.7,
+        max_tokens: int = 800
+    ) -> AsyncIterator[str]:
+        """
+        Stream a chat completion token by token.
+        
+        Args:
+            system_prompt: The system prompt
+            user_message: The user message
+            conversation_history: Optional conversation history
+            temperature: Temperature for generation
+            max_tokens: Maximum tokens to generate
+            
+        Yields:
+            Pieces of generated text as the model produces them
+        """
+        messages = self._build_messages(system_prompt, user_message, conversation_history)
+        
+        try:
+            response = await openai.ChatCompletion.acreate(
+                engine=settings.AZURE_OPENAI_CHAT_MODEL,
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                stream=True
+            )
+            
+            async for chunk in response:
+                # Azure sends a leading chunk with no choices (content filter results)
+                if not chunk["choices"]:
+                    continue
+                content = chunk["choices"][0].get("delta", {}).get("content")
+                if content:
+                    yield content
+            
+        except Exception as e:
+            print(f"Error streaming chat completion: {str(e)}")
+            yield f"Error: Unable to generate response. {str(e)}"
+    
+    def _contextualize_messages(
+        self,
+        query: str,
+        conversation_history: List[Dict[str, str]]
+    ) -> List[Dict[str, str]]:
+        """Build the messages asking the model to rewrite a follow-up question."""
         system_prompt = """Given a chat history and the latest user question 
         which might reference context in the chat history, formulate a standalone 
         question which can be understood without the chat history. Do NOT answer 
         the question, just reformulate it if needed and otherwise return it as is."""
         
         # Format conversation history for the prompt
-        formatted_history = ""
-        for msg in conversation_history:
-            role = "Human" if msg["role"] == "user" else "Assistant"
-            formatted_history += f"{role}: {msg['content']}\n\n"
+        formatted_history = "".join(
+            f"{_SPEAKERS.get(msg['role'], 'Assistant')}: {msg['content']}\n\n"
+            for msg in conversation_history
+        )
         
         user_message = f"Chat history:\n{formatted_history}\n\nQuestion:\n{query}"
         
+        return [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_message}
+        ]
+    
+    def contextualize_query(self, query: str, conversation_history: List[Dict[str, str]]) -> str:
+        """
+        Convert follow-up questions into standalone queries.
+        
+        Args:
+            query: The user's query
+            conversation_history: The conversation history
+            
+        Returns:
+            Contextualized query
+        """
+        if not conversation_history:
+            return query
+        
         try:
             response = openai.ChatCompletion.create(
                 engine=settings.AZURE_OPENAI_CHAT_MODEL,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_message}
-                ],
+                messages=self._contextualize_messages(query, conversation_history),
+                temperature=0.0,  # Use low temperature for deterministic output
+                max_tokens=100
+            )
+            
+            return response["choices"][0]["message"]["content"]
+            
+        except Exception as e:
+            print(f"Error contextualizing query: {str(e)}")
+            return query  # Fallback to original query
+    
+    async def acontextualize_query(self, query: str, conversation_history: List[Dict[str, str]]) -> str:
+        """
+        Async counterpart of contextualize_query.
+        
+        Args:
+            query: The user's query
+            conversation_history: The conversation history
+            
+        Returns:
+            Contextualized query
+        """
+        if not conversation_history:
+            return query
+        
+        try:
+            response = await openai.ChatCompletion.acreate(
+                engine=settings.AZURE_OPENAI_CHAT_MODEL,
+                messages=self._contextualize_messages(query, conversation_history),
                 temperature=0.0,  # Use low temperature for deterministic output
                 max_tokens=100
             )
@@ -141,6 +409,106 @@ class AzureOpenAIService:
             print(f"Error contextualizing query: {str(e)}")
             return query  # Fallback to original query
     
+    def _summary_messages(
+        self,
+        previous_summary: str,
+        messages: List[Dict[str, str]]
+    ) -> List[Dict[str, str]]:
+        """Build the messages asking the model to extend a conversation summary."""
+        system_prompt = """Summarize the conversation below so it can replace the 
+        original turns as context for later questions. Keep names, numbers, 
+        documents and decisions that were mentioned, and any open questions. 
+        Write a few short sentences and nothing else."""
+        
+        formatted_history = "".join(
+            f"{_SPEAKERS.get(msg['role'], 'Assistant')}: {msg['content']}\n\n"
+            for msg in messages
+        )
+        
+        user_message = f"Conversation:\n{formatted_history}"
+        if previous_summary:
+            user_message = f"Summary so far:\n{previous_summary}\n\n{user_message}"
+        
+        return [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_message}
+        ]
+    
+    def summarize_conversation(
+        self,
+        previous_summary: str,
+        messages: List[Dict[str, str]]
+    ) -> Optional[str]:
+        """
+        Fold conversation turns into a rolling summary.
+        
+        Args:
+            previous_summary: The summary of earlier turns, or ""
+            messages: The turns to add to the summary
+            
+        Returns:
+            The new summary, or None if it could not be generated
+        """
+        try:
+            response = openai.ChatCompletion.create(
+                engine=settings.AZURE_OPENAI_CHAT_MODEL,
+                messages=self._summary_messages(previous_summary, messages),
+                temperature=0.0,
+                max_tokens=settings.CONVERSATION_SUMMARY_MAX_TOKENS
+            )
+            
+            return response["choices"][0]["message"]["content"]
+            
+        except Exception as e:
+            print(f"Error summarizing conversation: {str(e)}")
+            return None
+    
+    async def asummarize_conversation(
+        self,
+        previous_summary: str,
+        messages: List[Dict[str, str]]
+    ) -> Optional[str]:
+        """
+        Async counterpart of summarize_conversation.
+        
+        Args:
+            previous_summary: The summary of earlier turns, or ""
+            messages: The turns to add to the summary
+            
+        Returns:
+            The new summary, or None if it could not be generated
+        """
+        try:
+            response = await openai.ChatCompletion.acreate(
+                engine=settings.AZURE_OPENAI_CHAT_MODEL,
+                messages=self._summary_messages(previous_summary, messages),
+                temperature=0.0,
+                max_tokens=settings.CONVERSATION_SUMMARY_MAX_TOKENS
+            )
+            
+            return response["choices"][0]["message"]["content"]
+            
+        except Exception as e:
+            print(f"Error summarizing conversation: {str(e)}")
+            return None
+    
+    def rag_prompt_tokens(self) -> int:
+        """Tokens taken by the RAG system prompt without any context."""
+        if self._rag_prompt_tokens is None:
+            self._rag_prompt_tokens = count_tokens(self._rag_system_prompt(""))
+        return self._rag_prompt_tokens
+    
+    def _rag_system_prompt(self, context: str) -> str:
+        """Build the RAG system prompt around the retrieved context."""
+        return f"""You are a helpful assistant that answers questions based on the provided context.
+        Based on the following context and conversation history, please provide a relevant and contextual response.
+        If the answer cannot be derived from the context, only use the conversation history or say 
+        "I cannot answer this based on the provided information."
+        
+        Context from documents:
+        {context}
+        """
+    
     def generate_rag_response(
         self,
         query: str,
@@ -158,14 +526,7 @@ class AzureOpenAIService:
         Returns:
             Generated response
         """
-        system_prompt = f"""You are a helpful assistant that answers questions based on the provided context.
-        Based on the following context and conversation history, please provide a relevant and contextual response.
-        If the answer cannot be derived from the context, only use the conversation history or say 
-        "I cannot answer this based on the provided information."
-        
-        Context from documents:
-        {context}
-        """
+        system_prompt = self._rag_system_prompt(context)
         
         return self.generate_chat_completion(
             system_prompt=system_prompt,
@@ -173,6 +534,54 @@ class AzureOpenAIService:
             conversation_history=conversation_history,
             temperature=0.7
         )
+    
+    async def agenerate_rag_response(
+        self,
+        query: str,
+        context: str,
+        conversation_history: Optional[List[Dict[str, str]]] = None
+    ) -> str:
+        """
+        Generate a response using RAG without blocking the event loop.
+        
+        Args:
+            query: The user's query
+            context: The retrieved context
+            conversation_history: Optional conversation history
+            
+        Returns:
+            Generated response
+        """
+        return await self.agenerate_chat_completion(
+            system_prompt=self._rag_system_prompt(context),
+            user_message=query,
+            conversation_history=conversation_history,
+            temperature=0.7
+        )
+    
+    def astream_rag_response(
+        self,
+        query: str,
+        context: str,
+        conversation_history: Optional[List[Dict[str, str]]] = None
+    ) -> AsyncIterator[str]:
+        """
+        Stream a response using RAG.
+        
+        Args:
+            query: The user's query
+            context: The retrieved context
+            conversation_history: Optional conversation history
+            
+        Returns:
+            Async iterator over pieces of the generated response
+        """
+        return self.astream_chat_completion(
+            system_prompt=self._rag_system_prompt(context),
+            user_message=query,
+            conversation_history=conversation_history,
+            temperature=0.7
+        )
 
 # Create a singleton instance
 azure_openai_service = AzureOpenAIService()
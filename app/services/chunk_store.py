@@ -0,0 +1,117 @@
+from typing import Dict, Iterable, List, Optional
+import os
+import sqlite3
+import threading
+import zlib
+
+from app.core.config import settings
+
+class ChunkStore:
+    """Compressed chunk texts in SQLite, addressed by vector point ID."""
+    
+    def __init__(self, path: str, compression_level: int = 6):
+        """
+        Open (or create) the chunk store.
+        
+        Args:
+            path: Path of the SQLite file
+            compression_level: zlib compression level (0-9)
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        
+        self.compression_level = compression_level
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            "id TEXT PRIMARY KEY, source TEXT NOT NULL, text BLOB NOT NULL) WITHOUT ROWID"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_chunks_source ON chunks (source)")
+        self._conn.commit()
+    
+    def put_many(self, ids: List[str], texts: List[str], sources: List[str]) -> None:
+        """
+        Store chunk texts, replacing any stored under the same IDs.
+        
+        Args:
+            ids: Point IDs of the chunks
+            texts: Chunk texts
+            sources: Source file name of each chunk
+        """
+        rows = [
+            (point_id, source, zlib.compress(text.encode("utf-8"), self.compression_level))
+            for point_id, text, source in zip(ids, texts, sources)
+        ]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO chunks (id, source, text) VALUES (?, ?, ?)", rows
+            )
+            self._conn.commit()
+    
+    def get_many(self, ids: Iterable[str]) -> Dict[str, str]:
+        """
+        Read chunk texts.
+        
+        Args:
+            ids: Point IDs of the chunks
+        
+        Returns:
+            Mapping of point ID to text for the IDs that were found
+        """
+        unique_ids = list(dict.fromkeys(ids))
+        if not unique_ids:
+            return {}
+        
+        found = {}
+        with self._lock:
+            # Stay well below SQLite's bound-parameter limit
+            for i in range(0, len(unique_ids), 500):
+                batch = unique_ids[i:i+500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT id, text FROM chunks WHERE id IN ({placeholders})", batch
+                ).fetchall()
+                found.update(rows)
+        
+        return {point_id: zlib.decompress(blob).decode("utf-8") for point_id, blob in found.items()}
+    
+    def delete(self, ids: Iterable[str]) -> None:
+        """
+        Remove chunks.
+        
+        Args:
+            ids: Point IDs of the chunks
+        """
+        with self._lock:
+            self._conn.executemany("DELETE FROM chunks WHERE id = ?", [(point_id,) for point_id in ids])
+            self._conn.commit()
+    
+    def delete_by_source(self, source: str) -> None:
+        """
+        Remove every chunk of a source file.
+        
+        Args:
+            source: The source file name
+        """
+        with self._lock:
+            self._conn.execute("DELETE FROM chunks WHERE source = ?", (source,))
+            self._conn.commit()
+    
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+    
+    def clear(self) -> None:
+        """Remove every chunk."""
+        with self._lock:
+            self._conn.execute("DELETE FROM chunks")
+            self._conn.commit()
+
+def create_chunk_store() -> Optional[ChunkStore]:
+    """Create the chunk store from settings, or None if chunk texts stay in the payload."""
+    if not settings.CHUNK_STORE_ENABLED:
+        return None
+    return ChunkStore(settings.CHUNK_STORE_PATH, settings.CHUNK_STORE_COMPRESSION_LEVEL)
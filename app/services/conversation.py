@@ -1,15 +1,27 @@
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 import uuid
 from datetime import datetime
 
+from app.services.tokenizer import count_tokens
+from app.services.conversation_store import ConversationStore, Message, create_conversation_store
+
+# Tokens the chat format adds around each message (role, delimiters)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+SUMMARY_PREFIX = "Summary of the earlier conversation:\n"
+
 class ConversationService:
     """Service for managing conversation history and sessions."""
     
-    def __init__(self):
-        """Initialize the conversation service."""
-        # In-memory storage for conversations
-        # In a production system, this would be a database
-        self.conversations = {}
+    def __init__(self, store: Optional[ConversationStore] = None):
+        """
+        Initialize the conversation service.
+        
+        Args:
+            store: Storage engine, defaults to the one selected by
+                CONVERSATION_STORE
+        """
+        self.store = store or create_conversation_store()
     
     def create_session(self) -> str:
         """
@@ -19,7 +31,7 @@ class ConversationService:
             Session ID
         """
         session_id = str(uuid.uuid4())
-        self.conversations[session_id] = []
+        self.store.create(session_id)
         return session_id
     
     def add_message(self, session_id: str, role: str, content: str) -> bool:
@@ -34,14 +46,13 @@ class ConversationService:
         Returns:
             True if successful, False otherwise
         """
-        if session_id not in self.conversations:
-            self.conversations[session_id] = []
-        
-        self.conversations[session_id].append({
-            "role": role,
-            "content": content,
-            "timestamp": datetime.now().isoformat()
-        })
+        self.store.append(session_id, (
+            role,
+            content,
+            datetime.now().isoformat(),
+            # Counted once here so prompt budgets never re-tokenize history
+            count_tokens(content) + MESSAGE_OVERHEAD_TOKENS
+        ))
         
         return True
     
@@ -60,23 +71,124 @@ class ConversationService:
         Returns:
             List of messages
         """
-        if session_id not in self.conversations:
+        session = self.store.load(session_id)
+        if session is None:
             return []
         
-        history = self.conversations[session_id]
+        history = session["messages"]
         
         if max_messages:
             history = history[-max_messages:]
         
         # Convert to format expected by OpenAI API
-        formatted_history = []
-        for msg in history:
-            formatted_history.append({
-                "role": msg["role"],
-                "content": msg["content"]
-            })
-        
-        return formatted_history
+        return [{"role": role, "content": content} for role, content, _, _ in history]
+    
+    @staticmethod
+    def _uncovered(session: Dict[str, Any]) -> Tuple[List[Message], int]:
+        """Messages not covered by the summary, and the sequence number of the first."""
+        start = max(session["summary_upto"], session["first_seq"])
+        return session["messages"][start - session["first_seq"]:], start
+    
+    def get_budgeted_history(
+        self,
+        session_id: str,
+        max_tokens: int
+    ) -> Tuple[List[Dict[str, str]], int]:
+        """
+        Get the most recent history that fits in a token budget.
+        
+        The rolling summary of compacted turns, if any, comes first as a
+        system message, followed by as many of the newest messages as fit.
+        
+        Args:
+            session_id: The session ID
+            max_tokens: Token budget for the history
+            
+        Returns:
+            Tuple of (messages in OpenAI format, tokens used)
+        """
+        session = self.store.load(session_id)
+        if not session or not session["messages"]:
+            return [], 0
+        
+        summary = session["summary"]
+        used = 0
+        if summary:
+            if session["summary_tokens"] <= max_tokens:
+                used = session["summary_tokens"]
+            else:
+                summary = None
+        
+        messages, _ = self._uncovered(session)
+        selected = []
+        for role, content, _, tokens in reversed(messages):
+            if used + tokens > max_tokens:
+                break
+            selected.append({"role": role, "content": content})
+            used += tokens
+        selected.reverse()
+        
+        if summary:
+            selected.insert(0, {"role": "system", "content": summary})
+        
+        return selected, used
+    
+    def get_compaction(self, session_id: str, max_tokens: int) -> Optional[Dict[str, Any]]:
+        """
+        Get the turns to fold into the rolling summary, if the history is too long.
+        
+        Compaction is due once the messages not covered by the summary
+        exceed max_tokens. The newest messages, up to half of max_tokens,
+        are kept verbatim; everything older is returned for summarization.
+        
+        Args:
+            session_id: The session ID
+            max_tokens: Token budget for the history
+            
+        Returns:
+            Dictionary with summary (the previous summary text), messages
+            (the turns to summarize) and upto (the sequence number to pass
+            to set_summary), or None if no compaction is needed
+        """
+        session = self.store.load(session_id)
+        if not session or not session["messages"]:
+            return None
+        
+        messages, start = self._uncovered(session)
+        
+        if sum(message[3] for message in messages) <= max_tokens:
+            return None
+        
+        end = len(messages)
+        kept = 0
+        while end > 0 and kept + messages[end - 1][3] <= max_tokens // 2:
+            kept += messages[end - 1][3]
+            end -= 1
+        
+        summary = session["summary"]
+        return {
+            "summary": summary[len(SUMMARY_PREFIX):] if summary else "",
+            "messages": [{"role": role, "content": content} for role, content, _, _ in messages[:end]],
+            "upto": start + end
+        }
+    
+    def set_summary(self, session_id: str, content: str, upto: int) -> bool:
+        """
+        Replace the rolling summary of a session.
+        
+        Args:
+            session_id: The session ID
+            content: The summary text
+            upto: Sequence number of the first message the summary does not cover
+            
+        Returns:
+            True if the summary was stored, False if the session changed
+            in the meantime (cleared, deleted or already compacted further)
+        """
+        content = SUMMARY_PREFIX + content
+        return self.store.set_summary(
+            session_id, content, count_tokens(content) + MESSAGE_OVERHEAD_TOKENS, upto
+        )
     
     def format_history_for_prompt(self, session_id: str, max_messages: int = 5) -> str:
         """
@@ -90,13 +202,11 @@ class ConversationService:
             Formatted conversation history
         """
         history = self.get_conversation_history(session_id, max_messages)
-        formatted_history = ""
-        
-        for msg in history:
-            role = "Human" if msg["role"] == "user" else "Assistant"
-            formatted_history += f"{role}: {msg['content']}\n\n"
         
-        return formatted_history.strip()
+        return "\n\n".join(
+            f"{'Human' if msg['role'] == 'user' else 'Assistant'}: {msg['content']}"
+            for msg in history
+        ).strip()
     
     def clear_conversation(self, session_id: str) -> bool:
         """
@@ -108,11 +218,7 @@ class ConversationService:
         Returns:
             True if successful, False otherwise
         """
-        if session_id in self.conversations:
-            self.conversations[session_id] = []
-            return True
-        
-        return False
+        return self.store.clear(session_id)
     
     def delete_session(self, session_id: str) -> bool:
         """
@@ -124,11 +230,7 @@ class ConversationService:
         Returns:
             True if successful, False otherwise
         """
-        if session_id in self.conversations:
-            del self.conversations[session_id]
-            return True
-        
-        return False
+        return self.store.delete(session_id)
     
     def get_all_sessions(self) -> List[str]:
         """
@@ -137,7 +239,7 @@ class ConversationService:
         Returns:
             List of session IDs
         """
-        return list(self.conversations.keys())
+        return self.store.session_ids()
 
 # Create a singleton instance
 conversation_service = ConversationService()
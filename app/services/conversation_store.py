@@ -0,0 +1,394 @@
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+import os
+import sqlite3
+import threading
+import time
+
+from app.core.config import settings
+
+# A stored message: (role, content, ISO timestamp, tokens)
+Message = Tuple[str, str, str, int]
+
+# Rough per-message memory beyond its text (tuple, strings, timestamp)
+MESSAGE_OVERHEAD_BYTES = 200
+
+class ConversationStore:
+    """Interface implemented by every conversation storage engine.
+
+    Each session holds a ring buffer of its newest messages, numbered by a
+    sequence number that keeps counting as old messages fall out, and an
+    optional rolling summary covering every message before summary_upto.
+    Sessions that stay idle longer than the TTL are evicted.
+
+    load() returns a dictionary with messages (oldest first), first_seq
+    (the sequence number of messages[0]), summary, summary_tokens and
+    summary_upto, or None if the session does not exist.
+    """
+
+    def create(self, session_id: str) -> None:
+        """Create an empty session."""
+        raise NotImplementedError
+
+    def append(self, session_id: str, message: Message) -> None:
+        """Append a message, creating the session if needed."""
+        raise NotImplementedError
+
+    def load(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Get the stored state of a session."""
+        raise NotImplementedError
+
+    def set_summary(self, session_id: str, content: str, tokens: int, upto: int) -> bool:
+        """
+        Replace the summary, unless the session is gone, has fewer than
+        upto messages or already has a summary reaching at least upto.
+        """
+        raise NotImplementedError
+
+    def clear(self, session_id: str) -> bool:
+        """Drop the messages and summary of a session, keeping the session."""
+        raise NotImplementedError
+
+    def delete(self, session_id: str) -> bool:
+        """Delete a session."""
+        raise NotImplementedError
+
+    def session_ids(self) -> List[str]:
+        """Return the IDs of all live sessions."""
+        raise NotImplementedError
+
+class _MemorySession:
+    """State of one session in MemoryConversationStore."""
+
+    __slots__ = ("messages", "next_seq", "summary", "summary_tokens", "summary_upto", "size", "last_access")
+
+    def __init__(self, max_messages: int):
+        self.messages = deque(maxlen=max_messages)
+        self.next_seq = 0
+        self.summary = None
+        self.summary_tokens = 0
+        self.summary_upto = 0
+        self.size = 0
+        self.last_access = time.monotonic()
+
+class MemoryConversationStore(ConversationStore):
+    """In-process store, bounded per session, by idle time and in total size.
+
+    Sessions are kept in least recently used order, so expired sessions
+    are always at the front and the global memory cap evicts the
+    longest-idle sessions first.
+    """
+
+    def __init__(self, max_messages: int, ttl_seconds: float, max_bytes: int):
+        """
+        Initialize the store.
+
+        Args:
+            max_messages: Messages kept per session (the oldest are dropped)
+            ttl_seconds: Idle seconds after which a session is evicted
+            max_bytes: Approximate memory cap for all sessions together
+        """
+        self.max_messages = max_messages
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._sessions = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+    def _evict(self, keep: Optional[str] = None) -> None:
+        # Expired sessions, then the least recently used while over the cap
+        deadline = time.monotonic() - self.ttl_seconds
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if session_id == keep:
+                break
+            if session.last_access >= deadline and self._total_bytes <= self.max_bytes:
+                break
+            self._total_bytes -= session.size
+            del self._sessions[session_id]
+
+    def _get(self, session_id: str) -> Optional[_MemorySession]:
+        self._evict()
+        session = self._sessions.get(session_id)
+        if session is not None:
+            session.last_access = time.monotonic()
+            self._sessions.move_to_end(session_id)
+        return session
+
+    def _resize(self, session: _MemorySession, size: int) -> None:
+        self._total_bytes += size - session.size
+        session.size = size
+
+    @staticmethod
+    def _message_bytes(message: Message) -> int:
+        return len(message[1]) + MESSAGE_OVERHEAD_BYTES
+
+    def create(self, session_id: str) -> None:
+        with self._lock:
+            if self._get(session_id) is None:
+                self._sessions[session_id] = _MemorySession(self.max_messages)
+
+    def append(self, session_id: str, message: Message) -> None:
+        with self._lock:
+            session = self._get(session_id)
+            if session is None:
+                session = self._sessions[session_id] = _MemorySession(self.max_messages)
+
+            size = session.size + self._message_bytes(message)
+            if len(session.messages) == self.max_messages:
+                size -= self._message_bytes(session.messages[0])
+            session.messages.append(message)
+            session.next_seq += 1
+            self._resize(session, size)
+            self._evict(keep=session_id)
+
+    def load(self, session_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            session = self._get(session_id)
+            if session is None:
+                return None
+            return {
+                "messages": list(session.messages),
+                "first_seq": session.next_seq - len(session.messages),
+                "summary": session.summary,
+                "summary_tokens": session.summary_tokens,
+                "summary_upto": session.summary_upto
+            }
+
+    def set_summary(self, session_id: str, content: str, tokens: int, upto: int) -> bool:
+        with self._lock:
+            session = self._get(session_id)
+            if session is None or upto > session.next_seq or session.summary_upto >= upto:
+                return False
+            self._resize(session, session.size + len(content) - len(session.summary or ""))
+            session.summary = content
+            session.summary_tokens = tokens
+            session.summary_upto = upto
+            return True
+
+    def clear(self, session_id: str) -> bool:
+        with self._lock:
+            session = self._get(session_id)
+            if session is None:
+                return False
+            session.messages.clear()
+            session.summary = None
+            session.summary_tokens = 0
+            # Summaries computed from the cleared messages are now stale
+            session.summary_upto = session.next_seq
+            self._resize(session, 0)
+            return True
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+            if session is None:
+                return False
+            self._total_bytes -= session.size
+            return True
+
+    def session_ids(self) -> List[str]:
+        with self._lock:
+            self._evict()
+            return list(self._sessions)
+
+class SQLiteConversationStore(ConversationStore):
+    """Conversation store in a SQLite file, shared by every worker process.
+
+    Writes that depend on the current state run in IMMEDIATE transactions,
+    so concurrent workers appending to the same session never reuse a
+    sequence number.
+    """
+
+    # Seconds between sweeps for idle sessions
+    PURGE_INTERVAL_SECONDS = 60
+
+    def __init__(self, path: str, max_messages: int, ttl_seconds: float):
+        """
+        Open (or create) the conversation database.
+
+        Args:
+            path: Path of the SQLite file
+            max_messages: Messages kept per session (the oldest are deleted)
+            ttl_seconds: Idle seconds after which a session is deleted
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.max_messages = max_messages
+        self.ttl_seconds = ttl_seconds
+        self._next_purge = 0.0
+        self._lock = threading.Lock()
+        # Autocommit mode; transactions are opened explicitly
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "session_id TEXT PRIMARY KEY, next_seq INTEGER NOT NULL, summary TEXT, "
+            "summary_tokens INTEGER NOT NULL, summary_upto INTEGER NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_sessions_last_access ON sessions (last_access)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS messages ("
+            "session_id TEXT NOT NULL, seq INTEGER NOT NULL, role TEXT NOT NULL, content TEXT NOT NULL, "
+            "timestamp TEXT NOT NULL, tokens INTEGER NOT NULL, PRIMARY KEY (session_id, seq)) WITHOUT ROWID"
+        )
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        """Run statements in one IMMEDIATE transaction (takes the write lock up front)."""
+        with self._lock:
+            self._purge_expired()
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _purge_expired(self) -> None:
+        # Called with the lock held; sweeps at most once per interval
+        now = time.time()
+        if now < self._next_purge:
+            return
+        self._next_purge = now + self.PURGE_INTERVAL_SECONDS
+        deadline = now - self.ttl_seconds
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._conn.execute(
+                "DELETE FROM messages WHERE session_id IN "
+                "(SELECT session_id FROM sessions WHERE last_access < ?)",
+                (deadline,)
+            )
+            self._conn.execute("DELETE FROM sessions WHERE last_access < ?", (deadline,))
+            self._conn.execute("COMMIT")
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+
+    def create(self, session_id: str) -> None:
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO sessions "
+                "(session_id, next_seq, summary, summary_tokens, summary_upto, last_access) "
+                "VALUES (?, 0, NULL, 0, 0, ?)",
+                (session_id, time.time())
+            )
+
+    def append(self, session_id: str, message: Message) -> None:
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT INTO sessions "
+                "(session_id, next_seq, summary, summary_tokens, summary_upto, last_access) "
+                "VALUES (?, 1, NULL, 0, 0, ?) "
+                "ON CONFLICT (session_id) DO UPDATE SET "
+                "next_seq = next_seq + 1, last_access = excluded.last_access",
+                (session_id, time.time())
+            )
+            seq = conn.execute(
+                "SELECT next_seq - 1 FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()[0]
+            conn.execute(
+                "INSERT INTO messages (session_id, seq, role, content, timestamp, tokens) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (session_id, seq, *message)
+            )
+            # Ring buffer: drop what falls out of the window
+            conn.execute(
+                "DELETE FROM messages WHERE session_id = ? AND seq <= ?",
+                (session_id, seq - self.max_messages)
+            )
+
+    def load(self, session_id: str) -> Optional[Dict[str, Any]]:
+        # IMMEDIATE because it also records the access time
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT next_seq, summary, summary_tokens, summary_upto FROM sessions WHERE session_id = ?",
+                (session_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE sessions SET last_access = ? WHERE session_id = ?", (time.time(), session_id)
+            )
+            messages = conn.execute(
+                "SELECT role, content, timestamp, tokens FROM messages WHERE session_id = ? ORDER BY seq",
+                (session_id,)
+            ).fetchall()
+
+        next_seq, summary, summary_tokens, summary_upto = row
+        return {
+            "messages": messages,
+            "first_seq": next_seq - len(messages),
+            "summary": summary,
+            "summary_tokens": summary_tokens,
+            "summary_upto": summary_upto
+        }
+
+    def set_summary(self, session_id: str, content: str, tokens: int, upto: int) -> bool:
+        with self._transaction() as conn:
+            # The conditions make the check and the write one atomic statement
+            cursor = conn.execute(
+                "UPDATE sessions SET summary = ?, summary_tokens = ?, summary_upto = ? "
+                "WHERE session_id = ? AND next_seq >= ? AND summary_upto < ?",
+                (content, tokens, upto, session_id, upto, upto)
+            )
+            return cursor.rowcount > 0
+
+    def clear(self, session_id: str) -> bool:
+        with self._transaction() as conn:
+            # Summaries computed from the cleared messages are now stale
+            cursor = conn.execute(
+                "UPDATE sessions SET summary = NULL, summary_tokens = 0, summary_upto = next_seq, "
+                "last_access = ? WHERE session_id = ?",
+                (time.time(), session_id)
+            )
+            conn.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+            return cursor.rowcount > 0
+
+    def delete(self, session_id: str) -> bool:
+        with self._transaction() as conn:
+            cursor = conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+            conn.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+            return cursor.rowcount > 0
+
+    def session_ids(self) -> List[str]:
+        with self._lock:
+            deadline = time.time() - self.ttl_seconds
+            rows = self._conn.execute(
+                "SELECT session_id FROM sessions WHERE last_access >= ?", (deadline,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+def create_conversation_store(store_type: Optional[str] = None) -> ConversationStore:
+    """
+    Create the conversation store selected by CONVERSATION_STORE.
+
+    Args:
+        store_type: Store name, defaults to settings.CONVERSATION_STORE
+
+    Returns:
+        Conversation store instance
+    """
+    store_type = store_type or settings.CONVERSATION_STORE
+
+    if store_type == "memory":
+        return MemoryConversationStore(
+            max_messages=settings.CONVERSATION_MAX_MESSAGES,
+            ttl_seconds=settings.CONVERSATION_SESSION_TTL_SECONDS,
+            max_bytes=settings.CONVERSATION_MAX_MEMORY_MB * 1024 * 1024
+        )
+    elif store_type == "sqlite":
+        return SQLiteConversationStore(
+            path=settings.CONVERSATION_DB_PATH,
+            max_messages=settings.CONVERSATION_MAX_MESSAGES,
+            ttl_seconds=settings.CONVERSATION_SESSION_TTL_SECONDS
+        )
+    else:
+        raise ValueError(f"Unsupported conversation store type: {store_type}")
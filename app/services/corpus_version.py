@@ -0,0 +1,59 @@
+import os
+import sqlite3
+import threading
+
+from app.core.config import settings
+
+class CorpusVersion:
+    """Counter that changes whenever chunks are added or removed.
+
+    It is kept in a SQLite file, so every process sharing the vector store
+    sees changes made by the others (e.g. the ingestion worker) and caches
+    of answers derived from the corpus can tell when they may be stale.
+    """
+
+    def __init__(self, path: str):
+        """
+        Open (or create) the counter database.
+
+        Args:
+            path: Path of the SQLite file
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS corpus (id INTEGER PRIMARY KEY CHECK (id = 0), version INTEGER NOT NULL)"
+        )
+        self._conn.execute("INSERT OR IGNORE INTO corpus (id, version) VALUES (0, 0)")
+
+    def get(self) -> int:
+        """Get the current version."""
+        with self._lock:
+            return self._conn.execute("SELECT version FROM corpus WHERE id = 0").fetchone()[0]
+
+    def bump(self) -> int:
+        """
+        Record a change to the corpus.
+
+        Returns:
+            The new version
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute("UPDATE corpus SET version = version + 1 WHERE id = 0")
+                version = self._conn.execute("SELECT version FROM corpus WHERE id = 0").fetchone()[0]
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            return version
+
+def create_corpus_version() -> CorpusVersion:
+    """Create the corpus version counter from settings."""
+    return CorpusVersion(settings.CORPUS_VERSION_PATH)
@@ -0,0 +1,112 @@
+from typing import Any, Dict, List, Optional
+import json
+import os
+import sqlite3
+import threading
+import zlib
+
+from app.core.config import settings
+
+class DocumentCache:
+    """Extracted text and skills of documents, keyed by path, size and mtime.
+
+    Matching reads the same SOWs and profiles over and over; with this
+    cache PyPDF2 and python-docx only run when a file is new or has
+    changed. Skills are stored with the fingerprint of the taxonomy that
+    extracted them and re-extracted from the cached text when it changes.
+    """
+
+    def __init__(self, path: str):
+        """
+        Open (or create) the document cache.
+
+        Args:
+            path: Path of the SQLite file
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            "path TEXT PRIMARY KEY, size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL, "
+            "text BLOB NOT NULL, taxonomy TEXT NOT NULL, skills TEXT NOT NULL)"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def _key(file_path: str) -> str:
+        return os.path.abspath(file_path)
+
+    def get(self, file_path: str, size: int, mtime_ns: int) -> Optional[Dict[str, Any]]:
+        """
+        Look up a document.
+
+        Args:
+            file_path: Path to the document
+            size: Current size of the file
+            mtime_ns: Current modification time of the file
+
+        Returns:
+            Dictionary with text, taxonomy and skills, or None if the file
+            was never cached or has changed since
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT size, mtime_ns, text, taxonomy, skills FROM documents WHERE path = ?",
+                (self._key(file_path),)
+            ).fetchone()
+
+        if row is None or row[0] != size or row[1] != mtime_ns:
+            return None
+        return {"text": zlib.decompress(row[2]).decode("utf-8"), "taxonomy": row[3], "skills": json.loads(row[4])}
+
+    def put(self, file_path: str, size: int, mtime_ns: int, text: str, taxonomy: str, skills: List[str]) -> None:
+        """
+        Store a parsed document, replacing any previous version.
+
+        Args:
+            file_path: Path to the document
+            size: Size of the file that was parsed
+            mtime_ns: Modification time of the file that was parsed
+            text: Extracted text
+            taxonomy: Fingerprint of the skill taxonomy used
+            skills: Extracted skills
+        """
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO documents (path, size, mtime_ns, text, taxonomy, skills) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (self._key(file_path), size, mtime_ns, zlib.compress(text.encode("utf-8")), taxonomy, json.dumps(skills))
+            )
+            self._conn.commit()
+
+    def delete(self, file_path: str) -> None:
+        """
+        Forget a document.
+
+        Args:
+            file_path: Path to the document
+        """
+        with self._lock:
+            self._conn.execute("DELETE FROM documents WHERE path = ?", (self._key(file_path),))
+            self._conn.commit()
+
+    def clear(self) -> None:
+        """Forget every document."""
+        with self._lock:
+            self._conn.execute("DELETE FROM documents")
+            self._conn.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+def create_document_cache() -> Optional[DocumentCache]:
+    """Create the document cache from settings, or None if disabled."""
+    if not settings.DOCUMENT_CACHE_ENABLED:
+        return None
+    return DocumentCache(settings.DOCUMENT_CACHE_PATH)
@@ -1,35 +1,57 @@
 import os
+import hashlib
 import PyPDF2
 import docx
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Tuple, Optional, Iterable, Iterator
 import re
 
 from app.core.config import settings
+from app.services.tokenizer import get_length_function
+from app.services.skill_matcher import skill_matcher
 
 def read_text_file(file_path: str) -> str:
     """Read content from a text file."""
     with open(file_path, 'r', encoding='utf-8') as file:
         return file.read()
 
-def read_pdf_file(file_path: str) -> str:
-    """Read content from a PDF file."""
-    text = ""
+def iter_text_blocks(file_path: str, max_block_size: int = 65536) -> Iterator[str]:
+    """Yield a text file paragraph by paragraph, in blocks of bounded size."""
+    with open(file_path, 'r', encoding='utf-8') as file:
+        block = []
+        block_size = 0
+        for line in file:
+            block.append(line)
+            block_size += len(line)
+            if not line.strip() or block_size >= max_block_size:
+                yield ''.join(block)
+                block = []
+                block_size = 0
+        if block:
+            yield ''.join(block)
+
+def iter_pdf_pages(file_path: str) -> Iterator[str]:
+    """Yield the extracted text of each PDF page."""
     with open(file_path, 'rb') as file:
         pdf_reader = PyPDF2.PdfReader(file)
         for page in pdf_reader.pages:
             page_text = page.extract_text()
             if page_text:  # Some PDF pages might not have extractable text
-                text += page_text + "\n\n"
-    return text
+                yield page_text
 
-def read_docx_file(file_path: str) -> str:
-    """Read content from a Word document."""
+def read_pdf_file(file_path: str) -> str:
+    """Read content from a PDF file."""
+    return ''.join(page_text + "\n\n" for page_text in iter_pdf_pages(file_path))
+
+def iter_docx_paragraphs(file_path: str) -> Iterator[str]:
+    """Yield the non-empty paragraphs of a Word document."""
     doc = docx.Document(file_path)
-    full_text = []
     for para in doc.paragraphs:
         if para.text:
-            full_text.append(para.text)
-    return '\n'.join(full_text)
+            yield para.text
+
+def read_docx_file(file_path: str) -> str:
+    """Read content from a Word document."""
+    return '\n'.join(iter_docx_paragraphs(file_path))
 
 def read_document(file_path: str) -> str:
     """Read document content based on file extension."""
@@ -45,17 +67,124 @@ def read_document(file_path: str) -> str:
     else:
         raise ValueError(f"Unsupported file format: {file_extension}")
 
-def split_text(text: str, chunk_size: int = None, chunk_overlap: int = None) -> List[str]:
+def iter_document(file_path: str) -> Iterator[str]:
+    """Yield document content block by block (pages or paragraphs)."""
+    _, file_extension = os.path.splitext(file_path)
+    file_extension = file_extension.lower()
+
+    # Blocks keep the separators read_document would put between them
+    if file_extension == '.txt':
+        return iter_text_blocks(file_path)
+    elif file_extension == '.pdf':
+        return (page_text + "\n\n" for page_text in iter_pdf_pages(file_path))
+    elif file_extension == '.docx':
+        return (paragraph + '\n' for paragraph in iter_docx_paragraphs(file_path))
+    else:
+        raise ValueError(f"Unsupported file format: {file_extension}")
+
+def document_type(file_name: str) -> str:
+    """Return the document type of a file: its lowercase extension without the dot."""
+    return os.path.splitext(file_name)[1].lower().lstrip(".")
+
+def file_content_hash(file_path: str) -> str:
+    """Compute the SHA-256 hash of a file's contents."""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for block in iter(lambda: file.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+# A sentence ends at terminal punctuation followed by whitespace, or at a
+# paragraph break (a blank line)
+_SEGMENT_BOUNDARY = re.compile(r'[.!?]\s+|\n[ \t]*\n\s*')
+_PARAGRAPH_BREAK = re.compile(r'\n[ \t]*\n')
+
+# A new paragraph closes the current chunk once it is at least this full
+PARAGRAPH_FLUSH_RATIO = 0.5
+
+# Characters per token assumed when bounding unpunctuated text for token-sized chunks
+CHARS_PER_TOKEN = 4
+
+def iter_sentences(blocks: Iterable[str], max_length: Optional[int] = None) -> Iterator[Tuple[str, bool]]:
     """
-    Split text into chunks while preserving sentence boundaries.
+    Split a stream of text blocks into sentences.
+    
+    Blocks are treated as consecutive pieces of one text. A sentence may
+    span blocks (e.g. a page break mid-sentence); the unfinished tail of
+    each block is carried over to the next one and is not scanned again.
+    A tail that grows past max_length characters without a boundary (a
+    table, or text without punctuation) is split at whitespace, so the
+    carried-over text stays bounded.
     
     Args:
-        text: The text to split
-        chunk_size: Maximum size of each chunk in characters
-        chunk_overlap: Number of characters to overlap between chunks
+        blocks: Iterable of text blocks
+        max_length: Longest text yielded without a sentence boundary, unbounded when None
+    
+    Yields:
+        Tuples of (sentence, starts_paragraph)
+    """
+    pending = ''
+    paragraph_start = True
+    for block in blocks:
+        # The tail was scanned already; only its trailing whitespace and the
+        # character before it can still be part of a boundary
+        scan_from = max(len(pending.rstrip()) - 1, 0)
+        text = pending + block
+        position = 0
+        for match in _SEGMENT_BOUNDARY.finditer(text, scan_from):
+            if match.end() == len(text):
+                # The whitespace may continue in the next block
+                break
+            # Terminal punctuation is matched too; it belongs to the sentence
+            end = match.start() + 1 if match.group()[0] in '.!?' else match.start()
+            sentence = text[position:end].replace('\n', ' ').strip()
+            if sentence:
+                yield sentence, paragraph_start
+                paragraph_start = False
+            if _PARAGRAPH_BREAK.search(match.group()):
+                paragraph_start = True
+            position = match.end()
+        pending = text[position:]
         
-    Returns:
-        List of text chunks
+        while max_length and len(pending) > max_length:
+            cut = max(pending.rfind(space, 0, max_length) for space in ' \n\t')
+            if cut <= 0:
+                cut = max_length
+            sentence = pending[:cut].replace('\n', ' ').strip()
+            if sentence:
+                yield sentence, paragraph_start
+                paragraph_start = False
+            pending = pending[cut:]
+    
+    sentence = pending.replace('\n', ' ').strip()
+    if sentence:
+        yield sentence, paragraph_start
+
+def iter_split_text(
+    blocks: Iterable[str],
+    chunk_size: int = None,
+    chunk_overlap: int = None,
+    unit: str = None,
+    preserve_paragraphs: bool = None
+) -> Iterator[str]:
+    """
+    Split a stream of text blocks into chunks while preserving sentence boundaries.
+    
+    Runs in a single pass in linear time: each sentence is measured once,
+    and the overlap is taken from the tail of the chunk being closed.
+    Chunks are yielded as soon as they are complete, so memory use does
+    not depend on the size of the document.
+    
+    Args:
+        blocks: Iterable of text blocks (pages, paragraphs, ...)
+        chunk_size: Maximum size of each chunk
+        chunk_overlap: Amount of text to overlap between chunks
+        unit: Unit of chunk_size and chunk_overlap, "chars" or "tokens"
+        preserve_paragraphs: Keep paragraph breaks in chunks and prefer
+            closing chunks at paragraph boundaries
+        
+    Yields:
+        Text chunks
     """
     if chunk_size is None:
         chunk_size = settings.CHUNK_SIZE
@@ -63,53 +192,114 @@ def split_text(text: str, chunk_size: int = None, chunk_overlap: int = None) ->
     if chunk_overlap is None:
         chunk_overlap = settings.CHUNK_OVERLAP
     
-    # Clean the text
-    text = text.replace('\n', ' ').strip()
+    if preserve_paragraphs is None:
+        preserve_paragraphs = settings.CHUNK_PRESERVE_PARAGRAPHS
     
-    # Split into sentences
-    sentences = re.split(r'(?<=[.!?])\s+', text)
+    measure = get_length_function(unit)
+    # Separator costs in the chosen unit (joining spaces are free in tokens)
+    space_size = measure(' ') if measure is len else 0
+    paragraph_size = measure('\n\n') if measure is len else 0
     
-    chunks = []
-    current_chunk = []
+    # Parallel lists: sentence text, its size, whether it opens a paragraph
+    # and the size of the separator joining it to the previous sentence
+    sentences = []
+    sizes = []
+    breaks = []
+    separators = []
     current_size = 0
-
-    for sentence in sentences:
-        sentence = sentence.strip()
-        if not sentence:
-            continue
-
-        # Ensure proper sentence ending
-        if not any(sentence.endswith(end) for end in ['.', '!', '?']):
-            sentence += '.'
-
-        sentence_size = len(sentence)
-
-        # Check if adding this sentence would exceed chunk size
-        if current_size + sentence_size > chunk_size and current_chunk:
-            chunks.append(' '.join(current_chunk))
+    
+    def join() -> str:
+        parts = [sentences[0]]
+        for sentence, paragraph_start in zip(sentences[1:], breaks[1:]):
+            parts.append('\n\n' if paragraph_start else ' ')
+            parts.append(sentence)
+        return ''.join(parts)
+    
+    max_length = chunk_size if measure is len else chunk_size * CHARS_PER_TOKEN
+    for sentence, paragraph_start in iter_sentences(blocks, max_length):
+        if not preserve_paragraphs:
+            paragraph_start = False
+            # Ensure proper sentence ending
+            if sentence[-1] not in '.!?':
+                sentence += '.'
+        
+        sentence_size = measure(sentence)
+        separator_size = paragraph_size if paragraph_start else space_size
+        
+        if sentences and paragraph_start and current_size >= chunk_size * PARAGRAPH_FLUSH_RATIO:
+            # Close the chunk at the paragraph boundary, without overlap
+            yield join()
+            sentences, sizes, breaks, separators = [], [], [], []
+            current_size = 0
+        elif sentences and current_size + separator_size + sentence_size > chunk_size:
+            yield join()
             
-            # Keep some sentences for overlap
+            # Keep the trailing sentences that fit in the overlap budget
+            keep = 0
             overlap_size = 0
-            overlap_sentences = []
-            
-            for s in reversed(current_chunk):
-                if overlap_size + len(s) <= chunk_overlap:
-                    overlap_sentences.insert(0, s)
-                    overlap_size += len(s) + 1  # +1 for the space
-                else:
+            for i in range(len(sizes) - 1, -1, -1):
+                added = sizes[i] + (separators[i + 1] if keep else 0)
+                if overlap_size + added > chunk_overlap:
                     break
+                overlap_size += added
+                keep += 1
             
-            current_chunk = overlap_sentences + [sentence]
-            current_size = sum(len(s) for s in current_chunk) + len(current_chunk) - 1  # -1 because no space after last sentence
-        else:
-            current_chunk.append(sentence)
-            current_size += sentence_size + (1 if current_chunk else 0)  # +1 for the space
-
+            # Drop overlap that would leave no room for the incoming sentence
+            while keep and overlap_size + separator_size + sentence_size > chunk_size:
+                keep -= 1
+                overlap_size -= sizes[-keep - 1] + (separators[-keep] if keep else 0)
+            
+            if keep:
+                sentences, sizes = sentences[-keep:], sizes[-keep:]
+                breaks, separators = breaks[-keep:], separators[-keep:]
+            else:
+                sentences, sizes, breaks, separators = [], [], [], []
+            current_size = overlap_size
+        
+        if sentences:
+            current_size += separator_size
+        sentences.append(sentence)
+        sizes.append(sentence_size)
+        breaks.append(paragraph_start)
+        separators.append(separator_size)
+        current_size += sentence_size
+    
     # Add the last chunk if it exists
-    if current_chunk:
-        chunks.append(' '.join(current_chunk))
+    if sentences:
+        yield join()
+
+def split_text(text: str, chunk_size: int = None, chunk_overlap: int = None) -> List[str]:
+    """
+    Split text into chunks while preserving sentence boundaries.
+    
+    Args:
+        text: The text to split
+        chunk_size: Maximum size of each chunk (in CHUNK_SIZE_UNIT)
+        chunk_overlap: Amount of text to overlap between chunks
+        
+    Returns:
+        List of text chunks
+    """
+    return list(iter_split_text([text], chunk_size, chunk_overlap))
 
-    return chunks
+def iter_document_chunks(file_path: str) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Stream a document as (chunk, metadata) pairs.
+    
+    Args:
+        file_path: Path to the document
+        
+    Yields:
+        Tuples of (chunk, metadata)
+    """
+    file_name = os.path.basename(file_path)
+    for i, chunk in enumerate(iter_split_text(iter_document(file_path))):
+        yield chunk, {
+            "source": file_name,
+            "doc_type": document_type(file_name),
+            "chunk_index": i,
+            "file_path": file_path
+        }
 
 def process_document(file_path: str) -> Tuple[List[str], List[Dict[str, Any]]]:
     """
@@ -122,58 +312,61 @@ def process_document(file_path: str) -> Tuple[List[str], List[Dict[str, Any]]]:
         Tuple of (chunks, metadatas)
     """
     try:
-        # Read the document
-        content = read_document(file_path)
-
-        # Split into chunks
-        chunks = split_text(content)
-
-        # Prepare metadata
-        file_name = os.path.basename(file_path)
-        metadatas = [
-            {
-                "source": file_name,
-                "chunk_index": i,
-                "file_path": file_path
-            } 
-            for i in range(len(chunks))
-        ]
+        chunks = []
+        metadatas = []
+        for chunk, metadata in iter_document_chunks(file_path):
+            chunks.append(chunk)
+            metadatas.append(metadata)
 
         return chunks, metadatas
     except Exception as e:
         print(f"Error processing {file_path}: {str(e)}")
         return [], []
 
-def extract_skills_from_text(text: str) -> List[str]:
+def prepare_document(
+    file_path: str,
+    known_hash: Optional[str] = None
+) -> Tuple[str, Optional[List[str]], Optional[List[Dict[str, Any]]]]:
     """
-    Extract skills from text using simple keyword matching.
-    In a production system, this would use NER or more sophisticated techniques.
+    Hash, read and chunk a document for ingestion.
+    
+    Unlike process_document this raises on errors, and it skips parsing
+    entirely when the file's hash equals known_hash. It is a module-level
+    function so it can run in a process pool.
     
     Args:
-        text: The text to extract skills from
+        file_path: Path to the document
+        known_hash: Content hash of the previously ingested version, if any
         
     Returns:
-        List of extracted skills
+        Tuple of (content_hash, chunks, metadatas); chunks and metadatas are
+        None when the file is unchanged
     """
-    # This is a simplified implementation
-    # In a real system, you would use NER or ML-based extraction
-    common_skills = [
-        "python", "javascript", "java", "c++", "c#", "ruby", "go", "rust",
-        "react", "angular", "vue", "node.js", "django", "flask", "fastapi",
-        "docker", "kubernetes", "aws", "azure", "gcp", "terraform",
-        "machine learning", "deep learning", "nlp", "computer vision",
-        "data science", "data analysis", "data engineering", "devops",
-        "project management", "agile", "scrum", "product management"
-    ]
+    content_hash = file_content_hash(file_path)
+    if content_hash == known_hash:
+        return content_hash, None, None
     
-    found_skills = []
-    text_lower = text.lower()
+    chunks = []
+    metadatas = []
+    for chunk, metadata in iter_document_chunks(file_path):
+        chunks.append(chunk)
+        metadatas.append(metadata)
     
-    for skill in common_skills:
-        if skill in text_lower:
-            found_skills.append(skill)
+    return content_hash, chunks, metadatas
+
+def extract_skills_from_text(text: str) -> List[str]:
+    """
+    Extract skills from text by matching the skill taxonomy.
+    In a production system, this would use NER or more sophisticated techniques.
     
-    return found_skills
+    Args:
+        text: The text to extract skills from
+        
+    Returns:
+        List of extracted skills (canonical names, synonyms resolved)
+    """
+    # One pass over the text with whole-word matching (see SkillMatcher)
+    return skill_matcher.extract(text)
 
 def extract_requirements_from_sow(sow_text: str) -> List[str]:
     """
@@ -234,7 +427,8 @@ def match_resources_to_project(profiles: List[Dict[str, Any]], sow_text: str) ->
     matches = []
     
     for profile in profiles:
-        skills = extract_skills_from_text(profile["text"])
+        # Profiles read through the document cache come with their skills
+        skills = profile["skills"] if "skills" in profile else extract_skills_from_text(profile["text"])
         match_score = calculate_match_score(skills, sow_requirements)
         matching_skills = get_matching_skills(skills, sow_requirements)
         
@@ -0,0 +1,155 @@
+from contextlib import contextmanager
+from typing import Iterator, List, Dict, Optional
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import numpy as np
+
+from app.core.config import settings
+
+class EmbeddingCache:
+    """Persistent, content-addressed embedding cache backed by SQLite.
+
+    Entries are keyed by a hash of (embedding model, text) so unchanged
+    chunks are never re-embedded, across re-uploads and restarts. The cache
+    holds at most max_entries vectors and evicts the least recently used.
+    """
+
+    # Access times are only rewritten once they are this old, so repeated
+    # hits on the same chunks don't turn every lookup into a write
+    TOUCH_INTERVAL_SECONDS = 600
+
+    def __init__(self, path: str, max_entries: int):
+        """
+        Open (or create) the cache database.
+
+        Args:
+            path: Path of the SQLite file
+            max_entries: Maximum number of cached embeddings
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        # Shared by the API and worker processes: wait for their writes
+        # instead of failing, and take the write lock up front (BEGIN IMMEDIATE)
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_embeddings_last_access ON embeddings (last_access)"
+        )
+        # Upper bound on the entries, counted exactly only when it exceeds max_entries
+        self._count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        """Run statements in one IMMEDIATE transaction; the caller holds the lock."""
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield self._conn
+            self._conn.execute("COMMIT")
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+
+    @staticmethod
+    def make_key(model: str, text: str) -> str:
+        """Build the cache key for a (model, text) pair."""
+        return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).hexdigest()
+
+    def get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        """
+        Look up cached embeddings.
+
+        Args:
+            keys: Cache keys
+
+        Returns:
+            Mapping of key to embedding for the keys that were found
+        """
+        if not keys:
+            return {}
+
+        found = {}
+        stale = []
+        now = time.time()
+        unique_keys = list(dict.fromkeys(keys))
+        with self._lock:
+            # Stay well below SQLite's bound-parameter limit
+            for i in range(0, len(unique_keys), 500):
+                batch = unique_keys[i:i+500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector, last_access FROM embeddings WHERE key IN ({placeholders})",
+                    batch
+                ).fetchall()
+                for key, blob, last_access in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+                    if now - last_access >= self.TOUCH_INTERVAL_SECONDS:
+                        stale.append(key)
+
+            if stale:
+                with self._transaction() as conn:
+                    conn.executemany(
+                        "UPDATE embeddings SET last_access = ? WHERE key = ?",
+                        [(now, key) for key in stale]
+                    )
+
+        return found
+
+    def put_many(self, items: Dict[str, List[float]]) -> None:
+        """
+        Store embeddings and evict the least recently used entries if needed.
+
+        Args:
+            items: Mapping of key to embedding
+        """
+        if not items:
+            return
+
+        now = time.time()
+        rows = [
+            (key, np.asarray(vector, dtype=np.float32).tobytes(), now)
+            for key, vector in items.items()
+        ]
+        with self._lock, self._transaction() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, last_access) VALUES (?, ?, ?)",
+                rows
+            )
+            # Replaced keys and other processes' entries make the running
+            # count drift, so it is corrected whenever eviction may be due
+            self._count += len(rows)
+            if self._count > self.max_entries:
+                self._count = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+                if self._count > self.max_entries:
+                    conn.execute(
+                        "DELETE FROM embeddings WHERE key IN ("
+                        "SELECT key FROM embeddings ORDER BY last_access ASC LIMIT ?)",
+                        (self._count - self.max_entries,)
+                    )
+                    self._count = self.max_entries
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def clear(self) -> None:
+        """Remove all cached embeddings."""
+        with self._lock:
+            self._conn.execute("DELETE FROM embeddings")
+            self._count = 0
+
+def create_embedding_cache() -> Optional[EmbeddingCache]:
+    """Create the embedding cache from settings, or None if disabled."""
+    if not settings.EMBEDDING_CACHE_ENABLED:
+        return None
+    return EmbeddingCache(settings.EMBEDDING_CACHE_PATH, settings.EMBEDDING_CACHE_MAX_ENTRIES)
@@ -0,0 +1,507 @@
+from contextlib import contextmanager
+from typing import List, Dict, Any, Iterator, Optional, Tuple
+import json
+import os
+import re
+import sqlite3
+import threading
+import faiss
+import numpy as np
+
+from app.core.config import settings
+from app.services.vector_backends import FILTERABLE_FIELDS, VectorBackend
+
+class FaissBackend(VectorBackend):
+    """In-process vector backend built on FAISS, persisted as index snapshots plus a SQLite change log."""
+    
+    META_FILE = "meta.sqlite"
+    # Snapshot once the change log holds this many entries per indexed point...
+    SNAPSHOT_RATIO = 0.5
+    # ...and at least this many, so small indexes are not rewritten for every document
+    SNAPSHOT_MIN_CHANGES = 1000
+    
+    def __init__(self, index_dir: str, dimension: int, index_type: str = "flat"):
+        """
+        Initialize the backend, loading a persisted index if present.
+        
+        Args:
+            index_dir: Directory holding the index snapshots and the SQLite file
+            dimension: Vector dimension
+            index_type: "flat" or "ivf"
+        """
+        if index_type not in ("flat", "ivf"):
+            raise ValueError(f"Unsupported FAISS index type: {index_type}")
+        
+        self.index_dir = index_dir
+        self.dimension = dimension
+        self.index_type = index_type
+        self._lock = threading.RLock()
+        os.makedirs(index_dir, exist_ok=True)
+        
+        # Autocommit mode; transactions are opened explicitly
+        self._conn = sqlite3.connect(
+            os.path.join(index_dir, self.META_FILE), timeout=30, isolation_level=None, check_same_thread=False
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS points (int_id INTEGER PRIMARY KEY, id TEXT NOT NULL UNIQUE, payload TEXT NOT NULL)"
+        )
+        # A row with a NULL vector records a removal
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS changes (seq INTEGER PRIMARY KEY AUTOINCREMENT, int_id INTEGER NOT NULL, vector BLOB)"
+        )
+        self._load()
+    
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        """Run statements in one IMMEDIATE transaction (takes the write lock up front)."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+    
+    def _index_file(self, generation: int) -> str:
+        return os.path.join(self.index_dir, f"index.{generation}.faiss")
+    
+    @staticmethod
+    def _set_meta(conn: sqlite3.Connection, **values: int) -> None:
+        conn.executemany("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", list(values.items()))
+    
+    def _reset(self):
+        """Start with an empty index."""
+        self.index = faiss.IndexIDMap2(faiss.IndexFlatIP(self.dimension))
+        self._mmapped = False
+        self._is_ivf = False
+        self._next_id = 0
+        self._int_ids = {}
+        self._str_ids = {}
+        self._payloads = {}
+        # field -> value -> point IDs, for the fields search filters can use
+        self._filter_ids = {field: {} for field in FILTERABLE_FIELDS}
+        self._id_map = None
+    
+    def _map_point(self, int_id: int, str_id: str, payload: Dict[str, Any]) -> None:
+        self._int_ids[str_id] = int_id
+        self._str_ids[int_id] = str_id
+        self._payloads[str_id] = payload
+        for field, ids_by_value in self._filter_ids.items():
+            if field in payload:
+                ids_by_value.setdefault(payload[field], set()).add(int_id)
+    
+    def _unmap_point(self, int_id: int) -> None:
+        str_id = self._str_ids.pop(int_id)
+        del self._int_ids[str_id]
+        payload = self._payloads.pop(str_id, {})
+        for field, ids_by_value in self._filter_ids.items():
+            ids = ids_by_value.get(payload.get(field))
+            if ids is not None:
+                ids.discard(int_id)
+                if not ids:
+                    del ids_by_value[payload[field]]
+    
+    def _load(self):
+        """Load the latest snapshot, memory-mapped when enabled, and replay the change log."""
+        with self._lock:
+            # One read transaction, so a concurrent writer cannot commit a
+            # snapshot between reading the meta rows and the log
+            self._conn.execute("BEGIN")
+            try:
+                self._read(self._conn)
+            finally:
+                self._conn.execute("COMMIT")
+    
+    def _read(self, conn: sqlite3.Connection) -> None:
+        """Build the in-memory index from the database, within the caller's transaction."""
+        meta = dict(conn.execute("SELECT key, value FROM meta").fetchall())
+        points = conn.execute("SELECT int_id, id, payload FROM points").fetchall()
+        changes = conn.execute("SELECT seq, int_id, vector FROM changes ORDER BY seq").fetchall()
+        self._data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+        
+        if points and meta.get("dimension", self.dimension) != self.dimension:
+            raise ValueError(
+                f"FAISS index in {self.index_dir} holds {meta['dimension']}-dimensional vectors "
+                f"but {self.dimension} were configured; clear it and re-ingest the documents"
+            )
+        
+        self._reset()
+        self._generation = meta.get("generation", 0)
+        if self._generation and points:
+            # The log cannot be replayed onto a memory-mapped index
+            flags = faiss.IO_FLAG_MMAP if settings.FAISS_MMAP and not changes else 0
+            self.index = faiss.read_index(self._index_file(self._generation), flags)
+            self._mmapped = bool(flags)
+            self._is_ivf = bool(meta.get("is_ivf", 0))
+        
+        self._next_id = meta.get("next_id", 0)
+        for int_id, str_id, payload in points:
+            self._map_point(int_id, str_id, json.loads(payload))
+        self._apply_changes([(int_id, vector) for _, int_id, vector in changes])
+        self._changes = len(changes)
+        self._seq = changes[-1][0] if changes else 0
+        self._configure_search()
+        if points:
+            print(f"Loaded FAISS index with {self.index.ntotal} vectors from {self.index_dir}")
+    
+    def _apply_changes(self, changes: List[Tuple[int, Optional[bytes]]]) -> None:
+        """
+        Replay change-log rows onto the index.
+        
+        Point IDs are never reused, so applying every addition before every
+        removal gives the same index as replaying the rows in order.
+        """
+        self._id_map = None
+        added = [(int_id, vector) for int_id, vector in changes if vector is not None]
+        removed = [int_id for int_id, vector in changes if vector is None]
+        if added:
+            vectors = np.frombuffer(b"".join(vector for _, vector in added), dtype=np.float32)
+            self.index.add_with_ids(
+                vectors.reshape(-1, self.dimension), np.asarray([int_id for int_id, _ in added], dtype=np.int64)
+            )
+        if removed:
+            self.index.remove_ids(faiss.IDSelectorArray(np.asarray(removed, dtype=np.int64)))
+    
+    def _refresh(self, conn: sqlite3.Connection) -> None:
+        """Catch up with changes other processes committed, within the caller's transaction."""
+        meta = dict(conn.execute("SELECT key, value FROM meta").fetchall())
+        data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+        if data_version == self._data_version:
+            return
+        if meta.get("generation", 0) != self._generation:
+            # Another process wrote a snapshot and truncated the log
+            self._read(conn)
+            return
+        
+        self._data_version = data_version
+        self._next_id = meta.get("next_id", self._next_id)
+        # Points added and removed again since have no row left; their
+        # removal entries follow in the log
+        changes = conn.execute(
+            "SELECT c.seq, c.int_id, c.vector, p.id, p.payload FROM changes c "
+            "LEFT JOIN points p ON p.int_id = c.int_id AND c.vector IS NOT NULL "
+            "WHERE c.seq > ? ORDER BY c.seq",
+            (self._seq,)
+        ).fetchall()
+        if not changes:
+            return
+        
+        self._ensure_writable()
+        self._apply_changes([(int_id, vector) for _, int_id, vector, _, _ in changes])
+        for _, int_id, vector, str_id, payload in changes:
+            if vector is None:
+                if int_id in self._str_ids:
+                    self._unmap_point(int_id)
+            elif str_id is not None:
+                self._map_point(int_id, str_id, json.loads(payload))
+        self._changes += len(changes)
+        self._seq = changes[-1][0]
+    
+    def _sync(self) -> None:
+        """Catch up with other processes before a read."""
+        # data_version only changes when another connection commits
+        if self._conn.execute("PRAGMA data_version").fetchone()[0] == self._data_version:
+            return
+        self._conn.execute("BEGIN")
+        try:
+            self._refresh(self._conn)
+        finally:
+            self._conn.execute("COMMIT")
+    
+    def _ensure_writable(self):
+        """Re-read a memory-mapped index into RAM before mutating it."""
+        if self._mmapped:
+            self.index = faiss.read_index(self._index_file(self._generation))
+            self._mmapped = False
+            self._configure_search()
+    
+    def _configure_search(self):
+        """Apply search-time parameters to IVF indexes."""
+        if self._is_ivf:
+            ivf = faiss.extract_index_ivf(self.index)
+            ivf.nprobe = settings.FAISS_IVF_NPROBE
+    
+    def _maybe_train_ivf(self) -> bool:
+        """
+        Migrate the flat index to IVF once there are enough training points.
+        
+        Returns:
+            Whether the index was migrated
+        """
+        nlist = settings.FAISS_IVF_NLIST
+        # FAISS wants roughly 39 training points per centroid
+        if self.index_type != "ivf" or self._is_ivf or self.index.ntotal < nlist * 39:
+            return False
+        
+        flat = faiss.downcast_index(self.index.index)
+        vectors = flat.reconstruct_n(0, self.index.ntotal)
+        ids = faiss.vector_to_array(self.index.id_map)
+        
+        quantizer = faiss.IndexFlatIP(self.dimension)
+        ivf = faiss.IndexIVFFlat(quantizer, self.dimension, nlist, faiss.METRIC_INNER_PRODUCT)
+        ivf.train(vectors)
+        # IVF stores IDs natively; a hashtable direct map keeps reconstruct()
+        # and remove_ids() working by point ID without an IndexIDMap2 wrapper
+        ivf.set_direct_map_type(faiss.DirectMap.Hashtable)
+        ivf.add_with_ids(vectors, ids)
+        
+        self.index = ivf
+        self._is_ivf = True
+        self._configure_search()
+        print(f"Trained FAISS IVF index with {nlist} lists on {len(ids)} vectors")
+        return True
+    
+    def _snapshot(self, conn: sqlite3.Connection) -> None:
+        """
+        Write the index as a new generation and truncate the change log.
+        
+        The file is complete before the transaction that points the meta
+        row at it commits; until then the previous snapshot and its log
+        remain in effect.
+        """
+        generation = self._generation + 1
+        faiss.write_index(self.index, self._index_file(generation))
+        conn.execute("DELETE FROM changes")
+        self._set_meta(
+            conn,
+            generation=generation,
+            next_id=self._next_id,
+            is_ivf=int(self._is_ivf),
+            dimension=self.dimension
+        )
+        self._generation = generation
+        self._changes = 0
+    
+    def _remove_old_snapshots(self) -> None:
+        """
+        Delete snapshot files older than the previous generation.
+        
+        The previous one is kept for processes that read the meta row just
+        before the new snapshot was committed.
+        """
+        for name in os.listdir(self.index_dir):
+            match = re.fullmatch(r"index\.(\d+)\.faiss", name)
+            if match and int(match.group(1)) < self._generation - 1:
+                os.remove(os.path.join(self.index_dir, name))
+    
+    def _normalize(self, vectors: List[List[float]]) -> np.ndarray:
+        # Inner products of unit vectors are cosine similarities, as in Qdrant
+        array = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dimension)
+        faiss.normalize_L2(array)
+        return array
+    
+    def _result(self, int_id: int, score: Any, with_vectors: bool) -> Dict[str, Any]:
+        str_id = self._str_ids[int_id]
+        result = {
+            "id": str_id,
+            "score": score,
+            "payload": self._payloads.get(str_id, {})
+        }
+        if with_vectors:
+            result["vector"] = self.index.reconstruct(int_id).tolist()
+        return result
+    
+    def _search(
+        self,
+        array: np.ndarray,
+        top_k: int,
+        filters: Optional[Dict[str, List[str]]]
+    ) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Search the index, restricted to points matching the filters.
+        
+        Returns None when no point matches, so callers can skip the search.
+        """
+        if not filters:
+            return self.index.search(array, top_k)
+        
+        allowed = None
+        for field, values in filters.items():
+            ids_by_value = self._filter_ids.get(field, {})
+            matching = set().union(*(ids_by_value.get(value, ()) for value in values))
+            allowed = matching if allowed is None else allowed & matching
+            if not allowed:
+                return None
+        allowed = np.fromiter(sorted(allowed), dtype=np.int64, count=len(allowed))
+        
+        if self._is_ivf:
+            # IVF indexes store point IDs natively, so the selector sees them directly
+            selector = faiss.IDSelectorBatch(allowed)
+            params = faiss.SearchParametersIVF(sel=selector, nprobe=settings.FAISS_IVF_NPROBE)
+            return self.index.search(array, top_k, params=params)
+        
+        # IndexIDMap2 does not accept search parameters, so select by position
+        # in the wrapped flat index and map the labels back to point IDs.
+        # Point IDs only grow and removals keep the order, so the ID map is
+        # sorted and positions are found by binary search
+        if self._id_map is None:
+            self._id_map = faiss.vector_to_array(self.index.id_map)
+        id_map = self._id_map
+        selector = faiss.IDSelectorBatch(np.searchsorted(id_map, allowed).astype(np.int64))
+        scores, labels = self.index.index.search(array, top_k, params=faiss.SearchParameters(sel=selector))
+        return scores, np.where(labels >= 0, id_map[np.maximum(labels, 0)], -1)
+    
+    def _remove_int_ids(self, conn: sqlite3.Connection, int_ids: List[int]) -> None:
+        if not int_ids:
+            return
+        self.index.remove_ids(faiss.IDSelectorArray(np.asarray(int_ids, dtype=np.int64)))
+        self._id_map = None
+        for int_id in int_ids:
+            self._unmap_point(int_id)
+        
+        conn.executemany("DELETE FROM points WHERE int_id = ?", [(int_id,) for int_id in int_ids])
+        conn.executemany("INSERT INTO changes (int_id) VALUES (?)", [(int_id,) for int_id in int_ids])
+        self._changes += len(int_ids)
+    
+    @contextmanager
+    def _mutation(self) -> Iterator[sqlite3.Connection]:
+        """
+        Open a write transaction for an in-memory change that must reach the database.
+        
+        Changes committed by other processes are applied first, so point IDs
+        are not reused and snapshots include them. If the transaction fails,
+        the in-memory index is reloaded so it does not keep changes that
+        were rolled back.
+        """
+        with self._lock:
+            try:
+                with self._transaction() as conn:
+                    self._refresh(conn)
+                    self._ensure_writable()
+                    yield conn
+                    self._seq = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM changes").fetchone()[0]
+            except BaseException:
+                self._load()
+                raise
+    
+    def add(self, ids: List[str], vectors: List[List[float]], payloads: List[Dict[str, Any]]) -> None:
+        if not ids:
+            return
+        
+        array = self._normalize(vectors)
+        with self._mutation() as conn:
+            # Upsert semantics: replace existing points with the same ID
+            self._remove_int_ids(conn, [self._int_ids[str_id] for str_id in ids if str_id in self._int_ids])
+            
+            int_ids = np.arange(self._next_id, self._next_id + len(ids), dtype=np.int64)
+            self._next_id += len(ids)
+            
+            self.index.add_with_ids(array, int_ids)
+            self._id_map = None
+            for str_id, int_id, payload in zip(ids, int_ids.tolist(), payloads):
+                self._map_point(int_id, str_id, payload)
+            
+            conn.executemany(
+                "INSERT INTO points (int_id, id, payload) VALUES (?, ?, ?)",
+                [(int_id, str_id, json.dumps(payload)) for str_id, int_id, payload in zip(ids, int_ids.tolist(), payloads)]
+            )
+            conn.executemany(
+                "INSERT INTO changes (int_id, vector) VALUES (?, ?)",
+                [(int_id, row.tobytes()) for int_id, row in zip(int_ids.tolist(), array)]
+            )
+            self._changes += len(ids)
+            self._set_meta(conn, next_id=self._next_id, dimension=self.dimension)
+            
+            # The log holds flat-index changes, so a freshly trained IVF index is written at once
+            if self._maybe_train_ivf():
+                self._snapshot(conn)
+        self._remove_old_snapshots()
+    
+    def search(
+        self,
+        vector: List[float],
+        top_k: int,
+        with_vectors: bool = False,
+        filters: Optional[Dict[str, List[str]]] = None
+    ) -> List[Dict[str, Any]]:
+        with self._lock:
+            self._sync()
+            if self.index.ntotal == 0:
+                return []
+            
+            found = self._search(self._normalize([vector]), top_k, filters)
+            if found is None:
+                return []
+            
+            scores, int_ids = found
+            return [
+                self._result(int_id, float(score), with_vectors)
+                for score, int_id in zip(scores[0].tolist(), int_ids[0].tolist())
+                if int_id != -1
+            ]
+    
+    def search_batch(
+        self,
+        vectors: List[List[float]],
+        top_k: int,
+        with_vectors: bool = False,
+        filters: Optional[Dict[str, List[str]]] = None
+    ) -> List[List[Dict[str, Any]]]:
+        with self._lock:
+            self._sync()
+            if self.index.ntotal == 0 or not vectors:
+                return [[] for _ in vectors]
+            
+            # A single matrix search is much faster than one search per row
+            found = self._search(self._normalize(vectors), top_k, filters)
+            if found is None:
+                return [[] for _ in vectors]
+            
+            scores, int_ids = found
+            return [
+                [
+                    self._result(int_id, float(score), with_vectors)
+                    for score, int_id in zip(row_scores, row_ids)
+                    if int_id != -1
+                ]
+                for row_scores, row_ids in zip(scores.tolist(), int_ids.tolist())
+            ]
+    
+    def retrieve(self, ids: List[str], with_vectors: bool = False) -> List[Dict[str, Any]]:
+        with self._lock:
+            self._sync()
+            return [
+                self._result(self._int_ids[str_id], None, with_vectors)
+                for str_id in ids
+                if str_id in self._int_ids
+            ]
+    
+    def delete(self, ids: List[str]) -> None:
+        with self._mutation() as conn:
+            self._remove_int_ids(conn, [self._int_ids[str_id] for str_id in ids if str_id in self._int_ids])
+    
+    def delete_by_source(self, source: str) -> None:
+        with self._mutation() as conn:
+            self._remove_int_ids(conn, list(self._filter_ids["source"].get(source, ())))
+    
+    def count(self) -> int:
+        with self._lock:
+            self._sync()
+            return self.index.ntotal
+    
+    def iter_payloads(self, batch_size: int = 256) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        with self._lock:
+            self._sync()
+            items = list(self._payloads.items())
+        yield from items
+    
+    def persist(self) -> None:
+        # Every change is already committed to the log; snapshot once replaying it gets costly
+        with self._lock:
+            with self._transaction() as conn:
+                # Include what other processes logged, since the snapshot truncates the log
+                self._refresh(conn)
+                if self._changes < max(self.SNAPSHOT_MIN_CHANGES, self.SNAPSHOT_RATIO * self.index.ntotal):
+                    return
+                self._snapshot(conn)
+            self._remove_old_snapshots()
+    
+    def clear(self) -> None:
+        with self._mutation() as conn:
+            conn.execute("DELETE FROM points")
+            self._reset()
+            self._snapshot(conn)
+        self._remove_old_snapshots()
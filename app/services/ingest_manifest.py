@@ -0,0 +1,93 @@
+from typing import Dict, Any, Optional
+import json
+import os
+import sqlite3
+import threading
+
+from app.core.config import settings
+
+class IngestManifest:
+    """Record of what has been ingested for each source file.
+
+    For every source it keeps the content hash of the last fully ingested
+    version and the point IDs currently stored for it (with their chunk
+    index), so re-ingestion can skip unchanged files and only upsert or
+    delete the chunks that changed.
+    """
+
+    def __init__(self, path: str):
+        """
+        Open (or create) the manifest database.
+
+        Args:
+            path: Path of the SQLite file
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            "source TEXT PRIMARY KEY, content_hash TEXT NOT NULL, chunks TEXT NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get(self, source: str) -> Optional[Dict[str, Any]]:
+        """
+        Get the manifest record for a source.
+
+        Args:
+            source: The source file name
+
+        Returns:
+            Dictionary with content_hash and chunks (point ID -> chunk index),
+            or None if the source has never been ingested
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT content_hash, chunks FROM files WHERE source = ?", (source,)
+            ).fetchone()
+
+        if row is None:
+            return None
+
+        return {"content_hash": row[0], "chunks": json.loads(row[1])}
+
+    def put(self, source: str, content_hash: str, chunks: Dict[str, int]) -> None:
+        """
+        Record the ingested state of a source.
+
+        Args:
+            source: The source file name
+            content_hash: Hash of the ingested file, or "" if ingestion was incomplete
+            chunks: Mapping of stored point ID to chunk index
+        """
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO files (source, content_hash, chunks) VALUES (?, ?, ?)",
+                (source, content_hash, json.dumps(chunks))
+            )
+            self._conn.commit()
+
+    def delete(self, source: str) -> None:
+        """
+        Forget a source.
+
+        Args:
+            source: The source file name
+        """
+        with self._lock:
+            self._conn.execute("DELETE FROM files WHERE source = ?", (source,))
+            self._conn.commit()
+
+    def clear(self) -> None:
+        """Forget every source."""
+        with self._lock:
+            self._conn.execute("DELETE FROM files")
+            self._conn.commit()
+
+def create_ingest_manifest() -> IngestManifest:
+    """Create the ingest manifest from settings."""
+    return IngestManifest(settings.INGEST_MANIFEST_PATH)
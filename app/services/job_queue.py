@@ -0,0 +1,387 @@
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+from app.core.config import settings
+
+# Stages reported while a document is ingested, in order
+JOB_STAGES = ("queued", "parsing", "chunking", "embedding", "upserting", "done")
+
+_COLUMNS = (
+    "id, file_path, status, stage, chunks, stored, error, attempts, "
+    "created_at, started_at, updated_at, finished_at"
+)
+
+class JobQueueFullError(Exception):
+    """Raised when a job is submitted while the queue is at capacity."""
+
+class JobQueue:
+    """Persistent queue of ingestion jobs, worked by a bounded pool of threads.
+
+    Jobs live in SQLite, so they survive restarts and are submitted and
+    inspected by the API processes while the ingestion worker process
+    (app/worker.py) runs them. While a job runs, a timer thread sends a
+    heartbeat several times per stale_seconds, whatever the handler is
+    doing. A job whose process died stops sending them; once it has been
+    silent for stale_seconds any worker claims it again, up to
+    max_attempts times. The attempt number of a claim is its token:
+    progress updates and the final status only apply while the job is
+    still held by that attempt, so a worker that lost its claim cannot
+    overwrite the status reported by the one that took over. Claims take
+    the write lock up front (BEGIN IMMEDIATE), so two jobs for the same
+    file never run at once.
+    """
+
+    # Seconds an idle worker waits before polling for jobs submitted elsewhere
+    POLL_INTERVAL_SECONDS = 1.0
+    # Heartbeats sent per stale_seconds while a job runs
+    HEARTBEATS_PER_STALE_PERIOD = 4
+
+    def __init__(
+        self,
+        path: str,
+        max_pending: int,
+        stale_seconds: float = 120,
+        max_attempts: int = 3,
+        retention_seconds: float = 86400
+    ):
+        """
+        Open (or create) the job queue.
+
+        Args:
+            path: Path of the SQLite file
+            max_pending: Queued jobs accepted before submit raises JobQueueFullError
+            stale_seconds: Silence after which a running job is considered abandoned
+            max_attempts: Claims of a job before it is failed instead of retried
+            retention_seconds: Age after which finished jobs are deleted
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.max_pending = max_pending
+        self.stale_seconds = stale_seconds
+        self.max_attempts = max_attempts
+        self.retention_seconds = retention_seconds
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._threads = []
+        # Autocommit mode; transactions are opened explicitly
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, file_path TEXT NOT NULL, status TEXT NOT NULL, stage TEXT NOT NULL, "
+            "chunks INTEGER NOT NULL, stored INTEGER NOT NULL, error TEXT, attempts INTEGER NOT NULL, "
+            "created_at REAL NOT NULL, started_at REAL, updated_at REAL NOT NULL, finished_at REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, created_at)")
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        """Run statements in one IMMEDIATE transaction (takes the write lock up front)."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    @staticmethod
+    def _from_row(row: tuple) -> Dict[str, Any]:
+        job = dict(zip([column.strip() for column in _COLUMNS.split(",")], row))
+        job["document_id"] = os.path.basename(job["file_path"])
+        return job
+
+    def submit(self, file_path: str, prepare: Optional[Callable[[], None]] = None) -> Dict[str, Any]:
+        """
+        Queue a document for ingestion.
+
+        A document that is already waiting in the queue is not queued twice;
+        its existing job is returned instead.
+
+        Args:
+            file_path: Path to the document
+            prepare: Called once the job is accepted, before any worker can
+                claim it (e.g. to move the uploaded file into place); if it
+                raises, nothing is queued
+
+        Returns:
+            The job
+
+        Raises:
+            JobQueueFullError: If max_pending jobs are already waiting
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute(
+                "DELETE FROM jobs WHERE finished_at IS NOT NULL AND finished_at < ?",
+                (now - self.retention_seconds,)
+            )
+            row = conn.execute(
+                f"SELECT {_COLUMNS} FROM jobs WHERE file_path = ? AND status = 'queued'", (file_path,)
+            ).fetchone()
+            if row is not None:
+                if prepare is not None:
+                    prepare()
+                return self._from_row(row)
+
+            pending = conn.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+            if pending >= self.max_pending:
+                raise JobQueueFullError(f"Ingestion queue is full ({pending} jobs waiting)")
+
+            if prepare is not None:
+                prepare()
+            job_id = uuid.uuid4().hex
+            conn.execute(
+                "INSERT INTO jobs (id, file_path, status, stage, chunks, stored, attempts, created_at, updated_at) "
+                "VALUES (?, ?, 'queued', 'queued', 0, 0, 0, ?, ?)",
+                (job_id, file_path, now, now)
+            )
+            row = conn.execute(f"SELECT {_COLUMNS} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+
+        self._wake.set()
+        return self._from_row(row)
+
+    def is_full(self) -> bool:
+        """Whether a new job would be rejected."""
+        return self.counts().get("queued", 0) >= self.max_pending
+
+    def claim(self) -> Optional[Dict[str, Any]]:
+        """
+        Take the oldest runnable job and mark it running.
+
+        Returns:
+            The job, or None if no job is runnable; its "attempts" is the
+            claim token that update() and finish() expect
+        """
+        now = time.time()
+        stale = now - self.stale_seconds
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = 'failed', error = ?, updated_at = ?, finished_at = ? "
+                "WHERE status = 'running' AND updated_at < ? AND attempts >= ?",
+                (f"Abandoned after {self.max_attempts} attempts", now, now, stale, self.max_attempts)
+            )
+            row = conn.execute(
+                "SELECT id FROM jobs "
+                "WHERE (status = 'queued' OR (status = 'running' AND updated_at < ?)) "
+                "AND file_path NOT IN (SELECT file_path FROM jobs WHERE status = 'running' AND updated_at >= ?) "
+                "ORDER BY created_at LIMIT 1",
+                (stale, stale)
+            ).fetchone()
+            if row is None:
+                return None
+
+            conn.execute(
+                "UPDATE jobs SET status = 'running', stage = 'parsing', chunks = 0, stored = 0, error = NULL, "
+                "attempts = attempts + 1, started_at = ?, updated_at = ? WHERE id = ?",
+                (now, now, row[0])
+            )
+            row = conn.execute(f"SELECT {_COLUMNS} FROM jobs WHERE id = ?", (row[0],)).fetchone()
+        return self._from_row(row)
+
+    def update(
+        self,
+        job_id: str,
+        attempt: int,
+        stage: Optional[str] = None,
+        chunks: Optional[int] = None,
+        stored: Optional[int] = None,
+        error: Optional[str] = None
+    ) -> bool:
+        """
+        Record the progress of a running job; without progress, a heartbeat.
+
+        Args:
+            job_id: The job ID
+            attempt: The claim token (the job's attempts when it was claimed)
+            stage: Current stage, one of JOB_STAGES
+            chunks: Chunks read so far
+            stored: Chunks upserted so far
+            error: Error to report if the job fails
+
+        Returns:
+            False if the claim was lost (the job was reclaimed or finished)
+        """
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET stage = COALESCE(?, stage), chunks = COALESCE(?, chunks), "
+                "stored = COALESCE(?, stored), error = COALESCE(?, error), updated_at = ? "
+                "WHERE id = ? AND attempts = ? AND status = 'running'",
+                (stage, chunks, stored, error, time.time(), job_id, attempt)
+            )
+        return cursor.rowcount > 0
+
+    def finish(self, job_id: str, attempt: int, success: bool) -> bool:
+        """
+        Mark a running job as succeeded or failed.
+
+        Args:
+            job_id: The job ID
+            attempt: The claim token (the job's attempts when it was claimed)
+            success: Whether the document was ingested
+
+        Returns:
+            False if the claim was lost (the job was reclaimed or finished)
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            if success:
+                cursor = conn.execute(
+                    "UPDATE jobs SET status = 'succeeded', stage = 'done', error = NULL, "
+                    "updated_at = ?, finished_at = ? WHERE id = ? AND attempts = ? AND status = 'running'",
+                    (now, now, job_id, attempt)
+                )
+            else:
+                cursor = conn.execute(
+                    "UPDATE jobs SET status = 'failed', error = COALESCE(error, 'Failed to process document'), "
+                    "updated_at = ?, finished_at = ? WHERE id = ? AND attempts = ? AND status = 'running'",
+                    (now, now, job_id, attempt)
+                )
+        return cursor.rowcount > 0
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Get a job.
+
+        Args:
+            job_id: The job ID
+
+        Returns:
+            The job, or None if it does not exist
+        """
+        with self._lock:
+            row = self._conn.execute(f"SELECT {_COLUMNS} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._from_row(row) if row else None
+
+    def list_jobs(self, status: Optional[str] = None, limit: int = 50) -> List[Dict[str, Any]]:
+        """
+        List jobs, newest first.
+
+        Args:
+            status: Only jobs with this status (queued, running, succeeded or failed)
+            limit: Maximum number of jobs
+
+        Returns:
+            List of jobs
+        """
+        query = f"SELECT {_COLUMNS} FROM jobs"
+        params = []
+        if status:
+            query += " WHERE status = ?"
+            params.append(status)
+        query += " ORDER BY created_at DESC LIMIT ?"
+        params.append(limit)
+
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        return [self._from_row(row) for row in rows]
+
+    def counts(self) -> Dict[str, int]:
+        """Number of jobs per status."""
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return dict(rows)
+
+    def start(self, handler: Callable[[Dict[str, Any], Callable[..., None]], bool], workers: int) -> None:
+        """
+        Start worker threads that run queued jobs.
+
+        Args:
+            handler: Called with a job and a progress callback taking the
+                keyword arguments of update(); returns whether it succeeded
+            workers: Number of worker threads
+        """
+        if self._threads:
+            return
+
+        self._stop.clear()
+        for i in range(workers):
+            thread = threading.Thread(target=self._work, args=(handler,), name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """
+        Stop the worker threads after their current jobs.
+
+        Args:
+            timeout: Seconds to wait for each thread
+        """
+        self._stop.set()
+        self._wake.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def _work(self, handler: Callable[[Dict[str, Any], Callable[..., None]], bool]) -> None:
+        """Worker loop: claim a job, run it, repeat."""
+        while not self._stop.is_set():
+            try:
+                job = self.claim()
+            except sqlite3.Error as e:
+                print(f"Error claiming job: {str(e)}")
+                job = None
+
+            if job is None:
+                self._wake.wait(self.POLL_INTERVAL_SECONDS)
+                self._wake.clear()
+                continue
+
+            job_id, attempt = job["id"], job["attempts"]
+
+            def report(**progress) -> None:
+                self.update(job_id, attempt, **progress)
+
+            done = threading.Event()
+            heartbeat = threading.Thread(
+                target=self._beat, args=(job_id, attempt, done), name=f"job-heartbeat-{job_id}", daemon=True
+            )
+            heartbeat.start()
+            try:
+                success = handler(job, report)
+            except Exception as e:
+                print(f"Error running job {job_id}: {str(e)}")
+                try:
+                    self.update(job_id, attempt, error=str(e))
+                except sqlite3.Error as update_error:
+                    print(f"Error recording the failure of job {job_id}: {str(update_error)}")
+                success = False
+            finally:
+                done.set()
+                heartbeat.join()
+
+            # If the result cannot be recorded the job goes stale and is claimed again
+            try:
+                finished = self.finish(job_id, attempt, success)
+            except sqlite3.Error as e:
+                print(f"Error finishing job {job_id}: {str(e)}")
+                continue
+            if not finished:
+                print(f"Job {job_id} was reclaimed while attempt {attempt} ran; its result is discarded")
+
+    def _beat(self, job_id: str, attempt: int, done: threading.Event) -> None:
+        """Send heartbeats for a running job until done is set."""
+        while not done.wait(self.stale_seconds / self.HEARTBEATS_PER_STALE_PERIOD):
+            try:
+                self.update(job_id, attempt)
+            except sqlite3.Error as e:
+                print(f"Error sending heartbeat for job {job_id}: {str(e)}")
+
+def create_job_queue() -> JobQueue:
+    """Create the ingestion job queue from settings."""
+    return JobQueue(
+        settings.JOB_QUEUE_PATH,
+        max_pending=settings.JOB_QUEUE_MAX_PENDING,
+        stale_seconds=settings.JOB_STALE_SECONDS,
+        max_attempts=settings.JOB_MAX_ATTEMPTS,
+        retention_seconds=settings.JOB_RETENTION_HOURS * 3600
+    )
@@ -0,0 +1,188 @@
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+import os
+import re
+import sqlite3
+import threading
+
+from app.core.config import settings
+from app.services.document_processor import document_type
+from app.services.vector_backends import FILTERABLE_FIELDS
+
+# Words and compound identifiers such as "SOW-2023-001" or "v2.1"
+_TOKEN_PATTERN = re.compile(r"\w+(?:[-./]\w+)*")
+_WORD_PATTERN = re.compile(r"\w+")
+
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the "
+    "their this to was were what when where which who will with".split()
+)
+
+def tokenize(text: str) -> List[str]:
+    """
+    Split text into lowercase index terms.
+    
+    Compound identifiers are kept whole and also split into their parts,
+    so "SOW-2023-001" matches both the exact code and "2023".
+    
+    Args:
+        text: The text to tokenize
+    
+    Returns:
+        List of terms, with repetitions
+    """
+    terms = []
+    for token in _TOKEN_PATTERN.findall(text.casefold()):
+        parts = _WORD_PATTERN.findall(token)
+        if len(parts) > 1:
+            terms.append(token)
+        terms.extend(part for part in parts if part not in _STOPWORDS)
+    return terms
+
+class BM25Index:
+    """BM25 index over chunk texts, kept in SQLite FTS5 and updated chunk by chunk."""
+    
+    def __init__(self, path: str):
+        """
+        Open (or create) the index.
+        
+        Args:
+            path: Path of the SQLite file
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        
+        self.path = path
+        self._lock = threading.Lock()
+        # Autocommit mode; transactions are opened explicitly
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            "row_id INTEGER PRIMARY KEY, id TEXT NOT NULL UNIQUE, source TEXT NOT NULL, doc_type TEXT NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_chunks_source ON chunks (source)")
+        # Rows share their rowid with chunks.row_id; tokenchars keeps
+        # identifiers such as "sow-2023-014" whole
+        self._conn.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS chunk_terms USING fts5("
+            "terms, tokenize = \"unicode61 remove_diacritics 0 tokenchars '-./_'\")"
+        )
+    
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        """Run statements in one IMMEDIATE transaction (takes the write lock up front)."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+    
+    @staticmethod
+    def _delete(conn: sqlite3.Connection, ids: Iterable[str]) -> None:
+        rows = [(point_id,) for point_id in ids]
+        conn.executemany("DELETE FROM chunk_terms WHERE rowid = (SELECT row_id FROM chunks WHERE id = ?)", rows)
+        conn.executemany("DELETE FROM chunks WHERE id = ?", rows)
+    
+    def add(self, ids: List[str], texts: List[str], metadatas: List[Dict[str, Any]]) -> None:
+        """
+        Index chunks, replacing any previously indexed under the same IDs.
+        
+        Args:
+            ids: Point IDs of the chunks
+            texts: Chunk texts
+            metadatas: Chunk metadata (for the source file name and document type)
+        """
+        with self._transaction() as conn:
+            self._delete(conn, ids)
+            for point_id, text, metadata in zip(ids, texts, metadatas):
+                source = metadata.get("source", "")
+                cursor = conn.execute(
+                    "INSERT INTO chunks (id, source, doc_type) VALUES (?, ?, ?)",
+                    (point_id, source, metadata.get("doc_type") or document_type(source))
+                )
+                conn.execute(
+                    "INSERT INTO chunk_terms (rowid, terms) VALUES (?, ?)", (cursor.lastrowid, " ".join(tokenize(text)))
+                )
+    
+    def delete(self, ids: Iterable[str]) -> None:
+        """
+        Remove chunks from the index.
+        
+        Args:
+            ids: Point IDs of the chunks
+        """
+        with self._transaction() as conn:
+            self._delete(conn, ids)
+    
+    def delete_by_source(self, source: str) -> None:
+        """
+        Remove every chunk of a source file.
+        
+        Args:
+            source: The source file name
+        """
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM chunk_terms WHERE rowid IN (SELECT row_id FROM chunks WHERE source = ?)", (source,))
+            conn.execute("DELETE FROM chunks WHERE source = ?", (source,))
+    
+    def search(
+        self,
+        query: str,
+        top_k: int,
+        filters: Optional[Dict[str, List[str]]] = None
+    ) -> List[Tuple[str, float]]:
+        """
+        Rank chunks against a query with BM25.
+        
+        Args:
+            query: The query text
+            top_k: Number of results to return
+            filters: Mapping of "source" and/or "doc_type" to accepted values;
+                other chunks are left out
+        
+        Returns:
+            List of (point ID, score), best first
+        """
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+        
+        # Terms only hold word characters and "-./", so quoting them is enough
+        sql = (
+            "SELECT chunks.id, bm25(chunk_terms) FROM chunk_terms JOIN chunks ON chunks.row_id = chunk_terms.rowid "
+            "WHERE chunk_terms MATCH ?"
+        )
+        params = [" OR ".join(f'"{term}"' for term in sorted(terms))]
+        for field, values in (filters or {}).items():
+            if field not in FILTERABLE_FIELDS:
+                return []
+            sql += f" AND chunks.{field} IN ({', '.join('?' * len(values))})"
+            params.extend(values)
+        sql += " ORDER BY bm25(chunk_terms) LIMIT ?"
+        params.append(top_k)
+        
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        # bm25() is negative, lower is better
+        return [(point_id, -score) for point_id, score in rows]
+    
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+    
+    def clear(self) -> None:
+        """Remove every chunk."""
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM chunk_terms")
+            conn.execute("DELETE FROM chunks")
+
+def create_lexical_index() -> Optional[BM25Index]:
+    """Create the BM25 index from settings, or None if disabled."""
+    if not settings.LEXICAL_INDEX_ENABLED:
+        return None
+    return BM25Index(settings.LEXICAL_INDEX_PATH)
@@ -0,0 +1,260 @@
+from typing import Any, Dict, Iterable, List, Optional
+import json
+import os
+import sqlite3
+import threading
+import numpy as np
+
+from app.core.config import settings
+from app.services.azure_openai import AzureOpenAIService
+
+class ProfileIndex:
+    """Profile embeddings and skills, ranked against a SOW with one matrix product."""
+    
+    def __init__(self, path: str, model: str):
+        """
+        Open (or create) the profile index.
+        
+        Args:
+            path: Path of the SQLite file
+            model: Embedding model key the stored embeddings must match
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        
+        self.model = model
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS profiles ("
+            "id TEXT PRIMARY KEY, model TEXT NOT NULL, signature TEXT NOT NULL, skills TEXT NOT NULL, "
+            "embedding BLOB NOT NULL, sections BLOB)"
+        )
+        self._conn.commit()
+        self._load()
+    
+    def _load(self) -> None:
+        """Read every profile embedded with the current model into memory."""
+        self._data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        self._profiles = {}
+        for profile_id, signature, skills, embedding, sections in self._conn.execute(
+            "SELECT id, signature, skills, embedding, sections FROM profiles WHERE model = ?", (self.model,)
+        ):
+            self._profiles[profile_id] = self._from_row(signature, skills, embedding, sections)
+        self._matrices = None
+    
+    def _sync(self) -> None:
+        """Reload the profiles if another process changed them (data_version ignores our own commits)."""
+        if self._conn.execute("PRAGMA data_version").fetchone()[0] != self._data_version:
+            self._load()
+    
+    @staticmethod
+    def _from_row(signature: str, skills: str, embedding: bytes, sections: Optional[bytes]) -> Dict[str, Any]:
+        vector = np.frombuffer(embedding, dtype=np.float32)
+        return {
+            "signature": signature,
+            "skills": json.loads(skills),
+            "embedding": vector,
+            "sections": (
+                np.frombuffer(sections, dtype=np.float32).reshape(-1, len(vector))
+                if sections else np.empty((0, len(vector)), dtype=np.float32)
+            )
+        }
+    
+    @staticmethod
+    def _normalize(vectors: Any) -> np.ndarray:
+        array = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(array, axis=-1, keepdims=True)
+        return array / np.maximum(norms, 1e-12)
+    
+    def signatures(self) -> Dict[str, str]:
+        """Map each indexed profile ID to the file signature it was indexed from."""
+        with self._lock:
+            self._sync()
+            return {profile_id: profile["signature"] for profile_id, profile in self._profiles.items()}
+    
+    def put_many(self, profiles: List[Dict[str, Any]]) -> None:
+        """
+        Index profiles, replacing any with the same IDs.
+        
+        Args:
+            profiles: Dictionaries with id, signature, skills, embedding and
+                sections (a possibly empty list of section embeddings)
+        """
+        rows = []
+        entries = {}
+        for profile in profiles:
+            embedding = self._normalize(profile["embedding"])
+            sections = self._normalize(profile["sections"]).reshape(-1, len(embedding))
+            rows.append((
+                profile["id"], self.model, profile["signature"], json.dumps(profile["skills"]),
+                embedding.tobytes(), sections.tobytes() if len(sections) else None
+            ))
+            entries[profile["id"]] = {
+                "signature": profile["signature"],
+                "skills": list(profile["skills"]),
+                "embedding": embedding,
+                "sections": sections
+            }
+        
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO profiles (id, model, signature, skills, embedding, sections) "
+                "VALUES (?, ?, ?, ?, ?, ?)", rows
+            )
+            self._conn.commit()
+            self._profiles.update(entries)
+            self._matrices = None
+    
+    def delete(self, profile_ids: Iterable[str]) -> None:
+        """
+        Remove profiles from the index.
+        
+        Args:
+            profile_ids: IDs of the profiles
+        """
+        profile_ids = list(profile_ids)
+        with self._lock:
+            self._conn.executemany("DELETE FROM profiles WHERE id = ?", [(profile_id,) for profile_id in profile_ids])
+            self._conn.commit()
+            for profile_id in profile_ids:
+                self._profiles.pop(profile_id, None)
+            self._matrices = None
+    
+    def clear(self) -> None:
+        """Remove every profile from the index."""
+        with self._lock:
+            self._conn.execute("DELETE FROM profiles")
+            self._conn.commit()
+            self._profiles = {}
+            self._matrices = None
+    
+    def __len__(self) -> int:
+        with self._lock:
+            self._sync()
+            return len(self._profiles)
+    
+    def _build(self) -> Dict[str, Any]:
+        """Stack the profiles into the matrices ranking works on (rebuilt after changes)."""
+        if self._matrices is not None:
+            return self._matrices
+        
+        ids = list(self._profiles)
+        profiles = [self._profiles[profile_id] for profile_id in ids]
+        dimension = len(profiles[0]["embedding"]) if profiles else 0
+        
+        # Sections are stacked profile by profile, so each profile's are contiguous
+        section_counts = np.array([len(profile["sections"]) for profile in profiles], dtype=np.int64)
+        with_sections = np.flatnonzero(section_counts)
+        postings = {}
+        for row, profile in enumerate(profiles):
+            for skill in profile["skills"]:
+                postings.setdefault(skill, []).append(row)
+        
+        self._matrices = {
+            "ids": ids,
+            "skills": [profile["skills"] for profile in profiles],
+            "embeddings": (
+                np.vstack([profile["embedding"] for profile in profiles])
+                if profiles else np.empty((0, dimension), dtype=np.float32)
+            ),
+            "sections": (
+                np.vstack([profile["sections"] for profile in profiles])
+                if profiles else np.empty((0, dimension), dtype=np.float32)
+            ),
+            "with_sections": with_sections,
+            "section_starts": (np.cumsum(section_counts) - section_counts)[with_sections],
+            "postings": {skill: np.asarray(rows, dtype=np.int64) for skill, rows in postings.items()}
+        }
+        
+        # Point the profiles at rows of the matrices so vectors aren't held twice
+        section_offset = 0
+        for row, profile in enumerate(profiles):
+            profile["embedding"] = self._matrices["embeddings"][row]
+            count = int(section_counts[row])
+            profile["sections"] = self._matrices["sections"][section_offset:section_offset + count]
+            section_offset += count
+        return self._matrices
+    
+    def rank(
+        self,
+        query_embedding: List[float],
+        requirements: List[str],
+        top_k: int,
+        keyword_weight: float,
+        profile_ids: Optional[List[str]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Rank profiles against a SOW.
+        
+        The semantic score of a profile is the cosine similarity of its best
+        matching embedding (whole text or section) to the SOW. It is blended
+        with the share of SOW requirements found in the profile's skills.
+        
+        Args:
+            query_embedding: Embedding of the SOW
+            requirements: Skills required by the SOW
+            top_k: Number of profiles to return
+            keyword_weight: Weight of the keyword score, from 0 to 1
+            profile_ids: Only rank these profiles (default: all of them)
+        
+        Returns:
+            The top_k profiles, best first, each with name, match_score,
+            semantic_score, keyword_score, matching_skills and all_skills
+        """
+        with self._lock:
+            self._sync()
+            matrices = self._build()
+        
+        ids = matrices["ids"]
+        if not ids:
+            return []
+        
+        query = self._normalize(query_embedding)
+        semantic = matrices["embeddings"] @ query
+        if len(matrices["with_sections"]):
+            section_scores = matrices["sections"] @ query
+            best_sections = np.maximum.reduceat(section_scores, matrices["section_starts"])
+            rows = matrices["with_sections"]
+            semantic[rows] = np.maximum(semantic[rows], best_sections)
+        
+        requirements = list(dict.fromkeys(requirements))
+        keyword = np.zeros(len(ids), dtype=np.float32)
+        for skill in requirements:
+            rows = matrices["postings"].get(skill)
+            if rows is not None:
+                keyword[rows] += 1
+        if requirements:
+            keyword /= len(requirements)
+        
+        scores = (1 - keyword_weight) * semantic + keyword_weight * keyword
+        if profile_ids is not None:
+            wanted = set(profile_ids)
+            candidates = np.array([row for row, profile_id in enumerate(ids) if profile_id in wanted], dtype=np.int64)
+        else:
+            candidates = np.arange(len(ids))
+        if not len(candidates):
+            return []
+        
+        # Partial selection of the best candidates, then sort just those
+        top_k = min(top_k, len(candidates))
+        best = candidates[np.argpartition(-scores[candidates], top_k - 1)[:top_k]]
+        best = best[np.argsort(-scores[best], kind="stable")]
+        
+        required = set(requirements)
+        return [
+            {
+                "name": ids[row],
+                "match_score": float(scores[row]),
+                "semantic_score": float(semantic[row]),
+                "keyword_score": float(keyword[row]),
+                "matching_skills": [skill for skill in matrices["skills"][row] if skill in required],
+                "all_skills": matrices["skills"][row]
+            }
+            for row in best.tolist()
+        ]
+
+def create_profile_index() -> ProfileIndex:
+    """Create the profile index from settings."""
+    return ProfileIndex(settings.PROFILE_INDEX_PATH, AzureOpenAIService.embedding_model_key())
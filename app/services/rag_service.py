@@ -1,61 +1,360 @@
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, Optional, Tuple, AsyncIterator, Callable, Iterable, Iterator
 import os
+import asyncio
+import queue
+import re
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
 
 from app.core.config import settings
-from app.services.document_processor import process_document, match_resources_to_project
-from app.services.vector_store import vector_store
+from app.services.document_processor import (
+    match_resources_to_project, prepare_document, iter_document_chunks, file_content_hash,
+    read_document, split_text, extract_skills_from_text
+)
+from app.services.vector_store import vector_store, make_point_ids, is_identifier_query
+from app.services.ingest_manifest import create_ingest_manifest
 from app.services.azure_openai import azure_openai_service
-from app.services.conversation import conversation_service
+from app.services.conversation import conversation_service, MESSAGE_OVERHEAD_TOKENS
+from app.services.tokenizer import count_tokens
+from app.services.answer_cache import create_answer_cache
+from app.services.profile_index import create_profile_index
+from app.services.document_cache import create_document_cache
+from app.services.job_queue import create_job_queue
+from app.services.skill_matcher import skill_matcher
+
+def _batched(items: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    """Group an iterable into lists of at most size items."""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def _prefetch(items: Iterable[Any], max_pending: int) -> Iterator[Any]:
+    """
+    Iterate items in a background thread, at most max_pending ahead of the consumer.
+    
+    The bounded queue provides back-pressure: the producer blocks while the
+    consumer is busy. Exceptions raised by the producer are re-raised here.
+    """
+    pending = queue.Queue(maxsize=max_pending)
+    done = object()
+    stop = threading.Event()
+    
+    def put(entry) -> bool:
+        while not stop.is_set():
+            try:
+                pending.put(entry, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+    
+    def produce():
+        try:
+            for item in items:
+                if not put((item, None)):
+                    return
+        except Exception as e:
+            put((done, e))
+            return
+        put((done, None))
+    
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+    
+    try:
+        while True:
+            item, error = pending.get()
+            if item is done:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        # Let the producer exit if the consumer stops early
+        stop.set()
+
+def _normalize_query(query: str) -> List[str]:
+    """Reduce a query to lowercase words, ignoring punctuation and spacing."""
+    return re.sub(r"[^\w\s]", " ", query).casefold().split()
 
 class RAGService:
     """Service for RAG functionality."""
     
-    def process_and_store_document(self, file_path: str) -> bool:
+    def __init__(self):
+        """Initialize the service."""
+        self.ingest_manifest = create_ingest_manifest()
+        # Strong references to fire-and-forget tasks (history compaction)
+        self._background_tasks = set()
+        # History compaction for synchronous queries, off the response path
+        self._compaction_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="history-compaction")
+        self.answer_cache = create_answer_cache()
+        self.profile_index = create_profile_index()
+        self.document_cache = create_document_cache()
+        # Uploads are queued here and ingested by the worker process (app/worker.py)
+        self.job_queue = create_job_queue()
+    
+    def _plan_update(
+        self,
+        record: Optional[Dict[str, Any]],
+        chunks: List[str],
+        metadatas: List[Dict[str, Any]]
+    ) -> Tuple[List[str], List[int], List[str]]:
+        """
+        Work out which chunks of a document need writing.
+        
+        Returns:
+            Tuple of (point IDs, indexes of chunks to upsert, stale point IDs)
+        """
+        ids = make_point_ids(chunks, metadatas)
+        previous = record["chunks"] if record else {}
+        
+        changed = self._changed_indexes(previous, ids, metadatas)
+        stale = list(set(previous) - set(ids))
+        
+        return ids, changed, stale
+    
+    def _changed_indexes(
+        self,
+        previous: Dict[str, int],
+        ids: List[str],
+        metadatas: List[Dict[str, Any]]
+    ) -> List[int]:
+        """Indexes of new chunks, or chunks whose position moved, that need upserting."""
+        return [
+            i for i, point_id in enumerate(ids)
+            if previous.get(point_id) != metadatas[i]["chunk_index"]
+        ]
+    
+    @staticmethod
+    def _stored_chunks(
+        ids: List[str],
+        metadatas: List[Dict[str, Any]],
+        changed: List[int],
+        stored: Iterable[str]
+    ) -> Dict[str, int]:
+        """Chunk positions by point ID of the chunks that are stored after an update."""
+        stored_ids = set(stored)
+        changed_indexes = set(changed)
+        return {
+            point_id: metadatas[i]["chunk_index"]
+            for i, point_id in enumerate(ids)
+            if point_id in stored_ids or i not in changed_indexes
+        }
+    
+    def _record_update(
+        self,
+        source: str,
+        content_hash: str,
+        current: Dict[str, int],
+        changed_count: int,
+        stored_count: int,
+        stale_count: int
+    ) -> bool:
+        """
+        Write the manifest entry for an ingested document.
+        
+        Args:
+            source: The source file name
+            content_hash: Hash of the file contents
+            current: Chunk positions by point ID of the stored chunks
+            changed_count: Chunks that needed upserting
+            stored_count: Chunks that were upserted
+            stale_count: Chunks that were removed
+        
+        Returns:
+            True if every changed chunk was stored
+        """
+        # Record what is actually stored; an empty hash forces a retry
+        # next time if some chunks failed to embed
+        complete = stored_count == changed_count
+        self.ingest_manifest.put(source, content_hash if complete else "", current)
+        
+        print(f"Ingested {source}: {stored_count} chunks upserted, {stale_count} removed")
+        return complete
+    
+    def process_and_store_document(
+        self,
+        file_path: str,
+        progress: Optional[Callable[..., None]] = None
+    ) -> bool:
         """
         Process a document and store it in the vector database.
         
+        The document is streamed: pages or paragraphs are chunked as they
+        are read, and chunks are embedded and upserted in batches of
+        INGEST_BATCH_SIZE. Reading runs at most INGEST_PREFETCH_BATCHES
+        ahead of embedding, so memory stays flat regardless of file size
+        and early chunks become searchable before the file is finished.
+        
+        Ingestion is idempotent: an unchanged file is skipped, and a changed
+        file only upserts new or moved chunks and deletes stale ones.
+        
         Args:
             file_path: Path to the document
+            progress: Called with keyword arguments stage ("parsing",
+                "chunking", "embedding" or "upserting"), chunks (read so
+                far), stored (upserted so far) and, on failure, error
             
         Returns:
             True if successful, False otherwise
         """
+        report = progress or (lambda **_: None)
         try:
-            # Process the document
-            chunks, metadatas = process_document(file_path)
+            report(stage="parsing")
+            source = os.path.basename(file_path)
+            record = self.ingest_manifest.get(source)
+            content_hash = file_content_hash(file_path)
             
-            if not chunks:
-                return False
+            if record and record["content_hash"] == content_hash:
+                print(f"Skipping unchanged document {source}")
+                return True
+            
+            if record is None:
+                # Never ingested through the manifest; drop any older copies
+                vector_store.delete_documents_by_source(source)
+            previous = record["chunks"] if record else {}
+            
+            current = {}
+            occurrences = {}
+            seen_ids = set()
+            changed_count = 0
+            stored_count = 0
+            
+            batches = _batched(iter_document_chunks(file_path), settings.INGEST_BATCH_SIZE)
+            for batch in _prefetch(batches, settings.INGEST_PREFETCH_BATCHES):
+                chunks = [chunk for chunk, _ in batch]
+                metadatas = [metadata for _, metadata in batch]
+                
+                ids = make_point_ids(chunks, metadatas, occurrences)
+                seen_ids.update(ids)
+                report(stage="chunking", chunks=len(seen_ids))
+                changed = self._changed_indexes(previous, ids, metadatas)
+                
+                if changed:
+                    report(stage="embedding")
+                stored = set(vector_store.add_documents(
+                    [chunks[i] for i in changed],
+                    [metadatas[i] for i in changed],
+                    ids=[ids[i] for i in changed],
+                    persist=False,
+                    on_embedded=lambda: report(stage="upserting")
+                ))
+                changed_count += len(changed)
+                stored_count += len(stored)
+                report(stored=stored_count)
+                current.update(self._stored_chunks(ids, metadatas, changed, stored))
             
-            # Add text to each metadata for easier retrieval
-            for i, metadata in enumerate(metadatas):
-                metadata["text"] = chunks[i]
+            if not seen_ids:
+                if record:
+                    # The new version has no text; drop the chunks of the old one
+                    self.remove_document(source)
+                return False
             
-            # Store in vector database
-            vector_store.add_documents(chunks, metadatas)
+            report(stage="upserting")
+            stale = list(set(previous) - seen_ids)
+            if stale:
+                vector_store.delete_documents(stale)
+            vector_store.persist()
             
-            return True
+            if stored_count < changed_count:
+                report(error=f"{changed_count - stored_count} chunks could not be embedded")
+            return self._record_update(source, content_hash, current, changed_count, stored_count, len(stale))
         except Exception as e:
             print(f"Error processing and storing document: {str(e)}")
+            report(error=str(e))
             return False
     
-    def process_directory(self, directory_path: str) -> Tuple[int, int]:
+    async def _astore_chunks(
+        self,
+        source: str,
+        content_hash: str,
+        record: Optional[Dict[str, Any]],
+        chunks: List[str],
+        metadatas: List[Dict[str, Any]]
+    ) -> bool:
+        """Upsert the changed chunks of a parsed document and update the manifest."""
+        if record is None:
+            await asyncio.to_thread(vector_store.delete_documents_by_source, source)
+        
+        ids, changed, stale = self._plan_update(record, chunks, metadatas)
+        
+        stored = await vector_store.aadd_documents(
+            [chunks[i] for i in changed],
+            [metadatas[i] for i in changed],
+            ids=[ids[i] for i in changed]
+        )
+        
+        if stale:
+            await asyncio.to_thread(vector_store.delete_documents, stale)
+        
+        return await asyncio.to_thread(
+            self._record_update, source, content_hash,
+            self._stored_chunks(ids, metadatas, changed, stored), len(changed), len(stored), len(stale)
+        )
+    
+    def remove_document(self, source: str) -> bool:
         """
-        Process all documents in a directory.
+        Remove a document's chunks from the vector database.
         
         Args:
-            directory_path: Path to the directory
+            source: The source file name
             
         Returns:
-            Tuple of (number of successful documents, total documents)
+            True if successful, False otherwise
         """
-        if not os.path.isdir(directory_path):
-            return 0, 0
+        self.ingest_manifest.delete(source)
+        return vector_store.delete_documents_by_source(source)
+    
+    def clear_documents(self) -> bool:
+        """
+        Remove every document, together with the records of what was ingested.
         
-        successful = 0
-        total = 0
+        The ingest manifest is cleared as well, otherwise re-uploading a file
+        would be skipped as unchanged. Parsed documents and profiles are
+        forgotten too, so everything is read and embedded afresh.
+        
+        Returns:
+            True if successful, False otherwise
+        """
+        self.ingest_manifest.clear()
+        if self.document_cache is not None:
+            self.document_cache.clear()
+        self.profile_index.clear()
+        return vector_store.clear_collection()
+    
+    def _run_job(self, job: Dict[str, Any], report: Callable[..., None]) -> bool:
+        """Ingest the document of a queued job, reporting its progress."""
+        if not os.path.isfile(job["file_path"]):
+            report(error=f"Document {job['document_id']} no longer exists")
+            return False
+        return self.process_and_store_document(job["file_path"], progress=report)
+    
+    def start_job_workers(self, workers: Optional[int] = None) -> None:
+        """
+        Start the threads that ingest queued documents.
+        
+        Jobs left over from a previous run are picked up as well.
         
-        for filename in os.listdir(directory_path):
+        Args:
+            workers: Number of worker threads, defaults to JOB_WORKERS
+        """
+        self.job_queue.start(self._run_job, workers or settings.JOB_WORKERS)
+    
+    def stop_job_workers(self) -> None:
+        """Stop the job workers, waiting up to 30 seconds for their current documents."""
+        self.job_queue.stop(timeout=30)
+    
+    def _list_documents(self, directory_path: str) -> List[str]:
+        """List the supported documents in a directory."""
+        file_paths = []
+        
+        for filename in sorted(os.listdir(directory_path)):
             file_path = os.path.join(directory_path, filename)
             
             if not os.path.isfile(file_path):
@@ -65,17 +364,443 @@ class RAGService:
             if ext.lower() not in ['.txt', '.pdf', '.docx']:
                 continue
             
+            file_paths.append(file_path)
+        
+        return file_paths
+    
+    def process_directory(self, directory_path: str, parallel: bool = False) -> Tuple[int, int]:
+        """
+        Process all documents in a directory.
+        
+        Args:
+            directory_path: Path to the directory
+            parallel: Use the multi-process pipeline of aprocess_directory
+            
+        Returns:
+            Tuple of (number of successful documents, total documents)
+        """
+        if not os.path.isdir(directory_path):
+            return 0, 0
+        
+        if parallel:
+            async def run() -> Dict[str, Any]:
+                try:
+                    return await self.aprocess_directory(directory_path)
+                finally:
+                    # The event loop ends here, and its connections with it
+                    await vector_store.aclose()
+            
+            report = asyncio.run(run())
+            return report["successful"], report["total"]
+        
+        successful = 0
+        total = 0
+        
+        for file_path in self._list_documents(directory_path):
             total += 1
             if self.process_and_store_document(file_path):
                 successful += 1
         
         return successful, total
     
+    async def aprocess_directory(
+        self,
+        directory_path: str,
+        max_workers: Optional[int] = None,
+        progress_callback: Optional[Callable[[Dict[str, Any]], None]] = None
+    ) -> Dict[str, Any]:
+        """
+        Ingest a directory using every core.
+        
+        Files are hashed, parsed and chunked in a process pool. Parsed
+        documents flow through a bounded queue into a fixed number of async
+        embedding/upsert workers, so parsing can't run arbitrarily far ahead
+        of embedding.
+        
+        Args:
+            directory_path: Path to the directory
+            max_workers: Parser processes, defaults to the number of CPUs
+            progress_callback: Called with a progress dict after each file
+            
+        Returns:
+            Report with total, successful, skipped and failed counts, the
+            per-file error list and the elapsed time
+        """
+        start = time.perf_counter()
+        file_paths = self._list_documents(directory_path) if os.path.isdir(directory_path) else []
+        report = {
+            "total": len(file_paths),
+            "successful": 0,
+            "skipped": 0,
+            "errors": [],
+            "elapsed_seconds": 0.0
+        }
+        
+        loop = asyncio.get_running_loop()
+        parsed = asyncio.Queue(maxsize=settings.INGEST_QUEUE_SIZE)
+        completed = 0
+        
+        def file_done(file_path: str, status: str, error: Optional[str] = None):
+            nonlocal completed
+            completed += 1
+            if status == "error":
+                report["errors"].append({"file": os.path.basename(file_path), "error": error})
+            else:
+                report["successful"] += 1
+                if status == "skipped":
+                    report["skipped"] += 1
+            
+            print(f"[{completed}/{report['total']}] {os.path.basename(file_path)}: {status}")
+            if progress_callback:
+                progress_callback({
+                    "completed": completed,
+                    "total": report["total"],
+                    "file": os.path.basename(file_path),
+                    "status": status,
+                    "error": error
+                })
+        
+        async def parse(executor: ProcessPoolExecutor, file_path: str):
+            source = os.path.basename(file_path)
+            try:
+                record = await asyncio.to_thread(self.ingest_manifest.get, source)
+                content_hash, chunks, metadatas = await loop.run_in_executor(
+                    executor, prepare_document, file_path,
+                    record["content_hash"] if record else None
+                )
+            except Exception as e:
+                file_done(file_path, "error", str(e))
+                return
+            
+            if chunks is None:
+                file_done(file_path, "skipped")
+            elif not chunks:
+                if record:
+                    await asyncio.to_thread(self.remove_document, source)
+                file_done(file_path, "error", "No text could be extracted")
+            else:
+                # Blocks while the embedding stage is saturated (back-pressure)
+                await parsed.put((file_path, source, content_hash, record, chunks, metadatas))
+        
+        async def store():
+            while True:
+                item = await parsed.get()
+                if item is None:
+                    parsed.task_done()
+                    return
+                
+                file_path, source, content_hash, record, chunks, metadatas = item
+                try:
+                    if await self._astore_chunks(source, content_hash, record, chunks, metadatas):
+                        file_done(file_path, "ingested")
+                    else:
+                        file_done(file_path, "error", "Some chunks failed to embed")
+                except Exception as e:
+                    file_done(file_path, "error", str(e))
+                finally:
+                    parsed.task_done()
+        
+        workers = max_workers or os.cpu_count() or 1
+        storers = [asyncio.create_task(store()) for _ in range(settings.INGEST_UPSERT_CONCURRENCY)]
+        
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            # Cap in-flight parses so results don't pile up in memory
+            parse_slots = asyncio.Semaphore(workers * 2)
+            
+            async def bounded_parse(file_path: str):
+                async with parse_slots:
+                    await parse(executor, file_path)
+            
+            await asyncio.gather(*(bounded_parse(file_path) for file_path in file_paths))
+        
+        for _ in storers:
+            await parsed.put(None)
+        await asyncio.gather(*storers)
+        
+        report["elapsed_seconds"] = time.perf_counter() - start
+        print(
+            f"Ingested {report['successful']}/{report['total']} documents "
+            f"({report['skipped']} unchanged, {len(report['errors'])} failed) "
+            f"in {report['elapsed_seconds']:.1f}s"
+        )
+        
+        return report
+    
+    def _retrieve(
+        self,
+        query: str,
+        session_id: str,
+        top_k: int,
+        lexical_weight: Optional[float] = None,
+        filters: Optional[Dict[str, List[str]]] = None
+    ) -> Dict[str, Any]:
+        """
+        Run the retrieval half of a RAG query.
+        
+        Args:
+            query: The query text
+            session_id: The conversation session ID
+            top_k: Number of results to return
+            lexical_weight: Weight of BM25 results in hybrid search
+            filters: Restrict retrieval to some documents (see make_filters)
+            
+        Returns:
+            Dictionary with conversation_history, contextualized_query,
+            context, sources, chunk_ids and corpus_version
+        """
+        # Read the version before searching so answers are never cached
+        # against a corpus newer than the one they were generated from
+        corpus_version = vector_store.corpus_version
+        
+        # Get the conversation history that fits in its share of the prompt
+        conversation_history, history_tokens = conversation_service.get_budgeted_history(
+            session_id, settings.PROMPT_HISTORY_TOKENS
+        )
+        
+        # Contextualize the query if we have conversation history
+        if conversation_history:
+            contextualized_query = azure_openai_service.contextualize_query(
+                query, conversation_history
+            )
+        else:
+            contextualized_query = query
+        
+        # Search for relevant documents
+        texts, metadatas, scores = vector_store.search(contextualized_query, top_k, lexical_weight, filters)
+        
+        return self._format_retrieval(
+            query, conversation_history, history_tokens, corpus_version,
+            contextualized_query, texts, metadatas, scores
+        )
+    
+    def _format_retrieval(
+        self,
+        query: str,
+        conversation_history: List[Dict[str, str]],
+        history_tokens: int,
+        corpus_version: int,
+        contextualized_query: str,
+        texts: List[str],
+        metadatas: List[Dict[str, Any]],
+        scores: List[float]
+    ) -> Dict[str, Any]:
+        """
+        Build the LLM context and source list from search results.
+        
+        The context gets whatever part of PROMPT_TOKEN_BUDGET the system
+        prompt, the history and the question leave; the best-ranked chunks
+        are kept until it is used up.
+        """
+        context_budget = (
+            settings.PROMPT_TOKEN_BUDGET
+            - azure_openai_service.rag_prompt_tokens()
+            - history_tokens
+            - count_tokens(query) - MESSAGE_OVERHEAD_TOKENS
+        )
+        
+        # Format context for the LLM and its sources
+        blocks = []
+        sources = []
+        used = 0
+        for text, metadata, score in zip(texts, metadatas, scores):
+            block = f"Document: {metadata.get('source', 'Unknown')}\n{text}"
+            # One extra token for the blank line between documents
+            block_tokens = count_tokens(block) + 1
+            if used + block_tokens > context_budget:
+                break
+            used += block_tokens
+            blocks.append(block)
+            sources.append({
+                "id": metadata.get("id"),
+                "source": metadata.get("source", "Unknown"),
+                "chunk_index": metadata.get("chunk_index", 0),
+                "score": score
+            })
+        
+        context = "\n\n".join(blocks)
+        
+        return {
+            "conversation_history": conversation_history,
+            "contextualized_query": contextualized_query,
+            "context": context,
+            "sources": sources,
+            "chunk_ids": [source["id"] for source in sources],
+            "corpus_version": corpus_version
+        }
+    
+    def _answer_cache_applies(self, retrieval: Dict[str, Any], use_cache: bool) -> bool:
+        """Whether the answer cache is used for a retrieval."""
+        # The cache is keyed on the query embedding, which identifier lookups
+        # answered by the lexical fast path deliberately never compute
+        return (
+            use_cache
+            and self.answer_cache is not None
+            and not is_identifier_query(retrieval["contextualized_query"])
+        )
+    
+    def _lookup_answer(self, retrieval: Dict[str, Any]) -> Tuple[Optional[str], List[float]]:
+        """
+        Look up a cached answer for a retrieval.
+        
+        Args:
+            retrieval: Result of _retrieve
+            
+        Returns:
+            Tuple of (cached answer or None, contextualized query embedding)
+        """
+        # The contextualized query was just searched, so this hits the query cache
+        embedding = vector_store.embed_query(retrieval["contextualized_query"])
+        response = self.answer_cache.get(embedding, retrieval["chunk_ids"], retrieval["corpus_version"])
+        return response, embedding
+    
+    async def _alookup_answer(self, retrieval: Dict[str, Any]) -> Tuple[Optional[str], List[float]]:
+        """Async counterpart of _lookup_answer."""
+        embedding = await vector_store.aembed_query(retrieval["contextualized_query"])
+        response = self.answer_cache.get(embedding, retrieval["chunk_ids"], retrieval["corpus_version"])
+        return response, embedding
+    
+    def _store_answer(self, retrieval: Dict[str, Any], embedding: List[float], response: str) -> None:
+        """Cache a generated answer unless it is an error message."""
+        if not response.startswith("Error:"):
+            self.answer_cache.set(embedding, retrieval["chunk_ids"], retrieval["corpus_version"], response)
+    
+    async def _aretrieve(
+        self,
+        query: str,
+        session_id: str,
+        top_k: int,
+        lexical_weight: Optional[float] = None,
+        filters: Optional[Dict[str, List[str]]] = None
+    ) -> Dict[str, Any]:
+        """
+        Async counterpart of _retrieve.
+        
+        Args:
+            query: The query text
+            session_id: The conversation session ID
+            top_k: Number of results to return
+            lexical_weight: Weight of BM25 results in hybrid search
+            filters: Restrict retrieval to some documents (see make_filters)
+            
+        Returns:
+            Dictionary with conversation_history, contextualized_query,
+            context, sources, chunk_ids and corpus_version
+        """
+        corpus_version = vector_store.corpus_version
+        
+        # The conversation store may be a database; keep its calls off the event loop
+        conversation_history, history_tokens = await asyncio.to_thread(
+            conversation_service.get_budgeted_history, session_id, settings.PROMPT_HISTORY_TOKENS
+        )
+        
+        if conversation_history and settings.SPECULATIVE_RETRIEVAL:
+            # Search on the raw query while the model rewrites it; the result
+            # is used whenever the rewrite turns out to be the same question
+            speculative_search = asyncio.create_task(vector_store.asearch(query, top_k, lexical_weight, filters))
+            
+            contextualized_query = await azure_openai_service.acontextualize_query(
+                query, conversation_history
+            )
+            
+            if _normalize_query(contextualized_query) == _normalize_query(query):
+                texts, metadatas, scores = await speculative_search
+            else:
+                speculative_search.cancel()
+                # Retrieve the outcome so a failed search isn't reported as unhandled
+                speculative_search.add_done_callback(
+                    lambda task: task.cancelled() or task.exception()
+                )
+                texts, metadatas, scores = await vector_store.asearch(contextualized_query, top_k, lexical_weight, filters)
+        else:
+            contextualized_query = await azure_openai_service.acontextualize_query(
+                query, conversation_history
+            )
+            
+            texts, metadatas, scores = await vector_store.asearch(contextualized_query, top_k, lexical_weight, filters)
+        
+        return self._format_retrieval(
+            query, conversation_history, history_tokens, corpus_version,
+            contextualized_query, texts, metadatas, scores
+        )
+    
+    def compact_history(self, session_id: str) -> bool:
+        """
+        Fold the older turns of a session into its rolling summary.
+        
+        Does nothing until the history outgrows PROMPT_HISTORY_TOKENS.
+        
+        Args:
+            session_id: The conversation session ID
+            
+        Returns:
+            True if the history was compacted, False otherwise
+        """
+        compaction = conversation_service.get_compaction(session_id, settings.PROMPT_HISTORY_TOKENS)
+        if compaction is None:
+            return False
+        
+        summary = azure_openai_service.summarize_conversation(
+            compaction["summary"], compaction["messages"]
+        )
+        if summary is None:
+            return False
+        
+        return conversation_service.set_summary(session_id, summary, compaction["upto"])
+    
+    async def acompact_history(self, session_id: str) -> bool:
+        """
+        Async counterpart of compact_history.
+        
+        Args:
+            session_id: The conversation session ID
+            
+        Returns:
+            True if the history was compacted, False otherwise
+        """
+        compaction = await asyncio.to_thread(
+            conversation_service.get_compaction, session_id, settings.PROMPT_HISTORY_TOKENS
+        )
+        if compaction is None:
+            return False
+        
+        summary = await azure_openai_service.asummarize_conversation(
+            compaction["summary"], compaction["messages"]
+        )
+        if summary is None:
+            return False
+        
+        return await asyncio.to_thread(conversation_service.set_summary, session_id, summary, compaction["upto"])
+    
+    def _record_turn(self, session_id: str, query: str, response: str) -> None:
+        """Add a question and its answer to the conversation history."""
+        conversation_service.add_message(session_id, "user", query)
+        conversation_service.add_message(session_id, "assistant", response)
+    
+    def _schedule_compaction(self, session_id: str) -> None:
+        """Compact a session's history in the background, off the response path."""
+        # acompact_history checks (off the event loop) whether there is anything to compact
+        task = asyncio.create_task(self.acompact_history(session_id))
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+    
+    def _submit_compaction(self, session_id: str) -> Future:
+        """Compact a session's history in a background thread, for callers without an event loop."""
+        def report(future: Future) -> None:
+            if future.exception() is not None:
+                print(f"Error compacting history of session {session_id}: {str(future.exception())}")
+        
+        future = self._compaction_executor.submit(self.compact_history, session_id)
+        future.add_done_callback(report)
+        return future
+    
     def query(
         self, 
         query: str, 
         session_id: str,
-        top_k: int = 3
+        top_k: int = 3,
+        use_cache: bool = True,
+        lexical_weight: Optional[float] = None,
+        filters: Optional[Dict[str, List[str]]] = None
     ) -> Dict[str, Any]:
         """
         Perform a RAG query.
@@ -84,57 +809,43 @@ class RAGService:
             query: The query text
             session_id: The conversation session ID
             top_k: Number of results to return
+            use_cache: Reuse and store answers in the semantic answer cache
+            lexical_weight: Weight of BM25 results in hybrid search, from 0
+                (dense only) to 1 (lexical only); defaults to settings
+            filters: Restrict retrieval to some documents (see make_filters)
             
         Returns:
             Query result
         """
         try:
-            # Get conversation history
-            conversation_history = conversation_service.get_conversation_history(session_id)
+            retrieval = self._retrieve(query, session_id, top_k, lexical_weight, filters)
+            
+            use_cache = self._answer_cache_applies(retrieval, use_cache)
+            response = None
+            if use_cache:
+                response, embedding = self._lookup_answer(retrieval)
+            cached = response is not None
             
-            # Contextualize the query if we have conversation history
-            if conversation_history:
-                contextualized_query = azure_openai_service.contextualize_query(
-                    query, conversation_history
+            if not cached:
+                # Generate response
+                response = azure_openai_service.generate_rag_response(
+                    query=query,
+                    context=retrieval["context"],
+                    conversation_history=retrieval["conversation_history"]
                 )
-            else:
-                contextualized_query = query
-            
-            # Search for relevant documents
-            texts, metadatas, scores = vector_store.search(contextualized_query, top_k)
-            
-            # Format context for the LLM
-            context = "\n\n".join([
-                f"Document: {metadata.get('source', 'Unknown')}\n{text}"
-                for text, metadata in zip(texts, metadatas)
-            ])
-            
-            # Generate response
-            response = azure_openai_service.generate_rag_response(
-                query=query,
-                context=context,
-                conversation_history=conversation_history
-            )
+                if use_cache:
+                    self._store_answer(retrieval, embedding, response)
             
             # Add to conversation history
-            conversation_service.add_message(session_id, "user", query)
-            conversation_service.add_message(session_id, "assistant", response)
-            
-            # Format sources
-            sources = [
-                {
-                    "source": metadata.get("source", "Unknown"),
-                    "chunk_index": metadata.get("chunk_index", 0),
-                    "score": score
-                }
-                for metadata, score in zip(metadatas, scores)
-            ]
+            self._record_turn(session_id, query, response)
+            self._submit_compaction(session_id)
             
             return {
                 "query": query,
-                "contextualized_query": contextualized_query,
+                "contextualized_query": retrieval["contextualized_query"],
                 "response": response,
-                "sources": sources
+                "sources": retrieval["sources"],
+                "cached": cached
             }
             
         except Exception as e:
@@ -146,49 +857,417 @@ class RAGService:
                 "sources": []
             }
     
-    def match_profiles_to_sow(
-        self, 
-        profile_file_paths: List[str], 
-        sow_file_path: str
+    async def aquery(
+        self,
+        query: str,
+        session_id: str,
+        top_k: int = 3,
+        use_cache: bool = True,
+        lexical_weight: Optional[float] = None,
+        filters: Optional[Dict[str, List[str]]] = None
+    ) -> Dict[str, Any]:
+        """
+        Perform a RAG query without blocking the event loop.
+        
+        Args:
+            query: The query text
+            session_id: The conversation session ID
+            top_k: Number of results to return
+            use_cache: Reuse and store answers in the semantic answer cache
+            lexical_weight: Weight of BM25 results in hybrid search, from 0
+                (dense only) to 1 (lexical only); defaults to settings
+            filters: Restrict retrieval to some documents (see make_filters)
+            
+        Returns:
+            Query result
+        """
+        try:
+            retrieval = await self._aretrieve(query, session_id, top_k, lexical_weight, filters)
+            
+            use_cache = self._answer_cache_applies(retrieval, use_cache)
+            response = None
+            if use_cache:
+                response, embedding = await self._alookup_answer(retrieval)
+            cached = response is not None
+            
+            if not cached:
+                response = await azure_openai_service.agenerate_rag_response(
+                    query=query,
+                    context=retrieval["context"],
+                    conversation_history=retrieval["conversation_history"]
+                )
+                if use_cache:
+                    self._store_answer(retrieval, embedding, response)
+            
+            await asyncio.to_thread(self._record_turn, session_id, query, response)
+            self._schedule_compaction(session_id)
+            
+            return {
+                "query": query,
+                "contextualized_query": retrieval["contextualized_query"],
+                "response": response,
+                "sources": retrieval["sources"],
+                "cached": cached
+            }
+            
+        except Exception as e:
+            print(f"Error performing RAG query: {str(e)}")
+            return {
+                "query": query,
+                "contextualized_query": query,
+                "response": f"Error: {str(e)}",
+                "sources": []
+            }
+    
+    async def aquery_batch(
+        self,
+        queries: List[str],
+        top_k: int = 3,
+        use_cache: bool = True,
+        lexical_weight: Optional[float] = None,
+        filters: Optional[Dict[str, List[str]]] = None,
+        max_concurrency: Optional[int] = None
     ) -> List[Dict[str, Any]]:
         """
-        Match profiles to a Statement of Work.
+        Answer many independent questions at once.
+        
+        The queries are stateless (no conversation history is read or
+        written). All of them are embedded and searched in batched requests,
+        then answers are generated concurrently, at most max_concurrency
+        at a time. A failing question doesn't fail the batch; its result
+        carries the error instead.
         
         Args:
-            profile_file_paths: List of paths to profile documents
-            sow_file_path: Path to the SOW document
+            queries: The query texts
+            top_k: Number of results to return per query
+            use_cache: Reuse and store answers in the semantic answer cache
+            lexical_weight: Weight of BM25 results in hybrid search, from 0
+                (dense only) to 1 (lexical only); defaults to settings
+            filters: Restrict retrieval to some documents (see make_filters)
+            max_concurrency: Maximum number of answers generated at once,
+                defaults to BATCH_QUERY_MAX_CONCURRENCY
             
         Returns:
-            List of matches with scores
+            One result per query, in the same order as queries, each with
+            an "error" that is None on success
+        """
+        def failed(query: str, error: str) -> Dict[str, Any]:
+            return {"query": query, "response": "", "sources": [], "cached": False, "error": error}
+        
+        corpus_version = vector_store.corpus_version
+        try:
+            search_results = await vector_store.asearch_batch(queries, top_k, lexical_weight, filters)
+        except Exception as e:
+            print(f"Error performing batch retrieval: {str(e)}")
+            return [failed(query, str(e)) for query in queries]
+        
+        semaphore = asyncio.Semaphore(max_concurrency or settings.BATCH_QUERY_MAX_CONCURRENCY)
+        
+        async def answer(query: str, results: Tuple[List[str], List[Dict[str, Any]], List[float]]) -> Dict[str, Any]:
+            try:
+                retrieval = self._format_retrieval(query, [], 0, corpus_version, query, *results)
+                
+                cache = self._answer_cache_applies(retrieval, use_cache)
+                response = None
+                if cache:
+                    response, embedding = await self._alookup_answer(retrieval)
+                cached = response is not None
+                
+                if not cached:
+                    async with semaphore:
+                        response = await azure_openai_service.agenerate_rag_response(
+                            query=query,
+                            context=retrieval["context"]
+                        )
+                    if response.startswith("Error:"):
+                        return failed(query, response)
+                    if cache:
+                        self._store_answer(retrieval, embedding, response)
+                
+                return {
+                    "query": query,
+                    "response": response,
+                    "sources": retrieval["sources"],
+                    "cached": cached,
+                    "error": None
+                }
+                
+            except Exception as e:
+                print(f"Error answering batch query: {str(e)}")
+                return failed(query, str(e))
+        
+        # gather() preserves the order of its arguments
+        return list(await asyncio.gather(*(
+            answer(query, results) for query, results in zip(queries, search_results)
+        )))
+    
+    async def stream_query(
+        self,
+        query: str,
+        session_id: str,
+        top_k: int = 3,
+        use_cache: bool = True,
+        lexical_weight: Optional[float] = None,
+        filters: Optional[Dict[str, List[str]]] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Perform a RAG query, streaming the answer as it is generated.
+        
+        Yields a "sources" event once retrieval finishes, then one "token"
+        event per piece of generated text, then a "done" event. The
+        conversation history is only updated once the answer is complete.
+        
+        Args:
+            query: The query text
+            session_id: The conversation session ID
+            top_k: Number of results to return
+            use_cache: Reuse and store answers in the semantic answer cache
+            lexical_weight: Weight of BM25 results in hybrid search, from 0
+                (dense only) to 1 (lexical only); defaults to settings
+            filters: Restrict retrieval to some documents (see make_filters)
+            
+        Yields:
+            Event dictionaries with "event" and "data" keys
         """
         try:
-            from app.services.document_processor import read_document
+            retrieval = await self._aretrieve(query, session_id, top_k, lexical_weight, filters)
+            
+            yield {
+                "event": "sources",
+                "data": {
+                    "query": query,
+                    "contextualized_query": retrieval["contextualized_query"],
+                    "sources": retrieval["sources"]
+                }
+            }
+            
+            use_cache = self._answer_cache_applies(retrieval, use_cache)
+            response = None
+            if use_cache:
+                response, embedding = await self._alookup_answer(retrieval)
+            cached = response is not None
+            
+            if cached:
+                # A cached answer arrives as a single token
+                yield {"event": "token", "data": response}
+            else:
+                response_parts = []
+                async for token in azure_openai_service.astream_rag_response(
+                    query=query,
+                    context=retrieval["context"],
+                    conversation_history=retrieval["conversation_history"]
+                ):
+                    response_parts.append(token)
+                    yield {"event": "token", "data": token}
+                
+                response = "".join(response_parts)
+                if use_cache:
+                    self._store_answer(retrieval, embedding, response)
+            
+            # Add to conversation history once the full answer is known
+            await asyncio.to_thread(self._record_turn, session_id, query, response)
+            self._schedule_compaction(session_id)
+            
+            yield {"event": "done", "data": {"response": response, "cached": cached}}
+            
+        except Exception as e:
+            print(f"Error performing streaming RAG query: {str(e)}")
+            yield {"event": "error", "data": f"Error: {str(e)}"}
+    
+    def read_parsed(self, file_path: str) -> Tuple[str, List[str]]:
+        """
+        Read a document's text and skills, parsing it only if it is new or changed.
+        
+        Args:
+            file_path: Path to the document
             
-            # Read SOW document
-            sow_text = read_document(sow_file_path)
+        Returns:
+            Tuple of (text, skills)
+        """
+        stat = os.stat(file_path)
+        cached = None
+        if self.document_cache is not None:
+            cached = self.document_cache.get(file_path, stat.st_size, stat.st_mtime_ns)
+            if cached is not None and cached["taxonomy"] == skill_matcher.fingerprint:
+                return cached["text"], cached["skills"]
+        
+        # A changed taxonomy only needs the skills extracted again, not the file parsed
+        text = cached["text"] if cached is not None else read_document(file_path)
+        skills = extract_skills_from_text(text)
+        if self.document_cache is not None:
+            self.document_cache.put(file_path, stat.st_size, stat.st_mtime_ns, text, skill_matcher.fingerprint, skills)
+        return text, skills
+    
+    def forget_parsed(self, file_path: str) -> None:
+        """
+        Drop a document from the document cache (after it is deleted or replaced).
+        
+        Args:
+            file_path: Path to the document
+        """
+        if self.document_cache is not None:
+            self.document_cache.delete(file_path)
+    
+    @staticmethod
+    def _file_signature(file_path: str) -> str:
+        """Cheap change detector for a file: its size and modification time."""
+        stat = os.stat(file_path)
+        return f"{stat.st_size}:{stat.st_mtime_ns}"
+    
+    @staticmethod
+    def _profile_texts(text: str) -> List[str]:
+        """Texts embedded for a profile: the whole text, then its sections if enabled."""
+        # Stay within the embedding model's input limit
+        texts = [text[:settings.PROFILE_EMBEDDING_MAX_CHARS]]
+        if settings.PROFILE_SECTION_EMBEDDINGS:
+            sections = split_text(text, chunk_size=settings.PROFILE_SECTION_SIZE, chunk_overlap=0)
+            texts.extend(sections[:settings.PROFILE_MAX_SECTIONS])
+        return texts
+    
+    def index_profiles(self, profile_file_paths: List[str]) -> int:
+        """
+        Embed profiles into the profile index, skipping unchanged files.
+        
+        Profiles are identified by file name. Their texts are embedded in
+        batches of PROFILE_INDEX_BATCH_SIZE profiles.
+        
+        Args:
+            profile_file_paths: Paths to profile documents
             
-            # Read profile documents
+        Returns:
+            Number of profiles (re-)indexed
+        """
+        indexed = self.profile_index.signatures()
+        pending = []
+        for file_path in profile_file_paths:
+            try:
+                signature = self._file_signature(file_path)
+            except OSError as e:
+                print(f"Error reading profile {file_path}: {str(e)}")
+                continue
+            if indexed.get(os.path.basename(file_path)) != signature:
+                pending.append((file_path, signature))
+        
+        count = 0
+        for batch in _batched(pending, settings.PROFILE_INDEX_BATCH_SIZE):
             profiles = []
-            for file_path in profile_file_paths:
+            texts = []
+            for file_path, signature in batch:
                 try:
-                    text = read_document(file_path)
-                    name = os.path.basename(file_path)
-                    profiles.append({
-                        "name": name,
-                        "text": text,
-                        "file_path": file_path
-                    })
+                    text, skills = self.read_parsed(file_path)
                 except Exception as e:
                     print(f"Error reading profile {file_path}: {str(e)}")
+                    continue
+                profile_texts = self._profile_texts(text)
+                profiles.append({
+                    "id": os.path.basename(file_path),
+                    "signature": signature,
+                    "skills": skills,
+                    "texts": len(profile_texts)
+                })
+                texts.extend(profile_texts)
+            
+            embeddings = azure_openai_service.generate_embeddings(texts)
+            offset = 0
+            for profile in profiles:
+                vectors = embeddings[offset:offset + profile.pop("texts")]
+                offset += len(vectors)
+                profile["embedding"] = vectors[0]
+                profile["sections"] = vectors[1:]
+                if not all(any(vector) for vector in vectors):
+                    # Zero vectors are embedding errors; an empty signature retries next time
+                    profile["signature"] = ""
+            
+            self.profile_index.put_many(profiles)
+            count += len(profiles)
+        
+        if count:
+            print(f"Indexed {count} profiles ({len(self.profile_index)} in total)")
+        return count
+    
+    def remove_profile(self, profile_id: str) -> None:
+        """
+        Remove a profile from the profile index.
+        
+        Args:
+            profile_id: The profile file name
+        """
+        self.profile_index.delete([profile_id])
+    
+    def match_profiles_to_sow(
+        self, 
+        profile_file_paths: Optional[List[str]], 
+        sow_file_path: str,
+        top_k: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Match profiles to a Statement of Work.
+        
+        With PROFILE_MATCHING=embedding the listed profiles are indexed (if
+        new or changed) and ranked with the profile index, blending semantic
+        similarity with keyword matches; without a list, every indexed
+        profile is ranked. With PROFILE_MATCHING=keyword only the keyword
+        score of the listed profiles is used.
+        
+        Args:
+            profile_file_paths: Paths to profile documents, or None to rank
+                every indexed profile
+            sow_file_path: Path to the SOW document
+            top_k: Number of matches to return; defaults to every listed
+                profile, or PROFILE_MATCH_TOP_K when ranking all of them
+            
+        Returns:
+            List of matches with scores, best first
+        """
+        try:
+            # Read SOW document (its skills are its requirements)
+            sow_text, requirements = self.read_parsed(sow_file_path)
             
-            # Match profiles to SOW
-            matches = match_resources_to_project(profiles, sow_text)
+            if settings.PROFILE_MATCHING == "keyword":
+                return self._keyword_match(profile_file_paths or [], sow_text)[:top_k]
             
-            return matches
+            profile_ids = None
+            if profile_file_paths is not None:
+                self.index_profiles(profile_file_paths)
+                profile_ids = [os.path.basename(file_path) for file_path in profile_file_paths]
+            
+            if top_k is None:
+                top_k = len(profile_ids) if profile_ids is not None else settings.PROFILE_MATCH_TOP_K
+            
+            sow_embedding = azure_openai_service.generate_embeddings(
+                [sow_text[:settings.PROFILE_EMBEDDING_MAX_CHARS]]
+            )[0]
+            return self.profile_index.rank(
+                sow_embedding,
+                requirements,
+                top_k,
+                settings.PROFILE_KEYWORD_WEIGHT,
+                profile_ids
+            )
             
         except Exception as e:
             print(f"Error matching profiles to SOW: {str(e)}")
             return []
+    
+    def _keyword_match(self, profile_file_paths: List[str], sow_text: str) -> List[Dict[str, Any]]:
+        """Score profiles by the share of SOW skills they mention."""
+        # Read profile documents
+        profiles = []
+        for file_path in profile_file_paths:
+            try:
+                text, skills = self.read_parsed(file_path)
+                name = os.path.basename(file_path)
+                profiles.append({
+                    "name": name,
+                    "text": text,
+                    "skills": skills,
+                    "file_path": file_path
+                })
+            except Exception as e:
+                print(f"Error reading profile {file_path}: {str(e)}")
+        
+        # Match profiles to SOW
+        return match_resources_to_project(profiles, sow_text)
 
 # Create a singleton instance
 rag_service = RAGService()
@@ -0,0 +1,154 @@
+from typing import Dict, List, Optional, Union
+import hashlib
+import json
+import re
+
+from app.core.config import settings
+
+# Canonical skill -> synonyms; the canonical name is matched as well
+DEFAULT_SKILL_TAXONOMY = {
+    "python": ["python3"],
+    "javascript": ["js", "ecmascript"],
+    "java": [],
+    "c++": ["cpp"],
+    "c#": ["csharp", "c sharp"],
+    "ruby": [],
+    "go": ["golang"],
+    "rust": [],
+    "react": ["reactjs", "react.js"],
+    "angular": ["angularjs", "angular.js"],
+    "vue": ["vuejs", "vue.js"],
+    "node.js": ["nodejs"],
+    "django": [],
+    "flask": [],
+    "fastapi": [],
+    "docker": [],
+    "kubernetes": ["k8s"],
+    "aws": ["amazon web services"],
+    "azure": ["microsoft azure"],
+    "gcp": ["google cloud", "google cloud platform"],
+    "terraform": [],
+    "machine learning": ["ml"],
+    "deep learning": [],
+    "nlp": ["natural language processing"],
+    "computer vision": [],
+    "data science": [],
+    "data analysis": ["data analytics"],
+    "data engineering": [],
+    "devops": [],
+    "project management": [],
+    "agile": [],
+    "scrum": [],
+    "product management": []
+}
+
+# Whitespace and hyphens are interchangeable inside multi-word skills
+_SEPARATORS = re.compile(r"[\s-]+")
+
+def normalize_term(term: str) -> str:
+    """Lowercase a skill term and collapse its separators to single spaces."""
+    return _SEPARATORS.sub(" ", term.strip().lower())
+
+def _trie_pattern(node: Dict[str, dict]) -> str:
+    """Render a character trie as a regex, so terms sharing a prefix share its matching."""
+    branches = [
+        (r"[\s-]+" if char == " " else re.escape(char)) + _trie_pattern(child)
+        for char, child in sorted(node.items())
+        if char
+    ]
+    if not branches:
+        return ""
+    if len(branches) == 1 and "" not in node:
+        return branches[0]
+    pattern = "(?:" + "|".join(branches) + ")"
+    # A term ending here makes the longer continuations optional
+    return pattern + "?" if "" in node else pattern
+
+class SkillMatcher:
+    """Single-pass skill extraction over a skill taxonomy.
+
+    Every term of the taxonomy (canonical names and synonyms) is compiled
+    into one regex structured as a trie, so a text is scanned once however
+    large the vocabulary is. Terms only match as whole words: "go" does not
+    match "good" and "java" does not match "javascript".
+    """
+
+    def __init__(self, taxonomy: Dict[str, List[str]]):
+        """
+        Compile the matcher.
+
+        Args:
+            taxonomy: Mapping of canonical skill name to its synonyms
+        """
+        self.skills = list(taxonomy)
+        # Identifies the taxonomy, so skills extracted with another one are redone
+        self.fingerprint = hashlib.sha256(json.dumps(taxonomy, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+        self._order = {skill: i for i, skill in enumerate(self.skills)}
+        self._canonical = {}
+        for skill, synonyms in taxonomy.items():
+            for term in [skill, *synonyms]:
+                # The first skill to claim a term keeps it
+                self._canonical.setdefault(normalize_term(term), skill)
+
+        trie = {}
+        for term in self._canonical:
+            node = trie
+            for char in term:
+                node = node.setdefault(char, {})
+            node[""] = {}
+
+        # Word boundaries that also treat "+", "#" and "." as part of a term
+        # (so "c" never matches inside "c++" and "node" not inside "node.js").
+        # Texts are lowercased up front, which is much faster than IGNORECASE
+        self._pattern = re.compile(
+            r"(?<![\w.+#])(?:" + _trie_pattern(trie) + r")(?![\w+#]|\.\w)"
+        ) if trie else None
+
+    def __len__(self) -> int:
+        return len(self.skills)
+
+    def extract(self, text: str) -> List[str]:
+        """
+        Find the skills mentioned in a text.
+
+        Args:
+            text: The text to scan
+
+        Returns:
+            Canonical names of the skills found, in taxonomy order
+        """
+        if self._pattern is None:
+            return []
+        found = {self._canonical[normalize_term(match.group())] for match in self._pattern.finditer(text.lower())}
+        return sorted(found, key=self._order.__getitem__)
+
+def load_skill_taxonomy(path: str) -> Dict[str, List[str]]:
+    """
+    Load a skill taxonomy from a JSON file.
+
+    The file holds either an object mapping each canonical skill to a list
+    of synonyms, or a plain list of skill names.
+
+    Args:
+        path: Path to the JSON file
+
+    Returns:
+        Mapping of canonical skill name to its synonyms
+    """
+    with open(path, "r", encoding="utf-8") as file:
+        data: Union[Dict[str, List[str]], List[str]] = json.load(file)
+
+    if isinstance(data, list):
+        return {skill: [] for skill in data}
+    if isinstance(data, dict):
+        return {skill: list(synonyms or []) for skill, synonyms in data.items()}
+    raise ValueError(f"Skill taxonomy in {path} must be a JSON object or list")
+
+def create_skill_matcher(path: Optional[str] = None) -> SkillMatcher:
+    """Create the skill matcher from SKILL_TAXONOMY_PATH, or the built-in taxonomy if unset."""
+    path = path if path is not None else settings.SKILL_TAXONOMY_PATH
+    taxonomy = load_skill_taxonomy(path) if path else DEFAULT_SKILL_TAXONOMY
+    return SkillMatcher(taxonomy)
+
+# Create a singleton instance
+skill_matcher = create_skill_matcher()
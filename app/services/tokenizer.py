@@ -0,0 +1,86 @@
+from typing import Callable, List, Optional
+import math
+import re
+import threading
+
+from app.core.config import settings
+
+# Word pieces and single punctuation marks, used when tiktoken is unavailable
+_PIECE_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+_encoding = None
+_encoding_loaded = False
+_lock = threading.Lock()
+
+def _get_encoding():
+    """Load the tiktoken encoding once, or None if it can't be loaded."""
+    global _encoding, _encoding_loaded
+
+    if _encoding_loaded:
+        return _encoding
+
+    with _lock:
+        if not _encoding_loaded:
+            try:
+                import tiktoken
+                _encoding = tiktoken.get_encoding(settings.TOKENIZER_ENCODING)
+            except Exception as e:
+                # tiktoken missing, or its BPE file can't be downloaded
+                print(f"Tokenizer {settings.TOKENIZER_ENCODING} unavailable, estimating token counts: {str(e)}")
+                _encoding = None
+            _encoding_loaded = True
+
+    return _encoding
+
+def estimate_tokens(text: str) -> int:
+    """Approximate BPE token count: about one token per four characters of each word."""
+    return sum(math.ceil(len(piece) / 4) for piece in _PIECE_PATTERN.findall(text))
+
+def count_tokens(text: str) -> int:
+    """
+    Count the tokens in a text with the local tokenizer.
+
+    Args:
+        text: The text to measure
+
+    Returns:
+        Number of tokens
+    """
+    encoding = _get_encoding()
+    if encoding is None:
+        return estimate_tokens(text)
+    return len(encoding.encode(text, disallowed_special=()))
+
+def count_tokens_batch(texts: List[str]) -> List[int]:
+    """
+    Count the tokens of several texts at once.
+
+    Args:
+        texts: The texts to measure
+
+    Returns:
+        Number of tokens for each text
+    """
+    encoding = _get_encoding()
+    if encoding is None:
+        return [estimate_tokens(text) for text in texts]
+    return [len(tokens) for tokens in encoding.encode_batch(texts, disallowed_special=())]
+
+def get_length_function(unit: Optional[str] = None) -> Callable[[str], int]:
+    """
+    Get the function measuring text size in the given unit.
+
+    Args:
+        unit: "chars" or "tokens", defaults to settings.CHUNK_SIZE_UNIT
+
+    Returns:
+        Length function
+    """
+    unit = unit or settings.CHUNK_SIZE_UNIT
+
+    if unit == "chars":
+        return len
+    elif unit == "tokens":
+        return count_tokens
+    else:
+        raise ValueError(f"Unsupported chunk size unit: {unit}")
@@ -0,0 +1,510 @@
+from typing import List, Dict, Any, Optional, Iterator, Tuple
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import threading
+import weakref
+from qdrant_client import QdrantClient, AsyncQdrantClient
+from qdrant_client.http import models
+from qdrant_client.http.exceptions import UnexpectedResponse
+
+from app.core.config import settings
+
+# Payload fields with a keyword index, usable in search filters
+FILTERABLE_FIELDS = ("source", "doc_type")
+
+def payload_matches(payload: Dict[str, Any], filters: Optional[Dict[str, List[str]]]) -> bool:
+    """
+    Check a payload against search filters.
+    
+    Args:
+        payload: The point payload
+        filters: Mapping of payload field to accepted values; a point
+            matches if every field has one of its accepted values
+    
+    Returns:
+        True if the payload matches (always, when there are no filters)
+    """
+    return not filters or all(payload.get(field) in values for field, values in filters.items())
+
+class VectorBackend:
+    """Interface implemented by every vector database engine; results are dicts with id, score and payload."""
+    
+    def add(self, ids: List[str], vectors: List[List[float]], payloads: List[Dict[str, Any]]) -> None:
+        """Insert or replace points."""
+        raise NotImplementedError
+    
+    def search(
+        self,
+        vector: List[float],
+        top_k: int,
+        with_vectors: bool = False,
+        filters: Optional[Dict[str, List[str]]] = None
+    ) -> List[Dict[str, Any]]:
+        """Return the top_k most similar points, best first."""
+        raise NotImplementedError
+    
+    def search_batch(
+        self,
+        vectors: List[List[float]],
+        top_k: int,
+        with_vectors: bool = False,
+        filters: Optional[Dict[str, List[str]]] = None
+    ) -> List[List[Dict[str, Any]]]:
+        """Run several searches, returning one result list per vector in order."""
+        return [self.search(vector, top_k, with_vectors, filters) for vector in vectors]
+    
+    def retrieve(self, ids: List[str], with_vectors: bool = False) -> List[Dict[str, Any]]:
+        """Fetch points by ID."""
+        raise NotImplementedError
+    
+    # Async variants; engines without an async client run the sync call in a worker thread
+    
+    async def aadd(self, ids: List[str], vectors: List[List[float]], payloads: List[Dict[str, Any]]) -> None:
+        """Async counterpart of add."""
+        await asyncio.to_thread(self.add, ids, vectors, payloads)
+    
+    async def asearch(
+        self,
+        vector: List[float],
+        top_k: int,
+        with_vectors: bool = False,
+        filters: Optional[Dict[str, List[str]]] = None
+    ) -> List[Dict[str, Any]]:
+        """Async counterpart of search."""
+        return await asyncio.to_thread(self.search, vector, top_k, with_vectors, filters)
+    
+    async def asearch_batch(
+        self,
+        vectors: List[List[float]],
+        top_k: int,
+        with_vectors: bool = False,
+        filters: Optional[Dict[str, List[str]]] = None
+    ) -> List[List[Dict[str, Any]]]:
+        """Async counterpart of search_batch."""
+        return await asyncio.to_thread(self.search_batch, vectors, top_k, with_vectors, filters)
+    
+    async def aclose(self) -> None:
+        """Release the connections the async variants opened on the running event loop."""
+    
+    def delete(self, ids: List[str]) -> None:
+        """Delete points by ID."""
+        raise NotImplementedError
+    
+    def delete_by_source(self, source: str) -> None:
+        """Delete every point whose payload "source" equals source."""
+        raise NotImplementedError
+    
+    def count(self) -> int:
+        """Return the number of stored points."""
+        raise NotImplementedError
+    
+    def iter_payloads(self, batch_size: int = 256) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Yield (id, payload) for every stored point."""
+        raise NotImplementedError
+    
+    def persist(self) -> None:
+        """Flush state to durable storage (no-op for remote engines)."""
+    
+    def clear(self) -> None:
+        """Remove every point."""
+        raise NotImplementedError
+
+class QdrantBackend(VectorBackend):
+    """Vector backend backed by a Qdrant server (or an in-process engine given a location)."""
+    
+    def __init__(
+        self,
+        collection_name: Optional[str] = None,
+        prefer_grpc: Optional[bool] = None,
+        location: Optional[str] = None
+    ):
+        """
+        Initialize the Qdrant clients.
+        
+        Args:
+            collection_name: Collection to use, defaults to QDRANT_COLLECTION_NAME
+            prefer_grpc: Use gRPC transport, defaults to QDRANT_PREFER_GRPC
+            location: Qdrant location instead of QDRANT_HOST (e.g. ":memory:"
+                for a local in-process instance)
+        """
+        self.collection_name = collection_name or settings.QDRANT_COLLECTION_NAME
+        # The in-process engine is neither thread-safe nor shared with an
+        # async client, so only servers get parallel upserts and async I/O
+        self._remote = location is None
+        if location is not None:
+            self._client_options = {"location": location}
+        else:
+            self._client_options = {
+                "host": settings.QDRANT_HOST,
+                "port": settings.QDRANT_PORT,
+                "grpc_port": settings.QDRANT_GRPC_PORT,
+                "prefer_grpc": settings.QDRANT_PREFER_GRPC if prefer_grpc is None else prefer_grpc,
+                "timeout": settings.QDRANT_TIMEOUT_SECONDS
+            }
+        self.client = QdrantClient(**self._client_options)
+        # Async clients hold connections bound to an event loop, so there
+        # is one per loop; a loop's entry goes away with the loop
+        self._async_clients = weakref.WeakKeyDictionary()
+        self._async_lock = threading.Lock()
+        self._ensure_collection_exists()
+    
+    def _aclient(self) -> AsyncQdrantClient:
+        """Get the async client for the running event loop."""
+        loop = asyncio.get_running_loop()
+        with self._async_lock:
+            # A loop that ended without aclose() can no longer run close();
+            # dropping its client lets its connections be collected
+            for closed in [other for other in self._async_clients if other.is_closed()]:
+                del self._async_clients[closed]
+            client = self._async_clients.get(loop)
+            if client is None:
+                client = self._async_clients[loop] = AsyncQdrantClient(**self._client_options)
+        return client
+    
+    async def aclose(self) -> None:
+        with self._async_lock:
+            client = self._async_clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.close()
+    
+    @staticmethod
+    def _quantization_config() -> Optional[models.QuantizationConfig]:
+        """Build the quantization config selected by QDRANT_QUANTIZATION."""
+        quantization = settings.QDRANT_QUANTIZATION
+        if quantization == "none":
+            return None
+        elif quantization == "scalar":
+            # int8 per dimension: 4x smaller than float32 with little recall loss
+            return models.ScalarQuantization(scalar=models.ScalarQuantizationConfig(
+                type=models.ScalarType.INT8,
+                quantile=0.99,
+                always_ram=settings.QDRANT_QUANTIZATION_ALWAYS_RAM
+            ))
+        elif quantization == "binary":
+            # One bit per dimension: 32x smaller, needs rescoring to keep recall
+            return models.BinaryQuantization(binary=models.BinaryQuantizationConfig(
+                always_ram=settings.QDRANT_QUANTIZATION_ALWAYS_RAM
+            ))
+        else:
+            raise ValueError(f"Unsupported Qdrant quantization: {quantization}")
+    
+    @staticmethod
+    def _quantization_kind(config: Any) -> str:
+        """Name the quantization of an existing collection like QDRANT_QUANTIZATION does."""
+        if config is None:
+            return "none"
+        if isinstance(config, models.ScalarQuantization):
+            return "scalar"
+        if isinstance(config, models.BinaryQuantization):
+            return "binary"
+        return "product"
+    
+    def _search_params(self) -> Optional[models.SearchParams]:
+        """Search parameters for quantized collections (rescoring and oversampling)."""
+        # The in-process engine always searches exactly and ignores them
+        if settings.QDRANT_QUANTIZATION == "none" or not self._remote:
+            return None
+        return models.SearchParams(quantization=models.QuantizationSearchParams(
+            rescore=settings.QDRANT_SEARCH_RESCORE,
+            oversampling=settings.QDRANT_SEARCH_OVERSAMPLING
+        ))
+    
+    def _update_storage(self, info: Any) -> None:
+        """Bring an existing collection's vector storage in line with the settings."""
+        vectors = info.config.params.vectors
+        if vectors.size != settings.QDRANT_VECTOR_SIZE:
+            # Changing dimensions means re-embedding every chunk
+            raise ValueError(
+                f"Collection {self.collection_name} holds {vectors.size}-dimensional vectors "
+                f"but QDRANT_VECTOR_SIZE is {settings.QDRANT_VECTOR_SIZE}; "
+                f"re-embed it into a new collection with migrate_collection.py"
+            )
+        if not self._remote:
+            return
+        
+        changes = {}
+        if bool(vectors.on_disk) != settings.QDRANT_ON_DISK_VECTORS:
+            changes["vectors_config"] = {"": models.VectorParamsDiff(on_disk=settings.QDRANT_ON_DISK_VECTORS)}
+        if self._quantization_kind(info.config.quantization_config) != settings.QDRANT_QUANTIZATION:
+            changes["quantization_config"] = self._quantization_config() or models.Disabled.DISABLED
+        
+        if changes:
+            # Qdrant rebuilds the affected segments in the background
+            self.client.update_collection(collection_name=self.collection_name, **changes)
+            print(f"Updated collection {self.collection_name}: quantization={settings.QDRANT_QUANTIZATION}, "
+                  f"on_disk={settings.QDRANT_ON_DISK_VECTORS}")
+    
+    def _ensure_collection_exists(self):
+        """Ensure that the collection exists in Qdrant."""
+        try:
+            # Check if collection exists
+            info = self.client.get_collection(self.collection_name)
+            print(f"Collection {self.collection_name} already exists")
+            indexed = set(info.payload_schema or {})
+        except (UnexpectedResponse, Exception) as e:
+            print(f"Collection {self.collection_name} does not exist: {str(e)}")
+            # Create collection if it doesn't exist
+            print(f"Creating collection {self.collection_name} with vector size {settings.QDRANT_VECTOR_SIZE}")
+            self.client.create_collection(
+                collection_name=self.collection_name,
+                vectors_config=models.VectorParams(
+                    size=settings.QDRANT_VECTOR_SIZE,
+                    distance=models.Distance.COSINE,
+                    on_disk=settings.QDRANT_ON_DISK_VECTORS
+                ),
+                quantization_config=self._quantization_config()
+            )
+            print(f"Collection {self.collection_name} created successfully")
+            indexed = set()
+        else:
+            self._update_storage(info)
+        
+        # Keyword indexes keep filtered searches (and deletes by source) fast
+        for field in FILTERABLE_FIELDS:
+            if field not in indexed:
+                self.client.create_payload_index(
+                    collection_name=self.collection_name,
+                    field_name=field,
+                    field_schema=models.PayloadSchemaType.KEYWORD
+                )
+                print(f"Created keyword payload index on {field}")
+    
+    @staticmethod
+    def _to_result(point: Any, with_vectors: bool) -> Dict[str, Any]:
+        """Convert a Qdrant point to a result dictionary."""
+        result = {
+            "id": str(point.id),
+            "score": getattr(point, "score", None),
+            "payload": point.payload or {}
+        }
+        if with_vectors:
+            result["vector"] = point.vector
+        return result
+    
+    @staticmethod
+    def _upsert_batches(
+        ids: List[str],
+        vectors: List[List[float]],
+        payloads: List[Dict[str, Any]]
+    ) -> List[models.Batch]:
+        """Split points into sub-batches that stay well below request size limits."""
+        size = max(1, settings.QDRANT_UPSERT_BATCH_SIZE)
+        return [
+            models.Batch(ids=ids[i:i+size], vectors=vectors[i:i+size], payloads=payloads[i:i+size])
+            for i in range(0, len(ids), size)
+        ]
+    
+    def add(self, ids: List[str], vectors: List[List[float]], payloads: List[Dict[str, Any]]) -> None:
+        batches = self._upsert_batches(ids, vectors, payloads)
+        
+        def upsert(batch: models.Batch) -> None:
+            self.client.upsert(collection_name=self.collection_name, points=batch)
+        
+        if len(batches) == 1 or not self._remote:
+            for batch in batches:
+                upsert(batch)
+        elif batches:
+            max_workers = min(settings.QDRANT_UPSERT_PARALLELISM, len(batches))
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                # list() re-raises the first failed upsert
+                list(executor.map(upsert, batches))
+    
+    async def aadd(self, ids: List[str], vectors: List[List[float]], payloads: List[Dict[str, Any]]) -> None:
+        if not self._remote:
+            return await super().aadd(ids, vectors, payloads)
+        
+        client = self._aclient()
+        semaphore = asyncio.Semaphore(settings.QDRANT_UPSERT_PARALLELISM)
+        
+        async def upsert(batch: models.Batch) -> None:
+            async with semaphore:
+                await client.upsert(collection_name=self.collection_name, points=batch)
+        
+        await asyncio.gather(*(upsert(batch) for batch in self._upsert_batches(ids, vectors, payloads)))
+    
+    def search(
+        self,
+        vector: List[float],
+        top_k: int,
+        with_vectors: bool = False,
+        filters: Optional[Dict[str, List[str]]] = None
+    ) -> List[Dict[str, Any]]:
+        response = self.client.query_points(
+            collection_name=self.collection_name,
+            query=vector,
+            query_filter=self._to_filter(filters),
+            search_params=self._search_params(),
+            limit=top_k,
+            with_payload=True,
+            with_vectors=with_vectors
+        )
+        return [self._to_result(point, with_vectors) for point in response.points]
+    
+    async def asearch(
+        self,
+        vector: List[float],
+        top_k: int,
+        with_vectors: bool = False,
+        filters: Optional[Dict[str, List[str]]] = None
+    ) -> List[Dict[str, Any]]:
+        if not self._remote:
+            return await super().asearch(vector, top_k, with_vectors, filters)
+        
+        response = await self._aclient().query_points(
+            collection_name=self.collection_name,
+            query=vector,
+            query_filter=self._to_filter(filters),
+            search_params=self._search_params(),
+            limit=top_k,
+            with_payload=True,
+            with_vectors=with_vectors
+        )
+        return [self._to_result(point, with_vectors) for point in response.points]
+    
+    @staticmethod
+    def _to_filter(filters: Optional[Dict[str, List[str]]]) -> Optional[models.Filter]:
+        """Convert search filters to a Qdrant filter (served by the payload indexes)."""
+        if not filters:
+            return None
+        return models.Filter(
+            must=[
+                models.FieldCondition(key=field, match=models.MatchAny(any=list(values)))
+                for field, values in filters.items()
+            ]
+        )
+    
+    def _query_requests(
+        self,
+        vectors: List[List[float]],
+        top_k: int,
+        with_vectors: bool,
+        filters: Optional[Dict[str, List[str]]]
+    ) -> List[models.QueryRequest]:
+        query_filter = self._to_filter(filters)
+        search_params = self._search_params()
+        return [
+            models.QueryRequest(
+                query=vector,
+                filter=query_filter,
+                params=search_params,
+                limit=top_k,
+                with_payload=True,
+                with_vector=with_vectors
+            )
+            for vector in vectors
+        ]
+    
+    def search_batch(
+        self,
+        vectors: List[List[float]],
+        top_k: int,
+        with_vectors: bool = False,
+        filters: Optional[Dict[str, List[str]]] = None
+    ) -> List[List[Dict[str, Any]]]:
+        if not vectors:
+            return []
+        # One round trip for every query instead of one per query
+        responses = self.client.query_batch_points(
+            collection_name=self.collection_name,
+            requests=self._query_requests(vectors, top_k, with_vectors, filters)
+        )
+        return [
+            [self._to_result(point, with_vectors) for point in response.points]
+            for response in responses
+        ]
+    
+    async def asearch_batch(
+        self,
+        vectors: List[List[float]],
+        top_k: int,
+        with_vectors: bool = False,
+        filters: Optional[Dict[str, List[str]]] = None
+    ) -> List[List[Dict[str, Any]]]:
+        if not self._remote:
+            return await super().asearch_batch(vectors, top_k, with_vectors, filters)
+        if not vectors:
+            return []
+        
+        responses = await self._aclient().query_batch_points(
+            collection_name=self.collection_name,
+            requests=self._query_requests(vectors, top_k, with_vectors, filters)
+        )
+        return [
+            [self._to_result(point, with_vectors) for point in response.points]
+            for response in responses
+        ]
+    
+    def retrieve(self, ids: List[str], with_vectors: bool = False) -> List[Dict[str, Any]]:
+        points = self.client.retrieve(
+            collection_name=self.collection_name,
+            ids=ids,
+            with_payload=True,
+            with_vectors=with_vectors
+        )
+        return [self._to_result(point, with_vectors) for point in points]
+    
+    def delete(self, ids: List[str]) -> None:
+        self.client.delete(
+            collection_name=self.collection_name,
+            points_selector=models.PointIdsList(
+                points=ids
+            )
+        )
+    
+    def delete_by_source(self, source: str) -> None:
+        self.client.delete(
+            collection_name=self.collection_name,
+            points_selector=models.FilterSelector(
+                filter=models.Filter(
+                    must=[models.FieldCondition(key="source", match=models.MatchValue(value=source))]
+                )
+            )
+        )
+    
+    def count(self) -> int:
+        return self.client.count(collection_name=self.collection_name, exact=True).count
+    
+    def iter_payloads(self, batch_size: int = 256) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        offset = None
+        while True:
+            points, offset = self.client.scroll(
+                collection_name=self.collection_name,
+                limit=batch_size,
+                offset=offset,
+                with_payload=True,
+                with_vectors=False
+            )
+            for point in points:
+                yield str(point.id), point.payload or {}
+            if offset is None:
+                return
+    
+    def clear(self) -> None:
+        # Delete and recreate the collection
+        self.client.delete_collection(self.collection_name)
+        self._ensure_collection_exists()
+
+def create_vector_backend(db_type: Optional[str] = None) -> VectorBackend:
+    """
+    Create the vector backend selected by VECTOR_DB_TYPE.
+    
+    Args:
+        db_type: Backend name, defaults to settings.VECTOR_DB_TYPE
+    
+    Returns:
+        Vector backend instance
+    """
+    db_type = db_type or settings.VECTOR_DB_TYPE
+    
+    if db_type == "qdrant":
+        return QdrantBackend()
+    elif db_type == "faiss":
+        # Imported lazily so faiss is only required when selected
+        from app.services.faiss_backend import FaissBackend
+        return FaissBackend(
+            index_dir=settings.FAISS_INDEX_DIR,
+            dimension=settings.QDRANT_VECTOR_SIZE,
+            index_type=settings.FAISS_INDEX_TYPE
+        )
+    else:
+        raise ValueError(f"Unsupported vector database type: {db_type}")
@@ -1,122 +1,446 @@
-from typing import List, Dict, Any, Optional, Tuple
+from typing import Callable, List, Dict, Any, Optional, Tuple
+import asyncio
+import hashlib
+import heapq
+import os
+import re
 import uuid
 import numpy as np
-from qdrant_client import QdrantClient
-from qdrant_client.http import models
-from qdrant_client.http.exceptions import UnexpectedResponse
 
 from app.core.config import settings
 from app.services.azure_openai import azure_openai_service
+from app.services.ttl_cache import TTLCache
+from app.services.vector_backends import create_vector_backend
+from app.services.lexical_index import create_lexical_index
+from app.services.chunk_store import create_chunk_store
+from app.services.corpus_version import create_corpus_version
+
+# Namespace for deterministic chunk point IDs
+POINT_ID_NAMESPACE = uuid.UUID("6f1c1f5e-3a57-4d2b-9a8e-1b7de2c0a9f4")
+
+# Payload fields kept in the vector database when texts live in the chunk store
+PAYLOAD_FIELDS = ("source", "doc_type", "chunk_index")
+
+# A token containing a digit: SOW numbers, product codes, versions
+_IDENTIFIER_TOKEN = re.compile(r"[\w./#-]*\d[\w./#-]*")
+
+def make_point_ids(
+    texts: List[str],
+    metadatas: List[Dict[str, Any]],
+    occurrences: Optional[Dict[Tuple[str, str], int]] = None
+) -> List[str]:
+    """
+    Derive deterministic point IDs from each chunk's source and content.
+    
+    Identical chunks within one source are told apart by their occurrence
+    number, so re-ingesting the same file always yields the same IDs.
+    
+    Args:
+        texts: List of chunk texts
+        metadatas: List of metadata dictionaries with a "source" key
+        occurrences: Occurrence counts to continue from when a document is
+            processed in several batches (updated in place)
+        
+    Returns:
+        List of UUID strings
+    """
+    ids = []
+    if occurrences is None:
+        occurrences = {}
+    
+    for text, metadata in zip(texts, metadatas):
+        content_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        key = (metadata.get("source", ""), content_hash)
+        occurrence = occurrences.get(key, 0)
+        occurrences[key] = occurrence + 1
+        ids.append(str(uuid.uuid5(POINT_ID_NAMESPACE, f"{key[0]}\0{content_hash}\0{occurrence}")))
+    
+    return ids
+
+def make_filters(
+    sources: Optional[List[str]] = None,
+    doc_types: Optional[List[str]] = None
+) -> Optional[Dict[str, List[str]]]:
+    """
+    Build search filters restricting results to some documents.
+    
+    Args:
+        sources: Source file names to search in
+        doc_types: Document types (file extensions such as "pdf") to search in
+        
+    Returns:
+        Mapping of payload field to accepted values, or None for no restriction
+    """
+    filters = {}
+    if sources:
+        filters["source"] = list(sources)
+    if doc_types:
+        filters["doc_type"] = [doc_type.lower().lstrip(".") for doc_type in doc_types]
+    return filters or None
+
+def is_identifier_query(query: str) -> bool:
+    """
+    Check whether a query is a short lookup of an identifier.
+    
+    Such queries (e.g. "SOW-2023-014 budget") are answered from the
+    lexical index alone, without embedding them.
+    
+    Args:
+        query: The query text
+        
+    Returns:
+        True if the query has at most LEXICAL_FAST_PATH_MAX_TERMS words
+        and at least one of them contains a digit
+    """
+    tokens = [token.strip("?!.,:;\"'()") for token in query.split()]
+    return (
+        0 < len(tokens) <= settings.LEXICAL_FAST_PATH_MAX_TERMS
+        and any(_IDENTIFIER_TOKEN.fullmatch(token) for token in tokens)
+    )
+
+def mmr_order(relevance: np.ndarray, vectors: np.ndarray, lambda_mult: float) -> List[int]:
+    """
+    Order candidates by Maximal Marginal Relevance.
+    
+    Each step picks the candidate maximizing
+    lambda_mult * relevance - (1 - lambda_mult) * (highest cosine
+    similarity to an already picked candidate), so near-duplicates of
+    earlier picks sink to the end.
+    
+    Args:
+        relevance: Relevance of each candidate to the query, in [0, 1]
+        vectors: Candidate vectors, one row per candidate
+        lambda_mult: Trade-off between relevance (1) and diversity (0)
+        
+    Returns:
+        Candidate indexes in MMR order
+    """
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    unit = vectors / np.where(norms == 0, 1, norms)
+    similarity = unit @ unit.T
+    
+    count = len(relevance)
+    order = []
+    max_similarity = np.zeros(count, dtype=np.float32)
+    picked = np.zeros(count, dtype=bool)
+    for _ in range(count):
+        scores = lambda_mult * relevance - (1 - lambda_mult) * max_similarity
+        scores[picked] = -np.inf
+        best = int(np.argmax(scores))
+        order.append(best)
+        picked[best] = True
+        np.maximum(max_similarity, similarity[best], out=max_similarity)
+    
+    return order
+
+def _join_overlapping(first: str, second: str) -> str:
+    """Join two consecutive chunks, keeping the text they overlap on once."""
+    # The overlap is the longest suffix of first that is also a prefix of
+    # second and starts and ends on a word boundary (it is whole sentences)
+    start = first.find(second[:1], max(0, len(first) - len(second)))
+    while start != -1:
+        overlap = len(first) - start
+        if (
+            (start == 0 or first[start - 1].isspace())
+            and (overlap == len(second) or second[overlap].isspace())
+            and second.startswith(first[start:])
+        ):
+            return first + second[overlap:]
+        start = first.find(second[:1], start + 1)
+    
+    return f"{first} {second}"
 
 class VectorStore:
     """Vector database service for storing and retrieving document embeddings."""
     
     def __init__(self):
-        """Initialize the vector database client."""
-        if settings.VECTOR_DB_TYPE == "qdrant":
-            self.client = QdrantClient(host=settings.QDRANT_HOST, port=settings.QDRANT_PORT)
-            self._ensure_collection_exists()
-        else:
-            raise ValueError(f"Unsupported vector database type: {settings.VECTOR_DB_TYPE}")
+        """Initialize the vector database backend."""
+        self.query_cache = TTLCache(
+            max_entries=settings.QUERY_CACHE_MAX_ENTRIES,
+            ttl_seconds=settings.QUERY_CACHE_TTL_SECONDS
+        )
+        
+        self.backend = create_vector_backend(settings.VECTOR_DB_TYPE)
+        
+        # Chunk texts, kept out of the vector database payloads
+        self.chunk_store = create_chunk_store()
+        
+        # BM25 index over the same chunks, for hybrid and identifier search
+        lexical_index_exists = os.path.exists(settings.LEXICAL_INDEX_PATH)
+        self.lexical_index = create_lexical_index()
+        if self.lexical_index is not None and not lexical_index_exists:
+            self.rebuild_lexical_index()
+        
+        # Changes whenever chunks are added or removed, in any process, so
+        # caches of answers derived from the corpus can tell when they may be stale
+        self._corpus_version = create_corpus_version()
     
-    def _ensure_collection_exists(self):
-        """Ensure that the collection exists in Qdrant."""
+    @property
+    def corpus_version(self) -> int:
+        """Version of the corpus, shared by every process using the same data directory."""
+        return self._corpus_version.get()
+    
+    def _bump_corpus_version(self) -> None:
+        self._corpus_version.bump()
+    
+    def rebuild_lexical_index(self) -> int:
+        """
+        Rebuild the BM25 index from the chunks stored in the vector database.
+        
+        Returns:
+            Number of chunks indexed
+        """
+        if self.lexical_index is None:
+            return 0
+        
         try:
-            # Check if collection exists
-            self.client.get_collection(settings.QDRANT_COLLECTION_NAME)
-            print(f"Collection {settings.QDRANT_COLLECTION_NAME} already exists")
-        except (UnexpectedResponse, Exception) as e:
-            print(f"Collection {settings.QDRANT_COLLECTION_NAME} does not exist: {str(e)}")
-            # Create collection if it doesn't exist
-            print(f"Creating collection {settings.QDRANT_COLLECTION_NAME} with vector size {settings.QDRANT_VECTOR_SIZE}")
-            self.client.create_collection(
-                collection_name=settings.QDRANT_COLLECTION_NAME,
-                vectors_config=models.VectorParams(
-                    size=settings.QDRANT_VECTOR_SIZE,
-                    distance=models.Distance.COSINE
-                )
-            )
-            print(f"Collection {settings.QDRANT_COLLECTION_NAME} created successfully")
+            self.lexical_index.clear()
+            ids, texts, metadatas = [], [], []
+            for point_id, payload in self.backend.iter_payloads():
+                ids.append(point_id)
+                texts.append(payload.get("text", ""))
+                metadatas.append(payload)
+            if self.chunk_store is not None:
+                stored_texts = self.chunk_store.get_many(point_id for point_id, text in zip(ids, texts) if not text)
+                texts = [text or stored_texts.get(point_id, "") for point_id, text in zip(ids, texts)]
+            self.lexical_index.add(ids, texts, metadatas)
+            print(f"Rebuilt BM25 index with {len(ids)} chunks")
+            return len(ids)
+        except Exception as e:
+            print(f"Error rebuilding BM25 index: {str(e)}")
+            return 0
     
-    def add_documents(self, texts: List[str], metadatas: List[Dict[str, Any]]) -> List[str]:
+    def add_documents(
+        self,
+        texts: List[str],
+        metadatas: List[Dict[str, Any]],
+        ids: Optional[List[str]] = None,
+        persist: bool = True,
+        on_embedded: Optional[Callable[[], None]] = None
+    ) -> List[str]:
         """
         Add documents to the vector store.
         
+        Points are upserted, so adding a chunk with an existing ID replaces
+        it. Chunks whose embedding failed are not stored.
+        
         Args:
             texts: List of document texts
             metadatas: List of metadata dictionaries
+            ids: Optional point IDs, defaults to make_point_ids(texts, metadatas)
+            persist: Flush the backend to disk afterwards; callers adding a
+                document in batches can persist once at the end instead
+            on_embedded: Called once the embeddings are generated, before
+                the points are written (for progress reporting)
             
         Returns:
-            List of document IDs
+            List of IDs of the stored documents
         """
         if not texts or len(texts) != len(metadatas):
             return []
         
+        if ids is None:
+            ids = make_point_ids(texts, metadatas)
+        
         # Generate embeddings
         embeddings = azure_openai_service.generate_embeddings(texts)
         
-        # Generate IDs
-        ids = [str(uuid.uuid4()) for _ in range(len(texts))]
+        # Zero vectors are the embedding error fallback; don't index them
+        stored = [i for i, embedding in enumerate(embeddings) if any(embedding)]
+        if not stored:
+            return []
+        if on_embedded is not None:
+            on_embedded()
         
-        # Add points to Qdrant
-        self.client.upsert(
-            collection_name=settings.QDRANT_COLLECTION_NAME,
-            points=models.Batch(
-                ids=ids,
-                vectors=embeddings,
-                payloads=metadatas
-            )
-        )
+        ids = [ids[i] for i in stored]
+        texts = [texts[i] for i in stored]
+        metadatas = [metadatas[i] for i in stored]
+        
+        # Texts go in first, so every searchable point has its text
+        self._store_texts(ids, texts, metadatas)
+        
+        # Add points to the vector database
+        self.backend.add(ids, [embeddings[i] for i in stored], self._payloads(texts, metadatas))
+        if self.lexical_index is not None:
+            self.lexical_index.add(ids, texts, metadatas)
+        self._bump_corpus_version()
+        if persist:
+            self.persist()
         
         return ids
     
-    def search(
-        self, 
-        query: str, 
-        top_k: int = 3
-    ) -> Tuple[List[str], List[Dict[str, Any]], List[float]]:
+    def _store_texts(self, ids: List[str], texts: List[str], metadatas: List[Dict[str, Any]]) -> None:
+        """Write chunk texts to the chunk store, if enabled."""
+        if self.chunk_store is not None:
+            self.chunk_store.put_many(ids, texts, [metadata.get("source", "") for metadata in metadatas])
+    
+    def _payloads(self, texts: List[str], metadatas: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Build the vector database payloads of chunks."""
+        if self.chunk_store is None:
+            return [{**metadata, "text": text} for text, metadata in zip(texts, metadatas)]
+        # Only the fields search filters and passage merging need
+        return [
+            {key: metadata[key] for key in PAYLOAD_FIELDS if key in metadata}
+            for metadata in metadatas
+        ]
+    
+    def persist(self) -> None:
+        """Flush the vector database backend to durable storage (the BM25 index commits every change)."""
+        self.backend.persist()
+    
+    async def aclose(self) -> None:
+        """Close the vector database connections opened on the running event loop."""
+        await self.backend.aclose()
+    
+    async def aadd_documents(
+        self,
+        texts: List[str],
+        metadatas: List[Dict[str, Any]],
+        ids: Optional[List[str]] = None
+    ) -> List[str]:
         """
-        Search for similar documents.
+        Async counterpart of add_documents.
+        
+        Args:
+            texts: List of document texts
+            metadatas: List of metadata dictionaries
+            ids: Optional point IDs, defaults to make_point_ids(texts, metadatas)
+            
+        Returns:
+            List of IDs of the stored documents
+        """
+        if not texts or len(texts) != len(metadatas):
+            return []
+        
+        if ids is None:
+            ids = make_point_ids(texts, metadatas)
+        
+        embeddings = await azure_openai_service.agenerate_embeddings(texts)
+        
+        stored = [i for i, embedding in enumerate(embeddings) if any(embedding)]
+        if not stored:
+            return []
+        
+        ids = [ids[i] for i in stored]
+        texts = [texts[i] for i in stored]
+        metadatas = [metadatas[i] for i in stored]
+        
+        await asyncio.to_thread(self._store_texts, ids, texts, metadatas)
+        await self.backend.aadd(ids, [embeddings[i] for i in stored], self._payloads(texts, metadatas))
+        
+        def index():
+            if self.lexical_index is not None:
+                self.lexical_index.add(ids, texts, metadatas)
+            self.persist()
+        
+        await asyncio.to_thread(index)
+        self._bump_corpus_version()
+        
+        return ids
+    
+    def embed_query(self, query: str) -> List[float]:
+        """
+        Get the embedding for a query, using the in-process query cache.
+        
+        Queries are normalized (case and whitespace) before lookup so
+        trivially different phrasings of the same question share an entry.
         
         Args:
             query: The query text
-            top_k: Number of results to return
             
         Returns:
-            Tuple of (texts, metadatas, scores)
+            Query embedding
         """
-        # Generate query embedding
-        query_embedding = azure_openai_service.generate_embeddings([query])[0]
-        
-        # Search in Qdrant
-        search_results = self.client.search(
-            collection_name=settings.QDRANT_COLLECTION_NAME,
-            query_vector=query_embedding,
-            limit=top_k,
-            with_payload=True
-        )
+        key = self._query_cache_key(query)
+        
+        embedding = self.query_cache.get(key)
+        if embedding is None:
+            embedding = azure_openai_service.generate_embeddings([query])[0]
+            # Don't cache the zero-vector error fallback
+            if any(embedding):
+                self.query_cache.set(key, embedding)
+        
+        return embedding
+    
+    async def aembed_query(self, query: str) -> List[float]:
+        """
+        Async counterpart of embed_query.
+        
+        Args:
+            query: The query text
+            
+        Returns:
+            Query embedding
+        """
+        key = self._query_cache_key(query)
+        
+        embedding = self.query_cache.get(key)
+        if embedding is None:
+            embedding = (await azure_openai_service.agenerate_embeddings([query]))[0]
+            if any(embedding):
+                self.query_cache.set(key, embedding)
+        
+        return embedding
+    
+    async def aembed_queries(self, queries: List[str]) -> List[List[float]]:
+        """
+        Embed several queries, with one batched embedding request for all cache misses.
+        
+        Args:
+            queries: The query texts
+            
+        Returns:
+            Query embeddings, in the same order as queries
+        """
+        keys = [self._query_cache_key(query) for query in queries]
+        embeddings = [self.query_cache.get(key) for key in keys]
+        
+        # Embed each distinct missing query once
+        missing = {}
+        for query, key, embedding in zip(queries, keys, embeddings):
+            if embedding is None and key not in missing:
+                missing[key] = query
+        
+        if missing:
+            new_embeddings = await azure_openai_service.agenerate_embeddings(
+                list(missing.values()), batch_size=settings.BATCH_QUERY_EMBEDDING_BATCH_SIZE
+            )
+            computed = dict(zip(missing, new_embeddings))
+            for key, embedding in computed.items():
+                if any(embedding):
+                    self.query_cache.set(key, embedding)
+            embeddings = [
+                embedding if embedding is not None else computed[key]
+                for key, embedding in zip(keys, embeddings)
+            ]
         
-        # Extract results
+        return embeddings
+    
+    def _query_cache_key(self, query: str) -> Tuple[str, str]:
+        """Normalize a query (case and whitespace) into a query cache key."""
+        return (azure_openai_service.embedding_model_key(), " ".join(query.split()).casefold())
+    
+    def _to_search_results(
+        self,
+        search_results: List[Dict[str, Any]]
+    ) -> Tuple[List[str], List[Dict[str, Any]], List[float]]:
+        """Split backend results into (texts, metadatas, scores)."""
         texts = []
         metadatas = []
         scores = []
         
         for result in search_results:
-            # Get the document ID
-            doc_id = result.id
-            
-            # Get the document payload (metadata)
-            metadata = result.payload
+            # Get the document payload (metadata), with the point ID; copied
+            # so in-process backends never see callers' changes
+            metadata = {**result["payload"], "id": result["id"]}
             
             # Get the similarity score
-            score = result.score
+            score = result["score"]
             
-            # Get the document text from the payload
+            # Get the document text (set by _rerank from the payload or chunk store)
             text = metadata.get("text", "")
             if not text:
-                # If text is not in payload, we need to fetch it from the source
-                # This is a simplified approach - in a real system, you might store the text in the payload
-                # or have a separate database for document storage
+                # The chunk's text is missing from both; point at its source instead
                 source = metadata.get("source", "")
                 chunk_index = metadata.get("chunk_index", 0)
                 text = f"Document: {source}, Chunk: {chunk_index}"
@@ -127,6 +451,359 @@ class VectorStore:
         
         return texts, metadatas, scores
     
+    def _lexical_weight(self, lexical_weight: Optional[float]) -> float:
+        """Resolve the lexical fusion weight (0 when there is no BM25 index)."""
+        if self.lexical_index is None:
+            return 0.0
+        if lexical_weight is None:
+            return settings.HYBRID_LEXICAL_WEIGHT
+        return lexical_weight
+    
+    def _lexical_search(
+        self,
+        query: str,
+        top_k: int,
+        with_vectors: bool = False,
+        filters: Optional[Dict[str, List[str]]] = None
+    ) -> List[Dict[str, Any]]:
+        """Rank chunks by BM25 and fetch their payloads from the backend."""
+        hits = self.lexical_index.search(query, top_k, filters)
+        if not hits:
+            return []
+        
+        points = {
+            point["id"]: point
+            for point in self.backend.retrieve([point_id for point_id, _ in hits], with_vectors=with_vectors)
+        }
+        return [
+            {**points[point_id], "score": score}
+            for point_id, score in hits
+            if point_id in points
+        ]
+    
+    def _hybrid_search(
+        self,
+        query: str,
+        query_embedding: List[float],
+        top_k: int,
+        lexical_weight: float,
+        with_vectors: bool = False,
+        filters: Optional[Dict[str, List[str]]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Fuse dense and BM25 rankings with weighted reciprocal rank fusion.
+        
+        Each list contributes weight / (HYBRID_RRF_K + rank) to a chunk's
+        score, with lexical_weight for BM25 and 1 - lexical_weight for the
+        dense ranking.
+        """
+        dense_results = self.backend.search(
+            query_embedding, self._dense_count(top_k, lexical_weight), with_vectors=with_vectors, filters=filters
+        )
+        return self._fuse(query, dense_results, top_k, lexical_weight, with_vectors, filters)
+    
+    @staticmethod
+    def _dense_count(top_k: int, lexical_weight: float) -> int:
+        """Number of dense results to fetch for fusing down to top_k."""
+        if lexical_weight <= 0:
+            return top_k
+        # Over-fetch from both rankings so fusion has candidates to reorder
+        return top_k * settings.HYBRID_CANDIDATE_MULTIPLIER
+    
+    def _fuse(
+        self,
+        query: str,
+        dense_results: List[Dict[str, Any]],
+        top_k: int,
+        lexical_weight: float,
+        with_vectors: bool = False,
+        filters: Optional[Dict[str, List[str]]] = None
+    ) -> List[Dict[str, Any]]:
+        """Fuse a dense ranking (see _dense_count) with the BM25 ranking of query."""
+        if lexical_weight <= 0:
+            return dense_results
+        
+        candidates = self._dense_count(top_k, lexical_weight)
+        lexical_hits = self.lexical_index.search(query, candidates, filters)
+        
+        rrf_k = settings.HYBRID_RRF_K
+        scores = {}
+        points = {}
+        for rank, result in enumerate(dense_results, start=1):
+            scores[result["id"]] = (1 - lexical_weight) / (rrf_k + rank)
+            points[result["id"]] = result
+        for rank, (point_id, _) in enumerate(lexical_hits, start=1):
+            scores[point_id] = scores.get(point_id, 0.0) + lexical_weight / (rrf_k + rank)
+        
+        fused = heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+        
+        # Chunks found only by BM25 still need their payloads
+        missing = [point_id for point_id, _ in fused if point_id not in points]
+        if missing:
+            points.update(
+                (point["id"], point)
+                for point in self.backend.retrieve(missing, with_vectors=with_vectors)
+            )
+        
+        return [
+            {**points[point_id], "score": score}
+            for point_id, score in fused
+            if point_id in points
+        ]
+    
+    def _merge_adjacent(self, results: List[Dict[str, Any]], top_k: int) -> List[Dict[str, Any]]:
+        """
+        Take the first top_k passages, merging neighbouring chunks of a document.
+        
+        A result whose chunk_index is next to a passage already taken from
+        the same source is appended or prepended to it instead of taking a
+        slot of its own. Passages list the chunks they are made of under
+        "parts", in document order, and the index of their last chunk under
+        "last_chunk_index"; _attach_texts joins the texts and drops both keys.
+        """
+        passages = []
+        for result in results:
+            if len(passages) == top_k:
+                break
+            
+            payload = result["payload"]
+            source = payload.get("source")
+            chunk_index = payload.get("chunk_index")
+            
+            for passage in passages:
+                merged = passage["payload"]
+                if merged.get("source") != source or chunk_index is None or merged.get("chunk_index") is None:
+                    continue
+                if chunk_index == passage["last_chunk_index"] + 1:
+                    passage["parts"].append(result)
+                    passage["last_chunk_index"] = chunk_index
+                elif chunk_index == merged["chunk_index"] - 1:
+                    passage["parts"].insert(0, result)
+                    merged["chunk_index"] = chunk_index
+                else:
+                    continue
+                break
+            else:
+                passages.append({
+                    "id": result["id"],
+                    "score": result["score"],
+                    "payload": dict(payload),
+                    "parts": [result],
+                    "last_chunk_index": chunk_index
+                })
+        
+        return passages
+    
+    def _attach_texts(self, passages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Set each passage's payload "text" from the chunks it is made of.
+        
+        Texts missing from the payloads are read from the chunk store in
+        one query; overlapping neighbours are joined without their overlap.
+        """
+        missing = [
+            part["id"]
+            for passage in passages
+            for part in passage["parts"]
+            if not part["payload"].get("text")
+        ]
+        stored_texts = self.chunk_store.get_many(missing) if missing and self.chunk_store is not None else {}
+        
+        for passage in passages:
+            passage.pop("last_chunk_index", None)
+            text = ""
+            for part in passage.pop("parts"):
+                part_text = part["payload"].get("text") or stored_texts.get(part["id"], "")
+                if not part_text:
+                    continue
+                text = _join_overlapping(text, part_text) if text else part_text
+            passage["payload"]["text"] = text
+        
+        return passages
+    
+    def _rerank(self, results: List[Dict[str, Any]], top_k: int) -> List[Dict[str, Any]]:
+        """
+        Reduce over-fetched candidates to top_k diverse passages.
+        
+        Candidates are ordered by MMR over their vectors, using their
+        first-stage scores (rescaled to [0, 1]) as relevance, then adjacent
+        chunks of the same document are merged. Only the texts of the
+        chunks that end up in the returned passages are read.
+        """
+        if settings.MMR_ENABLED and len(results) > 1 and all(result.get("vector") for result in results):
+            scores = np.asarray([result["score"] for result in results], dtype=np.float32)
+            spread = scores.max() - scores.min()
+            relevance = (scores - scores.min()) / spread if spread > 0 else np.ones_like(scores)
+            vectors = np.asarray([result["vector"] for result in results], dtype=np.float32)
+            results = [results[i] for i in mmr_order(relevance, vectors, settings.MMR_LAMBDA)]
+        
+        if settings.MERGE_ADJACENT_CHUNKS:
+            passages = self._merge_adjacent(results, top_k)
+        else:
+            passages = [
+                {"id": result["id"], "score": result["score"], "payload": dict(result["payload"]), "parts": [result]}
+                for result in results[:top_k]
+            ]
+        return self._attach_texts(passages)
+    
+    def _candidate_count(self, top_k: int) -> int:
+        """Number of candidates to fetch for re-ranking down to top_k."""
+        if settings.MMR_ENABLED or settings.MERGE_ADJACENT_CHUNKS:
+            return top_k * settings.MMR_CANDIDATE_MULTIPLIER
+        return top_k
+    
+    def search(
+        self, 
+        query: str, 
+        top_k: int = 3,
+        lexical_weight: Optional[float] = None,
+        filters: Optional[Dict[str, List[str]]] = None
+    ) -> Tuple[List[str], List[Dict[str, Any]], List[float]]:
+        """
+        Search for similar documents.
+        
+        Dense and BM25 results are fused unless lexical_weight is 0.
+        Identifier lookups (see is_identifier_query) are answered from
+        BM25 alone, skipping the embedding call, when they match anything.
+        
+        Args:
+            query: The query text
+            top_k: Number of results to return
+            lexical_weight: Weight of BM25 in the fusion, from 0 (dense
+                only) to 1 (lexical only); defaults to HYBRID_LEXICAL_WEIGHT
+            filters: Restrict results to some documents (see make_filters)
+            
+        Returns:
+            Tuple of (texts, metadatas, scores)
+        """
+        lexical_weight = self._lexical_weight(lexical_weight)
+        candidates = self._candidate_count(top_k)
+        
+        if lexical_weight >= 1 or (lexical_weight > 0 and is_identifier_query(query)):
+            search_results = self._lexical_search(query, candidates, settings.MMR_ENABLED, filters)
+            if search_results or lexical_weight >= 1:
+                return self._to_search_results(self._rerank(search_results, top_k))
+        
+        # Generate query embedding
+        query_embedding = self.embed_query(query)
+        
+        # Search in the vector database
+        search_results = self._hybrid_search(
+            query, query_embedding, candidates, lexical_weight, settings.MMR_ENABLED, filters
+        )
+        
+        return self._to_search_results(self._rerank(search_results, top_k))
+    
+    async def asearch(
+        self,
+        query: str,
+        top_k: int = 3,
+        lexical_weight: Optional[float] = None,
+        filters: Optional[Dict[str, List[str]]] = None
+    ) -> Tuple[List[str], List[Dict[str, Any]], List[float]]:
+        """
+        Search for similar documents without blocking the event loop.
+        
+        Args:
+            query: The query text
+            top_k: Number of results to return
+            lexical_weight: Weight of BM25 in the fusion, from 0 (dense
+                only) to 1 (lexical only); defaults to HYBRID_LEXICAL_WEIGHT
+            filters: Restrict results to some documents (see make_filters)
+            
+        Returns:
+            Tuple of (texts, metadatas, scores)
+        """
+        lexical_weight = self._lexical_weight(lexical_weight)
+        candidates = self._candidate_count(top_k)
+        
+        if lexical_weight >= 1 or (lexical_weight > 0 and is_identifier_query(query)):
+            search_results = await asyncio.to_thread(
+                self._lexical_search, query, candidates, settings.MMR_ENABLED, filters
+            )
+            if search_results or lexical_weight >= 1:
+                return self._to_search_results(await asyncio.to_thread(self._rerank, search_results, top_k))
+        
+        query_embedding = await self.aembed_query(query)
+        dense_results = await self.backend.asearch(
+            query_embedding,
+            self._dense_count(candidates, lexical_weight),
+            with_vectors=settings.MMR_ENABLED,
+            filters=filters
+        )
+        
+        # Fusion and re-ranking are CPU-bound (and may fetch BM25-only hits); keep them off the loop
+        def rerank() -> List[Dict[str, Any]]:
+            search_results = self._fuse(
+                query, dense_results, candidates, lexical_weight, settings.MMR_ENABLED, filters
+            )
+            return self._rerank(search_results, top_k)
+        
+        return self._to_search_results(await asyncio.to_thread(rerank))
+    
+    async def asearch_batch(
+        self,
+        queries: List[str],
+        top_k: int = 3,
+        lexical_weight: Optional[float] = None,
+        filters: Optional[Dict[str, List[str]]] = None
+    ) -> List[Tuple[List[str], List[Dict[str, Any]], List[float]]]:
+        """
+        Search for several queries at once.
+        
+        Behaves like calling asearch for each query, but embeds all the
+        queries in as few requests as possible and runs the dense searches
+        as a single batch request to the vector database.
+        
+        Args:
+            queries: The query texts
+            top_k: Number of results to return per query
+            lexical_weight: Weight of BM25 in the fusion, from 0 (dense
+                only) to 1 (lexical only); defaults to HYBRID_LEXICAL_WEIGHT
+            filters: Restrict results to some documents (see make_filters)
+            
+        Returns:
+            List of (texts, metadatas, scores) tuples, in the same order as queries
+        """
+        lexical_weight = self._lexical_weight(lexical_weight)
+        candidates = self._candidate_count(top_k)
+        results = [None] * len(queries)
+        
+        lexical_only = [
+            i for i, query in enumerate(queries)
+            if lexical_weight >= 1 or (lexical_weight > 0 and is_identifier_query(query))
+        ]
+        
+        def lexical_retrieve() -> None:
+            for i in lexical_only:
+                search_results = self._lexical_search(queries[i], candidates, settings.MMR_ENABLED, filters)
+                if search_results or lexical_weight >= 1:
+                    results[i] = self._rerank(search_results, top_k)
+        
+        if lexical_only:
+            await asyncio.to_thread(lexical_retrieve)
+        
+        dense = [i for i in range(len(queries)) if results[i] is None]
+        if dense:
+            embeddings = await self.aembed_queries([queries[i] for i in dense])
+            batch_results = await self.backend.asearch_batch(
+                embeddings,
+                self._dense_count(candidates, lexical_weight),
+                with_vectors=settings.MMR_ENABLED,
+                filters=filters
+            )
+            
+            def rerank() -> None:
+                for i, dense_results in zip(dense, batch_results):
+                    search_results = self._fuse(
+                        queries[i], dense_results, candidates, lexical_weight, settings.MMR_ENABLED, filters
+                    )
+                    results[i] = self._rerank(search_results, top_k)
+            
+            await asyncio.to_thread(rerank)
+        
+        return [self._to_search_results(search_results) for search_results in results]
+    
     def get_document_by_id(self, doc_id: str) -> Optional[Dict[str, Any]]:
         """
         Get a document by ID.
@@ -138,19 +815,17 @@ class VectorStore:
             Document data or None if not found
         """
         try:
-            points = self.client.retrieve(
-                collection_name=settings.QDRANT_COLLECTION_NAME,
-                ids=[doc_id],
-                with_payload=True,
-                with_vectors=True
-            )
+            points = self.backend.retrieve([doc_id], with_vectors=True)
             
             if points and len(points) > 0:
                 point = points[0]
+                metadata = dict(point["payload"])
+                if "text" not in metadata and self.chunk_store is not None:
+                    metadata["text"] = self.chunk_store.get_many([doc_id]).get(doc_id, "")
                 return {
-                    "id": point.id,
-                    "metadata": point.payload,
-                    "vector": point.vector
+                    "id": point["id"],
+                    "metadata": metadata,
+                    "vector": point["vector"]
                 }
             
             return None
@@ -170,35 +845,98 @@ class VectorStore:
             True if successful, False otherwise
         """
         try:
-            self.client.delete(
-                collection_name=settings.QDRANT_COLLECTION_NAME,
-                points_selector=models.PointIdsList(
-                    points=[doc_id]
-                )
-            )
+            self.backend.delete([doc_id])
+            if self.lexical_index is not None:
+                self.lexical_index.delete([doc_id])
+            if self.chunk_store is not None:
+                self.chunk_store.delete([doc_id])
+            self.persist()
             return True
         except Exception as e:
             print(f"Error deleting document: {str(e)}")
             return False
+        finally:
+            self._bump_corpus_version()
+    
+    def delete_documents(self, doc_ids: List[str]) -> bool:
+        """
+        Delete several documents by ID.
+        
+        Args:
+            doc_ids: The document IDs
+            
+        Returns:
+            True if successful, False otherwise
+        """
+        try:
+            self.backend.delete(doc_ids)
+            if self.lexical_index is not None:
+                self.lexical_index.delete(doc_ids)
+            if self.chunk_store is not None:
+                self.chunk_store.delete(doc_ids)
+            self.persist()
+            return True
+        except Exception as e:
+            print(f"Error deleting documents: {str(e)}")
+            return False
+        finally:
+            self._bump_corpus_version()
+    
+    def delete_documents_by_source(self, source: str) -> bool:
+        """
+        Delete every chunk that came from a source file.
+        
+        Args:
+            source: The source file name
+            
+        Returns:
+            True if successful, False otherwise
+        """
+        try:
+            self.backend.delete_by_source(source)
+            if self.lexical_index is not None:
+                self.lexical_index.delete_by_source(source)
+            if self.chunk_store is not None:
+                self.chunk_store.delete_by_source(source)
+            self.persist()
+            return True
+        except Exception as e:
+            print(f"Error deleting documents for {source}: {str(e)}")
+            return False
+        finally:
+            self._bump_corpus_version()
+    
+    def count(self) -> int:
+        """
+        Get the number of stored chunks.
+        
+        Returns:
+            Number of points in the vector database
+        """
+        return self.backend.count()
     
     def clear_collection(self) -> bool:
         """
         Clear all documents from the collection.
         
+        Use RAGService.clear_documents() to also forget what was ingested,
+        so the documents can be ingested again.
+        
         Returns:
             True if successful, False otherwise
         """
         try:
-            # Delete the collection
-            self.client.delete_collection(settings.QDRANT_COLLECTION_NAME)
-            
-            # Recreate the collection
-            self._ensure_collection_exists()
-            
+            self.backend.clear()
+            if self.lexical_index is not None:
+                self.lexical_index.clear()
+            if self.chunk_store is not None:
+                self.chunk_store.clear()
             return True
         except Exception as e:
             print(f"Error clearing collection: {str(e)}")
             return False
+        finally:
+            self._bump_corpus_version()
 
 # Create a singleton instance
 vector_store = VectorStore()
@@ -0,0 +1,30 @@
+"""Ingestion worker: processes the jobs queued by the API's upload endpoint.
+
+Run it next to the API, once per deployment:
+
+    python -m app.worker
+
+The API processes only queue uploads, so they never compete with
+ingestion for CPU, memory or embedding rate limits, however many of them
+are started.
+"""
+import signal
+import threading
+
+from app.core.config import settings
+from app.services.rag_service import rag_service
+
+def main() -> None:
+    stopping = threading.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: stopping.set())
+
+    rag_service.start_job_workers()
+    print(f"Ingestion worker started with {settings.JOB_WORKERS} threads on {settings.JOB_QUEUE_PATH}")
+    stopping.wait()
+
+    print("Stopping ingestion worker")
+    rag_service.stop_job_workers()
+
+if __name__ == "__main__":
+    main()
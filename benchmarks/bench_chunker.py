@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Benchmark the document chunker.
+Compares the original split_text against the streaming chunker in
+character and token units on a multi-megabyte synthetic document.
+"""
+
+import os
+import sys
+import re
+import time
+import random
+import argparse
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.document_processor import iter_split_text
+from app.services.tokenizer import count_tokens
+
+WORDS = (
+    "cloud migration security compliance data platform analytics team delivery "
+    "architecture kubernetes python azure integration pipeline customer project"
+).split()
+
+def legacy_split_text(text, chunk_size, chunk_overlap):
+    """The chunker as it was before streaming and token sizing, for reference."""
+    text = text.replace('\n', ' ').strip()
+    sentences = re.split(r'(?<=[.!?])\s+', text)
+
+    chunks = []
+    current_chunk = []
+    current_size = 0
+
+    for sentence in sentences:
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+
+        if not any(sentence.endswith(end) for end in ['.', '!', '?']):
+            sentence += '.'
+
+        sentence_size = len(sentence)
+
+        if current_size + sentence_size > chunk_size and current_chunk:
+            chunks.append(' '.join(current_chunk))
+
+            overlap_size = 0
+            overlap_sentences = []
+
+            for s in reversed(current_chunk):
+                if overlap_size + len(s) <= chunk_overlap:
+                    overlap_sentences.insert(0, s)
+                    overlap_size += len(s) + 1
+                else:
+                    break
+
+            current_chunk = overlap_sentences + [sentence]
+            current_size = sum(len(s) for s in current_chunk) + len(current_chunk) - 1
+        else:
+            current_chunk.append(sentence)
+            current_size += sentence_size + (1 if current_chunk else 0)
+
+    if current_chunk:
+        chunks.append(' '.join(current_chunk))
+
+    return chunks
+
+def make_document(size_mb, seed=42):
+    """Generate paragraphs of random sentences totalling about size_mb megabytes."""
+    rng = random.Random(seed)
+    target = int(size_mb * 1024 * 1024)
+    paragraphs = []
+    total = 0
+    while total < target:
+        sentences = [
+            " ".join(rng.choice(WORDS) for _ in range(rng.randint(6, 20))).capitalize() + rng.choice(".!?")
+            for _ in range(rng.randint(2, 8))
+        ]
+        paragraph = " ".join(sentences)
+        paragraphs.append(paragraph)
+        total += len(paragraph) + 2
+    return "\n\n".join(paragraphs)
+
+def bench(name, func, size_bytes):
+    """Time one chunker run and print its throughput."""
+    start = time.perf_counter()
+    chunks = func()
+    elapsed = time.perf_counter() - start
+    print(f"{name:<32} {elapsed:8.3f}s {size_bytes / elapsed / 1024 / 1024:8.2f} MB/s {len(chunks):8d} chunks")
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description="Benchmark the document chunker.")
+    parser.add_argument("--size-mb", type=float, default=4.0, help="Size of the synthetic document")
+    parser.add_argument("--chunk-size", type=int, default=500, help="Chunk size in characters")
+    parser.add_argument("--chunk-overlap", type=int, default=50, help="Chunk overlap in characters")
+    parser.add_argument("--chunk-tokens", type=int, default=128, help="Chunk size in tokens")
+    parser.add_argument("--overlap-tokens", type=int, default=12, help="Chunk overlap in tokens")
+
+    args = parser.parse_args()
+
+    text = make_document(args.size_mb)
+    size_bytes = len(text.encode("utf-8"))
+    print(f"Synthetic document: {size_bytes / 1024 / 1024:.2f} MB")
+
+    # Load the tokenizer outside the timed runs
+    count_tokens("warm up")
+
+    bench("legacy split_text (chars)",
+          lambda: legacy_split_text(text, args.chunk_size, args.chunk_overlap), size_bytes)
+    bench("streaming (chars, flat)",
+          lambda: list(iter_split_text([text], args.chunk_size, args.chunk_overlap,
+                                       unit="chars", preserve_paragraphs=False)), size_bytes)
+    bench("streaming (chars, paragraphs)",
+          lambda: list(iter_split_text([text], args.chunk_size, args.chunk_overlap,
+                                       unit="chars", preserve_paragraphs=True)), size_bytes)
+    bench("streaming (tokens, paragraphs)",
+          lambda: list(iter_split_text([text], args.chunk_tokens, args.overlap_tokens,
+                                       unit="tokens", preserve_paragraphs=True)), size_bytes)
+
+if __name__ == "__main__":
+    main()
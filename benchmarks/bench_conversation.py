@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Benchmark the conversation stores.
+Measures append and budgeted-read latency of the in-memory and SQLite
+stores over many concurrent-looking sessions, the way the chat endpoints
+use them (every query reads the history and appends two messages).
+"""
+
+import os
+import sys
+import time
+import random
+import tempfile
+import argparse
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.conversation import ConversationService
+from app.services.conversation_store import MemoryConversationStore, SQLiteConversationStore
+
+def percentile(samples, fraction):
+    """Return the given percentile of a list of samples."""
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+def bench(name, service, sessions, turns, history_tokens, seed=42):
+    """Run a simulated chat workload and print latency percentiles."""
+    rng = random.Random(seed)
+    session_ids = [service.create_session() for _ in range(sessions)]
+    append_times = []
+    read_times = []
+
+    for _ in range(turns):
+        session_id = rng.choice(session_ids)
+
+        start = time.perf_counter()
+        service.get_budgeted_history(session_id, history_tokens)
+        read_times.append(time.perf_counter() - start)
+
+        for role in ("user", "assistant"):
+            content = " ".join(["conversation"] * rng.randint(10, 80))
+            start = time.perf_counter()
+            service.add_message(session_id, role, content)
+            append_times.append(time.perf_counter() - start)
+
+    for label, samples in (("append", append_times), ("read", read_times)):
+        print(f"{name:<10} {label:<7} p50 {percentile(samples, 0.5) * 1e6:9.1f} us"
+              f"   p99 {percentile(samples, 0.99) * 1e6:9.1f} us"
+              f"   {len(samples) / sum(samples):10.0f} ops/s")
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description="Benchmark the conversation stores.")
+    parser.add_argument("--sessions", type=int, default=200, help="Number of sessions")
+    parser.add_argument("--turns", type=int, default=5000, help="Number of question/answer turns")
+    parser.add_argument("--max-messages", type=int, default=200, help="Messages kept per session")
+    parser.add_argument("--history-tokens", type=int, default=1500, help="Token budget of each read")
+
+    args = parser.parse_args()
+
+    bench("memory", ConversationService(MemoryConversationStore(
+        max_messages=args.max_messages, ttl_seconds=3600, max_bytes=256 * 1024 * 1024
+    )), args.sessions, args.turns, args.history_tokens)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        bench("sqlite", ConversationService(SQLiteConversationStore(
+            os.path.join(tmp_dir, "conversations.sqlite"), max_messages=args.max_messages, ttl_seconds=3600
+        )), args.sessions, args.turns, args.history_tokens)
+
+if __name__ == "__main__":
+    main()
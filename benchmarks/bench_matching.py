@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Benchmark skill extraction for profile matching.
+Compares the compiled SkillMatcher with a per-skill substring scan over
+synthetic profiles, for growing skill vocabularies, and times
+match_resources_to_project (the scoring behind /api/match, after the
+documents are read) for thousands of profiles.
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services import document_processor
+from app.services.skill_matcher import DEFAULT_SKILL_TAXONOMY, SkillMatcher
+
+SYLLABLES = ["ka", "lo", "ri", "ten", "vo", "mar", "qui", "zen", "dra", "pel", "sto", "nix", "ul", "bra", "tor"]
+FILLER = ("experienced engineer delivered projects for clients across teams with a focus on "
+          "quality reliability and good communication building systems that scale").split()
+
+def make_vocabulary(size, rng):
+    """The built-in skills plus synthetic one- and two-word skills up to size entries."""
+    vocabulary = {skill: list(synonyms) for skill, synonyms in DEFAULT_SKILL_TAXONOMY.items()}
+    while len(vocabulary) < size:
+        words = ["".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))) for _ in range(rng.randint(1, 2))]
+        vocabulary.setdefault(" ".join(words), [])
+    return vocabulary
+
+def make_profile(vocabulary, words, skills, rng):
+    """Filler text with some skills mentioned."""
+    text = [rng.choice(FILLER) for _ in range(words)]
+    for skill in rng.sample(list(vocabulary), skills):
+        text.insert(rng.randrange(len(text)), skill)
+    return " ".join(text)
+
+def naive_extract(skills, text):
+    """The previous implementation: one substring scan per skill."""
+    text_lower = text.lower()
+    return [skill for skill in skills if skill in text_lower]
+
+def timed(function, *args):
+    """Run a function and return its result and elapsed seconds."""
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description="Benchmark skill extraction for profile matching.")
+    parser.add_argument("--profiles", type=int, default=2000, help="Number of profiles")
+    parser.add_argument("--words", type=int, default=400, help="Words per profile")
+    parser.add_argument("--skills-per-profile", type=int, default=15, help="Skills mentioned per profile")
+    parser.add_argument("--vocabulary", type=int, nargs="+", default=[33, 500, 2000, 5000],
+                        help="Skill vocabulary sizes to test")
+    parser.add_argument("--naive-sample", type=int, default=200,
+                        help="Profiles scanned with the substring baseline (it is slow)")
+
+    args = parser.parse_args()
+    rng = random.Random(42)
+
+    print(f"{args.profiles} profiles of ~{args.words} words, {args.skills_per_profile} skills each\n")
+    print(f"{'skills':>7} {'compile':>9} {'substring':>14} {'compiled':>14} {'speedup':>8} {'match all':>10}")
+
+    for size in args.vocabulary:
+        vocabulary = make_vocabulary(size, rng)
+        profiles = [
+            {"name": f"profile_{i}", "text": make_profile(vocabulary, args.words, args.skills_per_profile, rng)}
+            for i in range(args.profiles)
+        ]
+        sow_text = make_profile(vocabulary, args.words, args.skills_per_profile * 2, rng)
+
+        matcher, compile_time = timed(SkillMatcher, vocabulary)
+
+        sample = profiles[:args.naive_sample]
+        _, naive_time = timed(lambda: [naive_extract(list(vocabulary), p["text"]) for p in sample])
+        _, compiled_time = timed(lambda: [matcher.extract(p["text"]) for p in sample])
+
+        # End-to-end scoring of every profile against the SOW with this vocabulary
+        document_processor.skill_matcher = matcher
+        _, match_time = timed(document_processor.match_resources_to_project, profiles, sow_text)
+
+        print(f"{len(vocabulary):>7} {compile_time * 1000:>7.1f}ms "
+              f"{len(sample) / naive_time:>9.0f} p/s {len(sample) / compiled_time:>9.0f} p/s "
+              f"{naive_time / compiled_time:>7.1f}x {match_time:>9.2f}s")
+
+if __name__ == "__main__":
+    main()
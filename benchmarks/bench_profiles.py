@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Benchmark profile ranking.
+Fills a throwaway profile index with random embeddings and skills and
+times ranking every profile against a SOW, with and without section
+embeddings, compared with the per-profile keyword scoring it replaces.
+"""
+
+import os
+import sys
+import time
+import random
+import tempfile
+import argparse
+import numpy as np
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.document_processor import calculate_match_score, get_matching_skills
+from app.services.profile_index import ProfileIndex
+from app.services.skill_matcher import DEFAULT_SKILL_TAXONOMY
+
+def percentile(samples, fraction):
+    """Return the given percentile of a list of samples."""
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+def fill(index, count, dimension, sections, skills, rng, batch_size=1000):
+    """Add random profiles to the index."""
+    vocabulary = list(DEFAULT_SKILL_TAXONOMY)
+    profiles = []
+    for i in range(count):
+        profiles.append({
+            "id": f"profile_{i}.pdf",
+            "signature": "bench",
+            "skills": rng.sample(vocabulary, skills),
+            "embedding": np.random.standard_normal(dimension).astype(np.float32),
+            "sections": np.random.standard_normal((sections, dimension)).astype(np.float32)
+        })
+        if len(profiles) == batch_size:
+            index.put_many(profiles)
+            profiles = []
+    if profiles:
+        index.put_many(profiles)
+    return vocabulary
+
+def bench(name, index, dimension, requirements, top_k, runs):
+    """Time ranking every profile against random SOW embeddings."""
+    # The first ranking stacks the matrices
+    start = time.perf_counter()
+    index.rank(np.random.standard_normal(dimension), requirements, top_k, 0.3)
+    print(f"{name:<16} first rank (builds matrices) {time.perf_counter() - start:7.3f} s")
+
+    latencies = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        index.rank(np.random.standard_normal(dimension), requirements, top_k, 0.3)
+        latencies.append(time.perf_counter() - start)
+    print(f"{name:<16} rank p50 {percentile(latencies, 0.5) * 1000:7.1f} ms   p99 {percentile(latencies, 0.99) * 1000:7.1f} ms")
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description="Benchmark ranking profiles against a SOW.")
+    parser.add_argument("--profiles", type=int, default=50000, help="Number of profiles")
+    parser.add_argument("--dimension", type=int, default=3072, help="Embedding size")
+    parser.add_argument("--sections", type=int, default=4, help="Section embeddings per profile in the second run")
+    parser.add_argument("--skills", type=int, default=8, help="Skills per profile")
+    parser.add_argument("--top-k", type=int, default=20, help="Matches returned")
+    parser.add_argument("--runs", type=int, default=20, help="Rankings timed")
+
+    args = parser.parse_args()
+    rng = random.Random(42)
+    np.random.seed(42)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        index = ProfileIndex(os.path.join(tmp_dir, "profiles.sqlite"), "bench")
+        start = time.perf_counter()
+        vocabulary = fill(index, args.profiles, args.dimension, 0, args.skills, rng)
+        print(f"Indexed {args.profiles} profiles of dimension {args.dimension} in {time.perf_counter() - start:.1f} s")
+        requirements = rng.sample(vocabulary, 10)
+        bench("whole text", index, args.dimension, requirements, args.top_k, args.runs)
+
+        # The scoring the index replaces: one set intersection per profile
+        profile_skills = [rng.sample(vocabulary, args.skills) for _ in range(args.profiles)]
+        start = time.perf_counter()
+        scores = [
+            (calculate_match_score(skills, requirements), get_matching_skills(skills, requirements))
+            for skills in profile_skills
+        ]
+        sorted(scores, key=lambda item: item[0], reverse=True)
+        print(f"{'keyword only':<16} per-profile sets {(time.perf_counter() - start) * 1000:7.1f} ms (no semantic score)")
+
+    if args.sections:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            index = ProfileIndex(os.path.join(tmp_dir, "profiles.sqlite"), "bench")
+            fill(index, args.profiles, args.dimension, args.sections, args.skills, rng)
+            bench(f"+{args.sections} sections", index, args.dimension, requirements, args.top_k, args.runs)
+
+if __name__ == "__main__":
+    main()
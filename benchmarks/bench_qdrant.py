@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Benchmark Qdrant transports.
+Compares REST and gRPC ingestion throughput and search latency against a
+running Qdrant server (QDRANT_HOST/QDRANT_PORT/QDRANT_GRPC_PORT), using
+random vectors in a throwaway collection.
+"""
+
+import os
+import sys
+import time
+import uuid
+import asyncio
+import argparse
+import numpy as np
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.config import settings
+from app.services.vector_backends import QdrantBackend
+
+def percentile(samples, fraction):
+    """Return the given percentile of a list of samples."""
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+def random_vectors(count, dimension, rng):
+    """Generate unit vectors as lists of floats."""
+    vectors = rng.standard_normal((count, dimension)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors.tolist()
+
+def bench(name, prefer_grpc, vectors, queries, top_k):
+    """Ingest the vectors and run the queries over one transport."""
+    backend = QdrantBackend(collection_name=f"bench_{uuid.uuid4().hex[:8]}", prefer_grpc=prefer_grpc)
+    try:
+        ids = [str(uuid.uuid4()) for _ in vectors]
+        payloads = [{"source": "bench.txt", "chunk_index": i, "text": "x" * 500} for i in range(len(vectors))]
+
+        start = time.perf_counter()
+        backend.add(ids, vectors, payloads)
+        elapsed = time.perf_counter() - start
+        print(f"{name:<6} ingest  {len(vectors) / elapsed:10.0f} points/s ({elapsed:.2f}s)")
+
+        latencies = []
+        for query in queries:
+            start = time.perf_counter()
+            backend.search(query, top_k)
+            latencies.append(time.perf_counter() - start)
+        print(f"{name:<6} search  p50 {percentile(latencies, 0.5) * 1000:7.2f} ms"
+              f"   p99 {percentile(latencies, 0.99) * 1000:7.2f} ms")
+
+        async def concurrent_searches():
+            start = time.perf_counter()
+            await asyncio.gather(*(backend.asearch(query, top_k) for query in queries))
+            elapsed = time.perf_counter() - start
+            await backend.aclose()
+            return elapsed
+
+        elapsed = asyncio.run(concurrent_searches())
+        print(f"{name:<6} async   {len(queries) / elapsed:10.0f} searches/s (all concurrent)")
+
+        start = time.perf_counter()
+        backend.search_batch(queries, top_k)
+        elapsed = time.perf_counter() - start
+        print(f"{name:<6} batch   {len(queries) / elapsed:10.0f} searches/s (one request)")
+    finally:
+        backend.client.delete_collection(backend.collection_name)
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description="Benchmark Qdrant REST and gRPC transports.")
+    parser.add_argument("--points", type=int, default=5000, help="Number of points to ingest")
+    parser.add_argument("--queries", type=int, default=200, help="Number of searches")
+    parser.add_argument("--dimension", type=int, default=settings.QDRANT_VECTOR_SIZE, help="Vector size")
+    parser.add_argument("--top-k", type=int, default=12, help="Results per search")
+
+    args = parser.parse_args()
+
+    settings.QDRANT_VECTOR_SIZE = args.dimension
+    rng = np.random.default_rng(42)
+    vectors = random_vectors(args.points, args.dimension, rng)
+    queries = random_vectors(args.queries, args.dimension, rng)
+    print(f"{args.points} points, {args.queries} queries, dimension {args.dimension}, "
+          f"upsert batches of {settings.QDRANT_UPSERT_BATCH_SIZE} x{settings.QDRANT_UPSERT_PARALLELISM}")
+
+    bench("rest", False, vectors, queries, args.top_k)
+    bench("grpc", True, vectors, queries, args.top_k)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Recall versus memory report for vector quantization and shortened embeddings.
+Simulates Qdrant's scalar (int8) and binary quantization, with and without
+rescoring, at several embedding sizes, and compares each configuration's
+top-k against exact float32 search at full size. Vectors come from the
+configured vector database (--from-store) or are random.
+
+Shortened text-embedding-3 embeddings are equivalent to truncating the full
+embedding and re-normalizing it, which is what the simulation does.
+"""
+
+import os
+import sys
+import argparse
+import numpy as np
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Approximate HNSW graph links per point (m=16, 4-byte IDs, two layers' worth)
+HNSW_BYTES_PER_POINT = 16 * 2 * 4
+
+def normalize(vectors):
+    """L2-normalize rows."""
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+def top_k(scores, k):
+    """Indexes of the k best scores of each row, best first."""
+    k = min(k, scores.shape[1])
+    candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(scores, candidates, axis=1), axis=1)
+    return np.take_along_axis(candidates, order, axis=1)
+
+def scalar_quantize(vectors, quantile=0.99):
+    """Quantize to int8 codes over the central quantile of values, as Qdrant does, and dequantize."""
+    tail = (1 - quantile) / 2
+    low, high = np.quantile(vectors, [tail, 1 - tail])
+    scale = (high - low) / 255
+    codes = np.clip(np.round((vectors - low) / scale), 0, 255)
+    return codes * scale + low
+
+def binary_quantize(vectors):
+    """Quantize to one sign bit per dimension (as +/-1)."""
+    return np.where(vectors > 0, 1.0, -1.0)
+
+def search(base, queries, k, quantization, rescore, oversampling):
+    """Approximate top-k of each query under a quantization scheme."""
+    if quantization == "none":
+        return top_k(queries @ base.T, k)
+
+    if quantization == "scalar":
+        approximate = queries @ scalar_quantize(base).T
+    else:
+        approximate = binary_quantize(queries) @ binary_quantize(base).T
+
+    if not rescore:
+        return top_k(approximate, k)
+
+    # Re-score the oversampled candidates with the original vectors
+    candidates = top_k(approximate, int(k * oversampling))
+    exact = np.einsum("qd,qcd->qc", queries, base[candidates])
+    return np.take_along_axis(candidates, top_k(exact, k), axis=1)
+
+def recall(found, truth):
+    """Mean fraction of the true top-k found."""
+    return np.mean([len(set(f) & set(t)) / len(t) for f, t in zip(found.tolist(), truth.tolist())])
+
+def memory_per_point(dimension, quantization, on_disk):
+    """Bytes of RAM per point: originals (unless on disk), quantized copy and HNSW links."""
+    original = 0 if on_disk else dimension * 4
+    quantized = {"none": 0, "scalar": dimension, "binary": dimension / 8}[quantization]
+    return original + quantized + HNSW_BYTES_PER_POINT
+
+def load_store_vectors(limit):
+    """Read up to limit vectors from the configured vector database."""
+    from app.services.vector_store import vector_store
+
+    ids = []
+    for point_id, _ in vector_store.backend.iter_payloads():
+        ids.append(point_id)
+        if len(ids) >= limit:
+            break
+
+    vectors = []
+    for i in range(0, len(ids), 256):
+        vectors.extend(point["vector"] for point in vector_store.backend.retrieve(ids[i:i+256], with_vectors=True))
+    return np.asarray(vectors, dtype=np.float32)
+
+def main():
+    """Run the report."""
+    parser = argparse.ArgumentParser(description="Report recall versus memory of quantization settings.")
+    parser.add_argument("--from-store", action="store_true", help="Use vectors from the configured vector database")
+    parser.add_argument("--points", type=int, default=20000, help="Number of vectors (random or read from the store)")
+    parser.add_argument("--dimension", type=int, default=3072, help="Full vector size for random vectors")
+    parser.add_argument("--queries", type=int, default=200, help="Held-out vectors used as queries")
+    parser.add_argument("--top-k", type=int, default=12, help="Results per search")
+    parser.add_argument("--oversampling", type=float, default=2.0, help="Candidates per result when rescoring")
+    parser.add_argument("--dimensions", type=int, nargs="+", default=[3072, 1536, 1024, 512, 256],
+                        help="Shortened embedding sizes to evaluate")
+    parser.add_argument("--collection-size", type=int, default=1000000, help="Points used for the total memory column")
+
+    args = parser.parse_args()
+
+    if args.from_store:
+        vectors = load_store_vectors(args.points + args.queries)
+    else:
+        vectors = np.random.default_rng(42).standard_normal((args.points + args.queries, args.dimension)).astype(np.float32)
+    if len(vectors) <= args.queries:
+        print(f"Need more than {args.queries} vectors, found {len(vectors)}")
+        sys.exit(1)
+
+    queries, base = normalize(vectors[:args.queries]), normalize(vectors[args.queries:])
+    truth = top_k(queries @ base.T, args.top_k)
+    full = base.shape[1]
+    print(f"{len(base)} points, {len(queries)} queries, recall@{args.top_k} against exact float32 search at {full} dimensions\n")
+    print(f"{'dims':>5} {'quantization':<12} {'rescore':<8} {'recall':>7} "
+          f"{'RAM/point':>10} {'on-disk originals':>18} {'RAM @ ' + format(args.collection_size, ','):>14}")
+
+    for dimension in sorted({d for d in args.dimensions if d <= full}, reverse=True):
+        shortened_base = normalize(base[:, :dimension])
+        shortened_queries = normalize(queries[:, :dimension])
+        for quantization, rescore in (("none", False), ("scalar", False), ("scalar", True), ("binary", False), ("binary", True)):
+            found = search(shortened_base, shortened_queries, args.top_k, quantization, rescore, args.oversampling)
+            in_ram = memory_per_point(dimension, quantization, on_disk=False)
+            # Originals can only move to disk when a quantized copy serves the search
+            on_disk = memory_per_point(dimension, quantization, on_disk=True) if quantization != "none" else in_ram
+            print(f"{dimension:>5} {quantization:<12} {'yes' if rescore else 'no':<8} {recall(found, truth):>7.3f} "
+                  f"{in_ram / 1024:>8.2f}KB {on_disk / 1024:>16.2f}KB "
+                  f"{on_disk * args.collection_size / 1024 ** 3:>12.2f}GB")
+
+if __name__ == "__main__":
+    main()
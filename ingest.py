@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+Bulk-ingest a directory of documents using every core.
+"""
+
+import os
+import sys
+import argparse
+import asyncio
+from dotenv import load_dotenv
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+# Load environment variables
+load_dotenv()
+
+from app.services.rag_service import rag_service
+
+def main():
+    """Main function to ingest a directory."""
+    parser = argparse.ArgumentParser(description="Ingest all documents in a directory.")
+    parser.add_argument("directory", help="Directory containing PDF, DOCX and TXT files")
+    parser.add_argument("--workers", type=int, default=None, help="Parser processes (default: number of CPUs)")
+
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.directory):
+        print(f"Not a directory: {args.directory}")
+        sys.exit(1)
+
+    report = asyncio.run(rag_service.aprocess_directory(args.directory, max_workers=args.workers))
+
+    if report["errors"]:
+        print("\nFailed documents:")
+        for error in report["errors"]:
+            print(f"  {error['file']}: {error['error']}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Re-embed a Qdrant collection into a new collection.
+
+Needed when the vector size changes (EMBEDDING_DIMENSIONS or a different
+embedding model); quantization and on-disk storage changes are applied to
+existing collections in place on startup and need no migration. Point IDs
+and payloads are kept, so the chunk store, BM25 index and ingest manifest
+stay valid. The new collection is created with the current quantization
+settings.
+"""
+
+import os
+import sys
+import argparse
+from dotenv import load_dotenv
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+# Load environment variables
+load_dotenv()
+
+from app.core.config import settings
+from app.services.azure_openai import azure_openai_service
+from app.services.chunk_store import create_chunk_store
+from app.services.vector_backends import QdrantBackend
+
+def iter_batches(client, collection_name, batch_size):
+    """Yield lists of points (with payloads, without vectors) from a collection."""
+    offset = None
+    while True:
+        points, offset = client.scroll(
+            collection_name=collection_name,
+            limit=batch_size,
+            offset=offset,
+            with_payload=True,
+            with_vectors=False
+        )
+        if points:
+            yield points
+        if offset is None:
+            return
+
+def main():
+    """Main function to migrate a collection."""
+    parser = argparse.ArgumentParser(description="Re-embed a Qdrant collection into a new collection.")
+    parser.add_argument("target", help="Name of the collection to create")
+    parser.add_argument("--source", default=settings.QDRANT_COLLECTION_NAME, help="Collection to read")
+    parser.add_argument("--dimensions", type=int, default=settings.EMBEDDING_DIMENSIONS,
+                        help="Embedding dimensions to request (0 = model default)")
+    parser.add_argument("--vector-size", type=int, default=None,
+                        help="Vector size of the new collection (default: --dimensions, or QDRANT_VECTOR_SIZE)")
+    parser.add_argument("--batch-size", type=int, default=256, help="Points re-embedded per batch")
+
+    args = parser.parse_args()
+
+    if args.target == args.source:
+        print("The target collection must differ from the source collection")
+        sys.exit(1)
+
+    settings.EMBEDDING_DIMENSIONS = args.dimensions
+    settings.QDRANT_VECTOR_SIZE = args.vector_size or args.dimensions or settings.QDRANT_VECTOR_SIZE
+    print(f"Migrating {args.source} -> {args.target} ({settings.QDRANT_VECTOR_SIZE} dimensions, "
+          f"quantization={settings.QDRANT_QUANTIZATION}, on_disk={settings.QDRANT_ON_DISK_VECTORS})")
+
+    target = QdrantBackend(collection_name=args.target)
+    chunk_store = create_chunk_store()
+    migrated = 0
+    failed = 0
+
+    for points in iter_batches(target.client, args.source, args.batch_size):
+        ids = [str(point.id) for point in points]
+        stored = chunk_store.get_many(ids) if chunk_store is not None else {}
+
+        batch_ids, texts, payloads = [], [], []
+        for point_id, point in zip(ids, points):
+            text = stored.get(point_id) or (point.payload or {}).get("text")
+            if not text:
+                failed += 1
+                continue
+            batch_ids.append(point_id)
+            texts.append(text)
+            payloads.append(point.payload or {})
+
+        embeddings = azure_openai_service.generate_embeddings(texts)
+        # Zero vectors are embedding errors; leave those points out
+        kept = [i for i, embedding in enumerate(embeddings) if any(embedding)]
+        failed += len(texts) - len(kept)
+        target.add(
+            [batch_ids[i] for i in kept],
+            [embeddings[i] for i in kept],
+            [payloads[i] for i in kept]
+        )
+        migrated += len(kept)
+        print(f"Migrated {migrated} points")
+
+    print(f"\nDone: {migrated} points migrated, {failed} skipped (no text or embedding error)")
+    print(f"Switch over by setting QDRANT_COLLECTION_NAME={args.target}, "
+          f"QDRANT_VECTOR_SIZE={settings.QDRANT_VECTOR_SIZE} and EMBEDDING_DIMENSIONS={args.dimensions}, "
+          f"then delete {args.source} once the new collection checks out")
+    if failed:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
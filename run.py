@@ -6,6 +6,7 @@ Script to run the RAG chatbot locally for testing.
 import os
 import argparse
 import subprocess
+import sys
 import time
 import webbrowser
 from dotenv import load_dotenv
@@ -20,6 +21,11 @@ def run_api():
     print("API server running at http://localhost:8000")
     print("API documentation available at http://localhost:8000/docs")
 
+def run_worker():
+    """Run the ingestion worker, which processes uploaded documents."""
+    print("Starting ingestion worker...")
+    subprocess.Popen([sys.executable, "-m", "app.worker"])
+
 def run_frontend():
     """Run the Streamlit frontend."""
     print("Starting frontend...")
@@ -69,6 +75,7 @@ def main():
     parser = argparse.ArgumentParser(description="Run the RAG chatbot locally.")
     parser.add_argument("--no-qdrant", action="store_true", help="Don't start Qdrant")
     parser.add_argument("--no-api", action="store_true", help="Don't start API server")
+    parser.add_argument("--no-worker", action="store_true", help="Don't start ingestion worker")
     parser.add_argument("--no-frontend", action="store_true", help="Don't start frontend")
     parser.add_argument("--no-browser", action="store_true", help="Don't open browser")
     
@@ -87,6 +94,10 @@ def main():
     if not args.no_api:
         run_api()
     
+    # Start ingestion worker
+    if not args.no_worker:
+        run_worker()
+    
     # Start frontend
     if not args.no_frontend:
         run_frontend()
@@ -5,7 +5,17 @@ Test script for RAG functionality.
 
 import os
 import sys
+import asyncio
+import json
+import tempfile
+import sqlite3
+import threading
+import time
+import uuid
 import unittest
+from unittest.mock import patch
+import openai
+import numpy as np
 from dotenv import load_dotenv
 
 # Add parent directory to path for imports
@@ -14,11 +24,20 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 # Load environment variables
 load_dotenv()
 
-from app.services.document_processor import process_document, read_document
-from app.services.vector_store import vector_store
+from app.core.config import Settings, settings
+from app.services.document_processor import process_document, read_document, split_text, iter_split_text
+from app.services.vector_store import vector_store, is_identifier_query, mmr_order, make_filters
+from app.services.lexical_index import BM25Index, tokenize
 from app.services.azure_openai import azure_openai_service
-from app.services.conversation import conversation_service
+from app.services.conversation import conversation_service, ConversationService
+from app.services.conversation_store import MemoryConversationStore, SQLiteConversationStore
 from app.services.rag_service import rag_service
+from app.services.embedding_cache import EmbeddingCache
+from app.services.ttl_cache import TTLCache
+from app.services.answer_cache import SemanticAnswerCache
+from app.services.corpus_version import create_corpus_version
+from app.services.chunk_store import ChunkStore
+from app.services.tokenizer import count_tokens
 
 class TestRAG(unittest.TestCase):
     """Test cases for RAG functionality."""
@@ -49,6 +68,60 @@ class TestRAG(unittest.TestCase):
         self.assertGreater(len(chunks), 0)
         self.assertEqual(len(chunks), len(metadatas))
     
+    def test_streaming_chunking(self):
+        """Test that streamed blocks chunk exactly like the joined text."""
+        pages = [f"Page {i} starts here. It ends mid" for i in range(50)]
+        joined = "".join(page + "\n\n" for page in pages)
+        self.assertEqual(
+            list(iter_split_text(page + "\n\n" for page in pages)),
+            split_text(joined)
+        )
+        
+        # Text without sentence boundaries is cut at whitespace instead of piling up
+        words = ("word " * 20000 for _ in range(50))
+        chunks = list(iter_split_text(words, 500, 0, unit="chars"))
+        self.assertEqual(sum(chunk.count("word") for chunk in chunks), 20000 * 50)
+        self.assertTrue(all(len(chunk) <= 501 for chunk in chunks))
+        
+        # Documents are upserted batch by batch rather than in one call
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file_path = os.path.join(tmp_dir, f"streamed_{uuid.uuid4().hex}.txt")
+            with open(file_path, "w", encoding="utf-8") as file:
+                for i in range(400):
+                    file.write(f"Streaming sentence {i} for the ingestion pipeline.\n")
+            
+            with patch.object(settings, "INGEST_BATCH_SIZE", 8), \
+                    patch.object(vector_store, "add_documents", wraps=vector_store.add_documents) as add:
+                self.assertTrue(rag_service.process_and_store_document(file_path))
+            
+            chunks, _ = process_document(file_path)
+            self.assertEqual(add.call_count, -(-len(chunks) // 8))
+            rag_service.remove_document(os.path.basename(file_path))
+    
+    def test_chunk_size_units(self):
+        """Test token-sized chunks and paragraph-aware splitting."""
+        paragraphs = [
+            " ".join(f"Paragraph {p} sentence {s} talks about cloud migration." for s in range(6))
+            for p in range(10)
+        ]
+        text = "\n\n".join(paragraphs)
+        
+        # Token-sized chunks stay within the token budget
+        chunks = list(iter_split_text([text], 60, 10, unit="tokens"))
+        self.assertGreater(len(chunks), 1)
+        for chunk in chunks:
+            self.assertLessEqual(count_tokens(chunk), 60)
+        
+        # Paragraphs that fit in a chunk are never split across chunks
+        chunks = list(iter_split_text([text], 1000, 0, preserve_paragraphs=True))
+        for paragraph in paragraphs:
+            self.assertTrue(any(paragraph in chunk for chunk in chunks))
+        self.assertIn("\n\n", chunks[0])
+        
+        # Without paragraph preservation chunks are flat, as before
+        chunks = list(iter_split_text([text], 1000, 0, preserve_paragraphs=False))
+        self.assertFalse(any("\n" in chunk for chunk in chunks))
+    
     def test_vector_store(self):
         """Test vector store functionality."""
         # Process and store a document
@@ -87,6 +160,460 @@ class TestRAG(unittest.TestCase):
         self.assertIsNotNone(response)
         self.assertGreater(len(response), 0)
     
+    def test_concurrent_embeddings(self):
+        """Test that concurrent embedding batches keep input order."""
+        texts = [f"Test sentence number {i}" for i in range(40)]
+        expected = [[float(i), 1.0] for i in range(40)]
+        
+        def delay(batch_texts):
+            # Earlier batches take longer, so batches complete out of order
+            return 0.002 * (40 - int(batch_texts[0].split()[-1]))
+        
+        def embed_batch(batch_texts):
+            time.sleep(delay(batch_texts))
+            return [[float(text.split()[-1]), 1.0] for text in batch_texts]
+        
+        async def aembed_batch(batch_texts):
+            await asyncio.sleep(delay(batch_texts))
+            return [[float(text.split()[-1]), 1.0] for text in batch_texts]
+        
+        with patch.object(azure_openai_service, "embedding_cache", None), \
+                patch.object(settings, "EMBEDDING_BATCH_SIZE", 4), \
+                patch.object(azure_openai_service, "_embed_batch", embed_batch), \
+                patch.object(azure_openai_service, "_aembed_batch", aembed_batch):
+            self.assertEqual(azure_openai_service.generate_embeddings(texts), expected)
+            self.assertEqual(asyncio.run(azure_openai_service.agenerate_embeddings(texts)), expected)
+    
+    def test_embedding_cache(self):
+        """Test the persistent embedding cache and its LRU eviction."""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cache = EmbeddingCache(os.path.join(tmp_dir, "cache.sqlite"), max_entries=2)
+            keys = [EmbeddingCache.make_key("model", text) for text in ["a", "b", "c"]]
+            
+            cache.put_many({keys[0]: [1.0, 2.0]})
+            cache.put_many({keys[1]: [3.0, 4.0]})
+            # Recent entries are not touched again, so hits don't write
+            with patch.object(cache, "_transaction", side_effect=AssertionError):
+                cache.get_many([keys[0]])
+            with patch.object(EmbeddingCache, "TOUCH_INTERVAL_SECONDS", 0):
+                cache.get_many([keys[0]])  # Touch "a" so "b" becomes least recently used
+            cache.put_many({keys[2]: [5.0, 6.0]})
+            
+            found = cache.get_many(keys)
+            self.assertEqual(len(cache), 2)
+            self.assertEqual(found[keys[0]], [1.0, 2.0])
+            self.assertNotIn(keys[1], found)
+            
+            # The cache survives reopening
+            reopened = EmbeddingCache(os.path.join(tmp_dir, "cache.sqlite"), max_entries=2)
+            self.assertEqual(reopened.get_many([keys[2]])[keys[2]], [5.0, 6.0])
+    
+    def test_query_cache(self):
+        """Test the in-process TTL/LRU cache used for query embeddings."""
+        cache = TTLCache(max_entries=2, ttl_seconds=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        self.assertEqual(cache.get("a"), 1)
+        cache.set("c", 3)  # Evicts "b", the least recently used
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.stats()["hits"], 1)
+        self.assertEqual(cache.stats()["misses"], 1)
+        
+        expired = TTLCache(max_entries=2, ttl_seconds=0)
+        expired.set("a", 1)
+        self.assertIsNone(expired.get("a"))
+        
+        # Repeated queries skip the embedding call
+        query = "When was TechInnovate Solutions founded?"
+        first = vector_store.embed_query(query)
+        hits = vector_store.query_cache.hits
+        second = vector_store.embed_query("  when was TechInnovate Solutions founded? ")
+        self.assertEqual(first, second)
+        self.assertEqual(vector_store.query_cache.hits, hits + 1)
+    
+    def test_answer_cache(self):
+        """Test the semantic answer cache and its invalidation."""
+        cache = SemanticAnswerCache(max_entries=2, ttl_seconds=60, threshold=0.9)
+        cache.set([1.0, 0.0], ["a", "b"], 1, "first answer")
+        
+        # Similar query over the same chunks and corpus version hits
+        self.assertEqual(cache.get([0.99, 0.05], ["b", "a"], 1), "first answer")
+        # Dissimilar query, other chunks or a newer corpus miss
+        self.assertIsNone(cache.get([0.0, 1.0], ["a", "b"], 1))
+        self.assertIsNone(cache.get([1.0, 0.0], ["a"], 1))
+        self.assertIsNone(cache.get([1.0, 0.0], ["a", "b"], 2))
+        self.assertEqual(cache.stats()["hits"], 1)
+        self.assertEqual(cache.stats()["misses"], 3)
+        
+        cache.set([0.0, 1.0], ["c"], 1, "second answer")
+        cache.set([1.0, 1.0], ["d"], 1, "third answer")
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get([1.0, 0.0], ["a", "b"], 1))
+        
+        # Asking the same question twice only generates one answer
+        if rag_service.answer_cache is None:
+            return
+        session_id = conversation_service.create_session()
+        query = "Which cloud platforms does TechInnovate Solutions work with?"
+        with patch.object(azure_openai_service, "generate_rag_response",
+                          wraps=azure_openai_service.generate_rag_response) as generate:
+            first = rag_service.query(query, session_id)
+            second = rag_service.query(query, conversation_service.create_session())
+            self.assertFalse(first["cached"])
+            self.assertTrue(second["cached"])
+            self.assertEqual(first["response"], second["response"])
+            self.assertEqual(generate.call_count, 1)
+            
+            # Opting out, or changing the corpus, generates again
+            self.assertFalse(rag_service.query(query, conversation_service.create_session(), use_cache=False)["cached"])
+            vector_store.delete_documents(["00000000-0000-0000-0000-000000000000"])
+            self.assertFalse(rag_service.query(query, conversation_service.create_session())["cached"])
+            self.assertEqual(generate.call_count, 3)
+            
+            # So does a change made by another process, e.g. the ingestion worker
+            create_corpus_version().bump()
+            self.assertFalse(rag_service.query(query, conversation_service.create_session())["cached"])
+            self.assertEqual(generate.call_count, 4)
+    
+    def test_faiss_backend(self):
+        """Test the in-process FAISS vector backend and its persistence."""
+        from app.services.faiss_backend import FaissBackend
+        
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            backend = FaissBackend(tmp_dir, dimension=4)
+            backend.add(
+                ["a", "b", "c"],
+                [[1, 0, 0, 0], [0, 1, 0, 0], [1, 1, 0, 0]],
+                [{"source": "x.txt"}, {"source": "y.txt"}, {"source": "x.txt"}]
+            )
+            results = backend.search([1, 0, 0, 0], top_k=2)
+            self.assertEqual([r["id"] for r in results], ["a", "c"])
+            self.assertAlmostEqual(results[0]["score"], 1.0, places=5)
+            backend.persist()
+            
+            # Reload from disk (memory-mapped) and mutate
+            reloaded = FaissBackend(tmp_dir, dimension=4)
+            self.assertEqual(reloaded.count(), 3)
+            reloaded.delete_by_source("x.txt")
+            self.assertEqual(reloaded.count(), 1)
+            self.assertEqual(reloaded.search([1, 0, 0, 0], top_k=3)[0]["id"], "b")
+            
+            # Changes are committed to the log; a snapshot replaces the index file
+            self.assertEqual(FaissBackend(tmp_dir, dimension=4).count(), 1)
+            with patch.object(FaissBackend, "SNAPSHOT_MIN_CHANGES", 0):
+                reloaded.persist()
+            self.assertEqual(sorted(f for f in os.listdir(tmp_dir) if f.endswith(".faiss")), ["index.1.faiss"])
+            snapshot = FaissBackend(tmp_dir, dimension=4)
+            self.assertEqual([r["id"] for r in snapshot.search([0, 1, 0, 0], top_k=3)], ["b"])
+            self.assertEqual(snapshot.retrieve(["b"])[0]["payload"], {"source": "y.txt"})
+    
+    def test_faiss_ivf(self):
+        """Test migration to an IVF index, its snapshot and the change log replayed on top of it."""
+        from app.services.faiss_backend import FaissBackend
+        
+        vectors = np.random.default_rng(0).random((90, 4), dtype=np.float32).tolist()
+        ids = [f"p{i}" for i in range(90)]
+        with tempfile.TemporaryDirectory() as tmp_dir, \
+                patch.object(settings, "FAISS_IVF_NLIST", 2), \
+                patch.object(settings, "FAISS_IVF_NPROBE", 2):
+            backend = FaissBackend(tmp_dir, dimension=4, index_type="ivf")
+            backend.add(ids[:70], vectors[:70], [{"source": "a.txt"}] * 70)
+            self.assertFalse(backend._is_ivf)
+            # 2 lists need 78 training points; training writes a snapshot at once
+            backend.add(ids[70:], vectors[70:], [{"source": "b.txt"}] * 20)
+            self.assertTrue(backend._is_ivf)
+            self.assertTrue(os.path.exists(os.path.join(tmp_dir, "index.1.faiss")))
+            backend.delete_by_source("b.txt")
+            backend.add(["extra"], [[0, 0, 0, 1]], [{"source": "c.txt"}])
+            
+            reloaded = FaissBackend(tmp_dir, dimension=4, index_type="ivf")
+            self.assertTrue(reloaded._is_ivf)
+            self.assertEqual(reloaded.count(), 71)
+            self.assertEqual(reloaded.search(vectors[5], top_k=1)[0]["id"], "p5")
+            self.assertEqual(
+                [r["id"] for r in reloaded.search([0, 0, 0, 1], top_k=3, filters={"source": ["c.txt"]})],
+                ["extra"]
+            )
+            self.assertEqual(reloaded.search(vectors[80], top_k=3, filters={"source": ["b.txt"]}), [])
+    
+    def test_faiss_shared_index(self):
+        """Test two processes' backends on one index directory seeing each other's changes."""
+        from app.services.faiss_backend import FaissBackend
+        
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            writer = FaissBackend(tmp_dir, dimension=4)
+            reader = FaissBackend(tmp_dir, dimension=4)
+            writer.add(["a", "b"], [[1, 0, 0, 0], [0, 1, 0, 0]], [{"source": "x.txt"}, {"source": "y.txt"}])
+            self.assertEqual(reader.count(), 2)
+            self.assertEqual(reader.search([0, 1, 0, 0], top_k=1, filters={"source": ["y.txt"]})[0]["id"], "b")
+            
+            # Writes from either side build on the other's, without reusing point IDs
+            reader.add(["c"], [[0, 0, 1, 0]], [{"source": "x.txt"}])
+            writer.add(["a"], [[0, 0, 0, 1]], [{"source": "x.txt"}])
+            self.assertEqual(len({writer._int_ids[point_id] for point_id in "abc"}), 3)
+            reader.delete_by_source("y.txt")
+            self.assertEqual([r["id"] for r in writer.retrieve(["a", "b", "c"])], ["a", "c"])
+            self.assertEqual(writer.search([0, 0, 0, 1], top_k=1)[0]["id"], "a")
+            
+            # A snapshot by one side includes the other's changes and makes the other reload
+            with patch.object(FaissBackend, "SNAPSHOT_MIN_CHANGES", 0):
+                writer.persist()
+            self.assertEqual(reader.count(), 2)
+            self.assertEqual(reader._generation, writer._generation)
+            self.assertEqual(FaissBackend(tmp_dir, dimension=4).retrieve(["c"])[0]["payload"], {"source": "x.txt"})
+    
+    def test_qdrant_backend(self):
+        """Test sub-batched parallel upserts and batch search on a local in-process Qdrant."""
+        from app.services.vector_backends import QdrantBackend
+        
+        with patch.object(settings, "QDRANT_VECTOR_SIZE", 4), \
+                patch.object(settings, "QDRANT_UPSERT_BATCH_SIZE", 2):
+            backend = QdrantBackend(collection_name="test_documents", location=":memory:")
+            ids = [str(uuid.uuid4()) for _ in range(5)]
+            vectors = [[1, 0, 0, 0], [0, 1, 0, 0], [0, 0, 1, 0], [0, 0, 0, 1], [1, 1, 0, 0]]
+            with patch.object(backend.client, "upsert", wraps=backend.client.upsert) as upsert:
+                backend.add(ids, vectors, [{"source": f"{i}.txt"} for i in range(5)])
+            self.assertEqual(upsert.call_count, 3)
+            self.assertEqual(backend.count(), 5)
+            
+            results = backend.search_batch([[1, 0, 0, 0], [0, 0, 0, 1]], top_k=2)
+            self.assertEqual([r["id"] for r in results[0]], [ids[0], ids[4]])
+            self.assertEqual(results[1][0]["id"], ids[3])
+            self.assertEqual(asyncio.run(backend.asearch([0, 1, 0, 0], top_k=1))[0]["id"], ids[1])
+            
+            # Server clients are kept per event loop, closed by aclose() and dropped once their loop has ended
+            async def client_of_loop(close: bool):
+                client = backend._aclient()
+                self.assertIs(backend._aclient(), client)
+                if close:
+                    with patch.object(client, "close", wraps=client.close) as close_client:
+                        await backend.aclose()
+                    close_client.assert_called_once()
+                return client
+            
+            with patch.object(backend, "_client_options", {"host": "localhost", "port": 6333}):
+                first = asyncio.run(client_of_loop(close=False))
+                self.assertIsNot(asyncio.run(client_of_loop(close=True)), first)
+            self.assertEqual(len(backend._async_clients), 0)
+    
+    def test_vector_compression(self):
+        """Test shortened embeddings, quantization settings and dimension mismatch detection."""
+        from app.services.faiss_backend import FaissBackend
+        from app.services.vector_backends import QdrantBackend
+        
+        response = {"data": [{"embedding": [0.5] * 256}]}
+        with patch.object(settings, "EMBEDDING_DIMENSIONS", 256), \
+                patch.object(openai.Embedding, "create", return_value=response) as create:
+            embeddings = azure_openai_service.generate_embeddings(["A shortened embedding test"])
+            self.assertEqual(create.call_args.kwargs["dimensions"], 256)
+            self.assertEqual(len(embeddings[0]), 256)
+            shortened_key = azure_openai_service.embedding_model_key()
+        # Cached embeddings of another size are never reused
+        self.assertNotEqual(shortened_key, azure_openai_service.embedding_model_key())
+        
+        # The vector size follows EMBEDDING_DIMENSIONS and may not contradict it
+        with patch.dict(os.environ, {}, clear=True):
+            self.assertEqual(Settings(_env_file=None).QDRANT_VECTOR_SIZE, 3072)
+            self.assertEqual(Settings(_env_file=None, EMBEDDING_DIMENSIONS=256).QDRANT_VECTOR_SIZE, 256)
+            self.assertRaises(ValueError, Settings, _env_file=None, EMBEDDING_DIMENSIONS=256, QDRANT_VECTOR_SIZE=3072)
+        with patch.object(settings, "EMBEDDING_DIMENSIONS", 256), \
+                patch.object(openai.Embedding, "create", side_effect=RuntimeError("unavailable")):
+            self.assertEqual(len(azure_openai_service._embed_batch(["Fallback"])[0]), 256)
+        
+        with patch.object(settings, "QDRANT_QUANTIZATION", "scalar"):
+            self.assertEqual(QdrantBackend._quantization_config().scalar.type, "int8")
+        with patch.object(settings, "QDRANT_QUANTIZATION", "binary"):
+            self.assertIsNotNone(QdrantBackend._quantization_config().binary)
+        with patch.object(settings, "QDRANT_QUANTIZATION", "product"):
+            self.assertRaises(ValueError, QdrantBackend._quantization_config)
+        
+        with patch.object(settings, "QDRANT_VECTOR_SIZE", 4), \
+                patch.object(settings, "QDRANT_QUANTIZATION", "binary"), \
+                patch.object(settings, "QDRANT_ON_DISK_VECTORS", True):
+            backend = QdrantBackend(collection_name="test_quantized", location=":memory:")
+            backend.add([str(uuid.uuid4())], [[1, 0, 0, 0]], [{"source": "q.txt"}])
+            self.assertEqual(len(backend.search([1, 0, 0, 0], top_k=1)), 1)
+        with patch.object(settings, "QDRANT_VECTOR_SIZE", 8):
+            self.assertRaises(ValueError, backend._ensure_collection_exists)
+        
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            faiss_backend = FaissBackend(tmp_dir, dimension=4)
+            faiss_backend.add(["a"], [[1, 0, 0, 0]], [{"source": "x.txt"}])
+            faiss_backend.persist()
+            self.assertRaises(ValueError, FaissBackend, tmp_dir, 8)
+    
+    def test_chunk_store(self):
+        """Test that chunk texts live in the chunk store and are read in bulk for final results."""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            store = ChunkStore(os.path.join(tmp_dir, "chunks.sqlite"))
+            store.put_many(["a", "b"], ["First chunk.", "Zweiter Abschnitt, café."], ["x.txt", "y.txt"])
+            self.assertEqual(store.get_many(["b", "a", "missing"]), {"a": "First chunk.", "b": "Zweiter Abschnitt, café."})
+            store.delete_by_source("x.txt")
+            self.assertEqual(len(store), 1)
+        
+        if vector_store.chunk_store is None:
+            return
+        
+        texts = [f"Chunk store test passage {i} about quarterly infrastructure reviews." for i in range(3)]
+        metadatas = [{"source": "chunk_store_test.txt", "chunk_index": i * 10, "file_path": "/tmp/chunk_store_test.txt"} for i in range(3)]
+        ids = vector_store.add_documents(texts, metadatas)
+        try:
+            # The vector database keeps only the minimal payload
+            for point in vector_store.backend.retrieve(ids):
+                self.assertEqual(set(point["payload"]), {"source", "chunk_index"})
+            
+            with patch.object(vector_store.chunk_store, "get_many", wraps=vector_store.chunk_store.get_many) as get_many:
+                found, found_metadatas, _ = vector_store.search("quarterly infrastructure reviews", top_k=2, lexical_weight=0)
+            get_many.assert_called_once()
+            self.assertEqual(len(found), 2)
+            for text in found:
+                self.assertIn(text, texts)
+            self.assertEqual(vector_store.get_document_by_id(ids[0])["metadata"]["text"], texts[0])
+        finally:
+            vector_store.delete_documents(ids)
+        self.assertEqual(vector_store.chunk_store.get_many(ids), {})
+    
+    def test_hybrid_search(self):
+        """Test the BM25 index, rank fusion and the identifier fast path."""
+        self.assertEqual(tokenize("SOW-2023-014 for the Cloud"), ["sow-2023-014", "sow", "2023", "014", "cloud"])
+        
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "bm25.sqlite")
+            index = BM25Index(path)
+            index.add(
+                ["a", "b", "c"],
+                ["Kubernetes migration plan", "Budget for SOW-2023-014", "Kubernetes kubernetes cluster"],
+                [{"source": "x.txt"}, {"source": "y.txt"}, {"source": "x.txt"}]
+            )
+            self.assertEqual(index.search("kubernetes", 3)[0][0], "c")
+            self.assertEqual([point_id for point_id, _ in index.search("sow-2023-014", 3)], ["b"])
+            
+            # Every change is committed; a second handle sees it without a reload
+            reloaded = BM25Index(path)
+            self.assertEqual(len(reloaded), 3)
+            reloaded.delete_by_source("x.txt")
+            self.assertEqual(reloaded.search("kubernetes", 3), [])
+            self.assertEqual(index.search("kubernetes", 3), [])
+        
+        if vector_store.lexical_index is None:
+            return
+        
+        self.assertTrue(is_identifier_query("SOW-7731-QX budget?"))
+        self.assertFalse(is_identifier_query("When was TechInnovate Solutions founded?"))
+        
+        texts = ["Statement of work SOW-7731-QX covers the data platform rollout.",
+                 "The data platform rollout is planned for the spring."]
+        # Chunk indexes far apart, so the passages are not merged as neighbours
+        metadatas = [{"source": "hybrid_test.txt", "chunk_index": i * 10, "text": text} for i, text in enumerate(texts)]
+        ids = vector_store.add_documents(texts, metadatas)
+        try:
+            # Identifier lookups are answered by BM25 without embedding the query
+            with patch.object(vector_store, "embed_query") as embed:
+                found, found_metadatas, _ = vector_store.search("SOW-7731-QX", top_k=2)
+                embed.assert_not_called()
+            self.assertEqual(found[0], texts[0])
+            
+            # Hybrid search surfaces the exact identifier match among dense results
+            found, _, _ = vector_store.search("what does statement SOW-7731-QX cover for the platform", top_k=3, lexical_weight=0.5)
+            self.assertIn(texts[0], found)
+        finally:
+            vector_store.delete_documents(ids)
+        self.assertEqual(vector_store.lexical_index.search("SOW-7731-QX", 3), [])
+    
+    def test_filtered_search(self):
+        """Test that source and document type filters restrict every retrieval path."""
+        from app.services.faiss_backend import FaissBackend
+        from app.services.vector_backends import QdrantBackend
+        
+        self.assertEqual(make_filters(["a.pdf"], [".PDF"]), {"source": ["a.pdf"], "doc_type": ["pdf"]})
+        self.assertIsNone(make_filters([], None))
+        
+        vectors = [[1, 0, 0, 0], [0.9, 0.1, 0, 0], [0.8, 0.2, 0, 0]]
+        payloads = [
+            {"source": "a.pdf", "doc_type": "pdf"},
+            {"source": "b.txt", "doc_type": "txt"},
+            {"source": "c.pdf", "doc_type": "pdf"}
+        ]
+        filters = {"doc_type": ["pdf"], "source": ["c.pdf", "b.txt"]}
+        
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            backend = FaissBackend(tmp_dir, dimension=4)
+            backend.add(["a", "b", "c"], vectors, payloads)
+            self.assertEqual([r["id"] for r in backend.search([1, 0, 0, 0], top_k=3, filters=filters)], ["c"])
+            self.assertEqual(backend.search([1, 0, 0, 0], top_k=3, filters={"source": ["missing.txt"]}), [])
+            self.assertEqual(
+                [[r["id"] for r in row] for row in backend.search_batch([[1, 0, 0, 0]] * 2, 3, filters={"doc_type": ["pdf"]})],
+                [["a", "c"], ["a", "c"]]
+            )
+            # The filter index follows removals and re-added points
+            backend.delete_by_source("a.pdf")
+            backend.add(["b"], [vectors[1]], [{"source": "b.pdf", "doc_type": "pdf"}])
+            self.assertEqual([r["id"] for r in backend.search([1, 0, 0, 0], top_k=3, filters={"doc_type": ["pdf"]})], ["b", "c"])
+            self.assertEqual(backend.search([1, 0, 0, 0], top_k=3, filters={"doc_type": ["txt"]}), [])
+        
+        with patch.object(settings, "QDRANT_VECTOR_SIZE", 4):
+            backend = QdrantBackend(collection_name="test_filters", location=":memory:")
+            ids = [str(uuid.uuid4()) for _ in range(3)]
+            backend.add(ids, vectors, payloads)
+            self.assertEqual([r["id"] for r in backend.search([1, 0, 0, 0], top_k=3, filters=filters)], [ids[2]])
+            self.assertEqual(
+                [r["id"] for r in backend.search_batch([[1, 0, 0, 0]], 3, filters={"doc_type": ["pdf"]})[0]],
+                [ids[0], ids[2]]
+            )
+        
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            index = BM25Index(os.path.join(tmp_dir, "bm25.sqlite"))
+            index.add(["a", "b"], ["kubernetes plan", "kubernetes kubernetes"], payloads[:2])
+            self.assertEqual([point_id for point_id, _ in index.search("kubernetes", 3, {"doc_type": ["pdf"]})], ["a"])
+            self.assertEqual(index.search("kubernetes", 3, {"source": ["b.txt", "c.pdf"]})[0][0], "b")
+        
+        texts = ["The filtered rollout covers the data platform.", "The filtered rollout covers the data platform too."]
+        metadatas = [
+            {"source": "filter_test.pdf", "doc_type": "pdf", "chunk_index": 0},
+            {"source": "filter_test.txt", "doc_type": "txt", "chunk_index": 0}
+        ]
+        ids = vector_store.add_documents(texts, metadatas)
+        try:
+            _, found_metadatas, _ = vector_store.search(
+                "filtered rollout", top_k=2, lexical_weight=0.5, filters=make_filters(doc_types=["txt"])
+            )
+            self.assertEqual([m["source"] for m in found_metadatas], ["filter_test.txt"])
+            _, found_metadatas, _ = vector_store.search(
+                "filtered rollout", top_k=2, lexical_weight=0, filters=make_filters(sources=["filter_test.pdf"])
+            )
+            self.assertEqual([m["source"] for m in found_metadatas], ["filter_test.pdf"])
+        finally:
+            vector_store.delete_documents(ids)
+    
+    def test_diversity_reranking(self):
+        """Test MMR ordering and merging of adjacent chunks."""
+        relevance = np.array([1.0, 0.99, 0.6])
+        vectors = np.array([[1.0, 0.0], [0.999, 0.01], [0.0, 1.0]])
+        # The near-duplicate of the top result drops behind the distinct one
+        self.assertEqual(mmr_order(relevance, vectors, 0.5), [0, 2, 1])
+        self.assertEqual(mmr_order(relevance, vectors, 1.0), [0, 1, 2])
+        
+        results = [
+            {"id": "b", "score": 0.9, "payload": {"source": "x.txt", "chunk_index": 1,
+                                                  "text": "Second sentence. Third sentence."}},
+            {"id": "a", "score": 0.8, "payload": {"source": "x.txt", "chunk_index": 0,
+                                                  "text": "First sentence. Second sentence."}},
+            {"id": "c", "score": 0.7, "payload": {"source": "y.txt", "chunk_index": 0, "text": "Other."}},
+            {"id": "d", "score": 0.6, "payload": {"source": "x.txt", "chunk_index": 7, "text": "Later."}}
+        ]
+        with patch.object(settings, "MMR_ENABLED", False):
+            passages = vector_store._rerank(results, top_k=2)
+        
+        # The overlapping neighbours become one passage, freeing a slot
+        self.assertEqual([passage["id"] for passage in passages], ["b", "c"])
+        self.assertEqual(passages[0]["payload"]["text"], "First sentence. Second sentence. Third sentence.")
+        self.assertEqual(passages[0]["payload"]["chunk_index"], 0)
+        # Merge bookkeeping does not leak into the results
+        self.assertNotIn("last_chunk_index", passages[0]["payload"])
+        self.assertEqual(set(passages[0]), {"id", "score", "payload"})
+        # Backend payloads are left untouched
+        self.assertEqual(results[0]["payload"]["chunk_index"], 1)
+    
     def test_conversation(self):
         """Test conversation functionality."""
         # Add messages to conversation
@@ -107,6 +634,114 @@ class TestRAG(unittest.TestCase):
         self.assertIsNotNone(formatted_history)
         self.assertGreater(len(formatted_history), 0)
     
+    def test_history_budget(self):
+        """Test token-budgeted history and rolling summary compaction."""
+        session_id = conversation_service.create_session()
+        for i in range(30):
+            conversation_service.add_message(session_id, "user", f"Question {i} about the cloud migration project timeline?")
+            conversation_service.add_message(session_id, "assistant", f"Answer {i}: the migration runs in phases over several months.")
+        
+        with patch.object(settings, "PROMPT_HISTORY_TOKENS", 200):
+            history, tokens = conversation_service.get_budgeted_history(session_id, 200)
+            self.assertLessEqual(tokens, 200)
+            self.assertLess(len(history), 60)
+            self.assertIn("Answer 29", history[-1]["content"])
+            
+            with patch.object(azure_openai_service, "summarize_conversation", return_value="Earlier questions covered the migration.") as summarize:
+                self.assertTrue(rag_service.compact_history(session_id))
+                # Nothing left to compact until the history grows again
+                self.assertFalse(rag_service.compact_history(session_id))
+            self.assertEqual(summarize.call_count, 1)
+            self.assertIn("Question 0 ", summarize.call_args[0][1][0]["content"])
+            
+            history, tokens = conversation_service.get_budgeted_history(session_id, 200)
+            self.assertLessEqual(tokens, 200)
+            self.assertEqual(history[0]["role"], "system")
+            self.assertIn("Earlier questions covered the migration.", history[0]["content"])
+            self.assertIn("Answer 29", history[-1]["content"])
+            
+            # A synchronous query answers without waiting for the summary
+            for i in range(30, 40):
+                conversation_service.add_message(session_id, "user", f"Question {i} about the cloud migration project timeline?")
+            release = threading.Event()
+            futures = []
+            submit = rag_service._submit_compaction
+            with patch.object(azure_openai_service, "summarize_conversation",
+                              side_effect=lambda *args: release.wait(5) and "Later questions covered the migration."), \
+                    patch.object(rag_service, "_submit_compaction", side_effect=lambda *args: futures.append(submit(*args))):
+                rag_service.query("When does the migration end?", session_id, use_cache=False)
+                self.assertFalse(futures[0].done())
+                release.set()
+                self.assertTrue(futures[0].result(timeout=5))
+        
+        # Retrieved context is cut to what is left of the prompt budget
+        texts = [f"Chunk {i} " + "details " * 100 for i in range(5)]
+        metadatas = [{"source": "doc.txt", "chunk_index": i} for i in range(5)]
+        with patch.object(settings, "PROMPT_TOKEN_BUDGET", azure_openai_service.rag_prompt_tokens() + 400):
+            retrieval = rag_service._format_retrieval("question", [], 0, 0, "question", texts, metadatas, [1.0] * 5)
+        self.assertGreater(len(retrieval["sources"]), 0)
+        self.assertLess(len(retrieval["sources"]), 5)
+        self.assertLessEqual(count_tokens(retrieval["context"]), 400)
+        conversation_service.delete_session(session_id)
+    
+    def test_conversation_store(self):
+        """Test the ring buffer, summary invalidation, eviction and sharing of conversation stores."""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "conversations.sqlite")
+            stores = [
+                MemoryConversationStore(max_messages=4, ttl_seconds=60, max_bytes=10 ** 6),
+                SQLiteConversationStore(path, max_messages=4, ttl_seconds=60)
+            ]
+            for store in stores:
+                service = ConversationService(store)
+                session_id = service.create_session()
+                for i in range(6):
+                    service.add_message(session_id, "user", f"Message {i}")
+                
+                # Only the newest messages are kept
+                history = service.get_conversation_history(session_id)
+                self.assertEqual([msg["content"] for msg in history], [f"Message {i}" for i in range(2, 6)])
+                self.assertEqual(service.format_history_for_prompt(session_id, 2), "Human: Message 4\n\nHuman: Message 5")
+                
+                # Summary positions are sequence numbers, stable as the buffer rolls over
+                compaction = service.get_compaction(session_id, 20)
+                self.assertEqual(compaction["messages"][0]["content"], "Message 2")
+                self.assertTrue(service.set_summary(session_id, "Earlier messages", compaction["upto"]))
+                self.assertFalse(service.set_summary(session_id, "Stale", compaction["upto"]))
+                history, _ = service.get_budgeted_history(session_id, 1000)
+                self.assertIn("Earlier messages", history[0]["content"])
+                self.assertEqual(history[-1]["content"], "Message 5")
+                
+                # A summary computed before the session was cleared is rejected
+                compaction = service.get_compaction(session_id, 1)
+                self.assertTrue(service.clear_conversation(session_id))
+                for i in range(6):
+                    service.add_message(session_id, "user", f"New message {i}")
+                self.assertFalse(service.set_summary(session_id, "Stale", compaction["upto"]))
+                
+                self.assertIn(session_id, service.get_all_sessions())
+                self.assertTrue(service.delete_session(session_id))
+                self.assertEqual(service.get_conversation_history(session_id), [])
+            
+            # Every worker opening the same database sees the same sessions
+            first = ConversationService(SQLiteConversationStore(path, max_messages=4, ttl_seconds=60))
+            second = ConversationService(SQLiteConversationStore(path, max_messages=4, ttl_seconds=60))
+            session_id = first.create_session()
+            first.add_message(session_id, "user", "Asked on one worker")
+            second.add_message(session_id, "assistant", "Answered on another")
+            self.assertEqual(len(first.get_conversation_history(session_id)), 2)
+        
+        # Idle sessions expire, and the memory cap evicts the least recently used
+        store = MemoryConversationStore(max_messages=10, ttl_seconds=0.05, max_bytes=10 ** 6)
+        store.append("idle", ("user", "hello", "", 1))
+        time.sleep(0.1)
+        self.assertIsNone(store.load("idle"))
+        
+        store = MemoryConversationStore(max_messages=10, ttl_seconds=60, max_bytes=1000)
+        for i in range(5):
+            store.append(f"session-{i}", ("user", "x" * 300, "", 1))
+        self.assertEqual(store.session_ids(), ["session-3", "session-4"])
+    
     def test_rag_query(self):
         """Test RAG query functionality."""
         # Process and store a document
@@ -122,6 +757,451 @@ class TestRAG(unittest.TestCase):
         self.assertGreater(len(result["response"]), 0)
         self.assertIsNotNone(result["sources"])
     
+    def test_rag_stream_query(self):
+        """Test streaming RAG query functionality."""
+        session_id = conversation_service.create_session()
+        
+        async def collect():
+            return [event async for event in rag_service.stream_query("What does TechInnovate do?", session_id)]
+        
+        # Conversation store calls run in worker threads, not on the event loop
+        threads = []
+        get_history = conversation_service.get_budgeted_history
+        
+        def record_thread(*args, **kwargs):
+            threads.append(threading.current_thread())
+            return get_history(*args, **kwargs)
+        
+        with patch.object(conversation_service, "get_budgeted_history", record_thread):
+            events = asyncio.run(collect())
+        self.assertTrue(threads)
+        self.assertNotIn(threading.main_thread(), threads)
+        self.assertEqual(events[0]["event"], "sources")
+        self.assertEqual(events[-1]["event"], "done")
+        
+        # History is committed once the stream completes
+        history = conversation_service.get_conversation_history(session_id)
+        self.assertEqual(len(history), 2)
+        self.assertEqual(history[1]["content"], events[-1]["data"]["response"])
+    
+    def test_concurrent_queries(self):
+        """Test that concurrent queries don't block each other on the event loop."""
+        async def slow_embedding(**kwargs):
+            await asyncio.sleep(0.2)
+            return {"data": [{"embedding": [0.1] * settings.QDRANT_VECTOR_SIZE} for _ in kwargs["input"]]}
+        
+        async def slow_completion(**kwargs):
+            await asyncio.sleep(0.5)
+            return {"choices": [{"message": {"content": "ok"}}]}
+        
+        async def run_queries(count):
+            start = time.perf_counter()
+            await asyncio.gather(*(
+                rag_service.aquery(f"Concurrent question {uuid.uuid4()}", conversation_service.create_session())
+                for _ in range(count)
+            ))
+            return time.perf_counter() - start
+        
+        with patch.object(openai.Embedding, "acreate", slow_embedding), \
+                patch.object(openai.ChatCompletion, "acreate", slow_completion):
+            single = asyncio.run(run_queries(1))
+            concurrent = asyncio.run(run_queries(10))
+        
+        # Ten concurrent queries should take about as long as one
+        self.assertLess(concurrent, single * 2)
+    
+    def test_batch_query(self):
+        """Test that batch queries share embedding and search requests and keep their order."""
+        embedding_calls = []
+        in_flight = []
+        peak = []
+        
+        async def counting_embedding(**kwargs):
+            embedding_calls.append(len(kwargs["input"]))
+            return {"data": [{"embedding": [0.1] * settings.QDRANT_VECTOR_SIZE} for _ in kwargs["input"]]}
+        
+        async def tracking_completion(**kwargs):
+            question = kwargs["messages"][-1]["content"]
+            in_flight.append(question)
+            peak.append(len(in_flight))
+            await asyncio.sleep(0.05)
+            in_flight.remove(question)
+            if "unanswerable" in question:
+                raise RuntimeError("model unavailable")
+            return {"choices": [{"message": {"content": f"answer to {question}"}}]}
+        
+        queries = [f"Batch question {i} {uuid.uuid4()}" for i in range(6)]
+        queries[3] = f"An unanswerable question {uuid.uuid4()}"
+        
+        with patch.object(openai.Embedding, "acreate", counting_embedding), \
+                patch.object(openai.ChatCompletion, "acreate", tracking_completion), \
+                patch.object(vector_store.backend, "search_batch", wraps=vector_store.backend.search_batch) as search_batch:
+            results = asyncio.run(rag_service.aquery_batch(queries, top_k=2, lexical_weight=0, max_concurrency=2))
+        
+        self.assertEqual(embedding_calls, [len(queries)])
+        search_batch.assert_called_once()
+        self.assertLessEqual(max(peak), 2)
+        
+        self.assertEqual([result["query"] for result in results], queries)
+        for i, result in enumerate(results):
+            if i == 3:
+                self.assertIn("model unavailable", result["error"])
+            else:
+                self.assertIsNone(result["error"])
+                self.assertEqual(result["response"], f"answer to {queries[i]}")
+    
+    def test_speculative_retrieval(self):
+        """Test that speculative retrieval is reused only when the rewrite is unchanged."""
+        session_id = conversation_service.create_session()
+        conversation_service.add_message(session_id, "user", "Tell me about TechInnovate")
+        conversation_service.add_message(session_id, "assistant", "TechInnovate is a software company.")
+        
+        searched = []
+        
+        async def fake_search(query, top_k=3, lexical_weight=None, filters=None):
+            searched.append(query)
+            return [], [], []
+        
+        async def rewrite(query, conversation_history):
+            await asyncio.sleep(0.01)  # Stand-in for the LLM round trip
+            return rewrites[query]
+        
+        rewrites = {
+            "When was TechInnovate founded?": "when was techinnovate founded",
+            "When was it founded?": "When was TechInnovate Solutions founded?"
+        }
+        
+        with patch.object(settings, "SPECULATIVE_RETRIEVAL", True), \
+                patch.object(vector_store, "asearch", fake_search), \
+                patch.object(azure_openai_service, "acontextualize_query", rewrite):
+            result = asyncio.run(rag_service._aretrieve("When was TechInnovate founded?", session_id, 3))
+            self.assertEqual(searched, ["When was TechInnovate founded?"])
+            self.assertEqual(result["contextualized_query"], "when was techinnovate founded")
+            
+            searched.clear()
+            asyncio.run(rag_service._aretrieve("When was it founded?", session_id, 3))
+            self.assertEqual(searched, ["When was it founded?", "When was TechInnovate Solutions founded?"])
+    
+    def test_incremental_reingestion(self):
+        """Test that re-ingesting a file is idempotent and only touches changed chunks."""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file_path = os.path.join(tmp_dir, f"reingest_{uuid.uuid4().hex}.txt")
+            source = os.path.basename(file_path)
+            sentences = [f"Sentence number {i} about project delivery." for i in range(60)]
+            with open(file_path, "w", encoding="utf-8") as file:
+                file.write(" ".join(sentences))
+            
+            self.assertTrue(rag_service.process_and_store_document(file_path))
+            count = vector_store.count()
+            first_ids = set(rag_service.ingest_manifest.get(source)["chunks"])
+            
+            # Unchanged file: nothing is added
+            with patch.object(vector_store, "add_documents", wraps=vector_store.add_documents) as add:
+                self.assertTrue(rag_service.process_and_store_document(file_path))
+                add.assert_not_called()
+            self.assertEqual(vector_store.count(), count)
+            
+            # Changed tail: earlier chunks keep their IDs, the collection doesn't grow twice
+            with open(file_path, "w", encoding="utf-8") as file:
+                file.write(" ".join(sentences[:50] + ["A brand new closing sentence."]))
+            self.assertTrue(rag_service.process_and_store_document(file_path))
+            second_ids = set(rag_service.ingest_manifest.get(source)["chunks"])
+            self.assertTrue(first_ids & second_ids)
+            self.assertEqual(vector_store.count(), count - len(first_ids) + len(second_ids))
+            
+            # A new version without text removes the old chunks
+            with open(file_path, "w", encoding="utf-8") as file:
+                file.write("   ")
+            self.assertFalse(rag_service.process_and_store_document(file_path))
+            self.assertIsNone(rag_service.ingest_manifest.get(source))
+            self.assertEqual(vector_store.count(), count - len(first_ids))
+    
+    def test_clear_documents(self):
+        """Test that clearing the documents also forgets what was ingested."""
+        from app.services.ingest_manifest import IngestManifest
+        from app.services.document_cache import DocumentCache
+        from app.services.profile_index import ProfileIndex
+        
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            manifest = IngestManifest(os.path.join(tmp_dir, "manifest.sqlite"))
+            manifest.put("a.txt", "hash", {"point": 0})
+            document_cache = DocumentCache(os.path.join(tmp_dir, "documents.sqlite"))
+            document_cache.put("uploads/a.txt", 1, 1, "text", "", [])
+            profile_index = ProfileIndex(os.path.join(tmp_dir, "profiles.sqlite"), "model")
+            profile_index.put_many([{"id": "p.pdf", "signature": "1", "skills": [], "embedding": [1, 0], "sections": []}])
+            
+            with patch.object(rag_service, "ingest_manifest", manifest), \
+                    patch.object(rag_service, "document_cache", document_cache), \
+                    patch.object(rag_service, "profile_index", profile_index), \
+                    patch.object(vector_store, "clear_collection", return_value=True) as clear_collection:
+                self.assertTrue(rag_service.clear_documents())
+            clear_collection.assert_called_once()
+            self.assertIsNone(manifest.get("a.txt"))
+            self.assertEqual(len(document_cache), 0)
+            self.assertEqual(len(profile_index), 0)
+    
+    def test_parallel_directory_ingestion(self):
+        """Test multi-process directory ingestion and its report."""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for filename in os.listdir(self.sample_dir):
+                with open(os.path.join(self.sample_dir, filename), encoding="utf-8") as src, \
+                        open(os.path.join(tmp_dir, f"parallel_{filename}"), "w", encoding="utf-8") as dst:
+                    dst.write(src.read())
+            with open(os.path.join(tmp_dir, "broken.pdf"), "wb") as file:
+                file.write(b"not a pdf")
+            
+            progress = []
+            report = asyncio.run(rag_service.aprocess_directory(tmp_dir, max_workers=2, progress_callback=progress.append))
+            self.assertEqual(report["total"], 4)
+            self.assertEqual(report["successful"], 3)
+            self.assertEqual([error["file"] for error in report["errors"]], ["broken.pdf"])
+            self.assertEqual(len(progress), 4)
+            
+            # A second run finds every file unchanged
+            report = asyncio.run(rag_service.aprocess_directory(tmp_dir, max_workers=2))
+            self.assertEqual(report["skipped"], 3)
+            
+            for filename in os.listdir(self.sample_dir):
+                rag_service.remove_document(f"parallel_{filename}")
+    
+    def test_skill_matcher(self):
+        """Test whole-word skill matching with synonyms and a loaded taxonomy."""
+        from app.services.skill_matcher import SkillMatcher, create_skill_matcher
+        
+        matcher = create_skill_matcher("")
+        self.assertEqual(matcher.extract("A good JavaScript developer"), ["javascript"])
+        self.assertEqual(
+            matcher.extract("Golang, C++ and C# on K8s; Machine-Learning and node.js"),
+            ["c++", "c#", "go", "node.js", "kubernetes", "machine learning"]
+        )
+        
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "skills.json")
+            with open(path, "w", encoding="utf-8") as file:
+                json.dump({"postgresql": ["postgres", "psql"], "site reliability": ["sre"]}, file)
+            matcher = create_skill_matcher(path)
+        self.assertEqual(len(matcher), 2)
+        self.assertEqual(matcher.extract("SRE work on Postgres"), ["postgresql", "site reliability"])
+        self.assertEqual(SkillMatcher({}).extract("anything"), [])
+    
+    def test_document_cache(self):
+        """Test that unchanged documents are never parsed twice."""
+        from app.services.document_cache import DocumentCache
+        from app.services.skill_matcher import skill_matcher
+        
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file_path = os.path.join(tmp_dir, "cv.txt")
+            with open(file_path, "w", encoding="utf-8") as file:
+                file.write("Python and Docker engineer")
+            
+            with patch.object(rag_service, "document_cache", DocumentCache(os.path.join(tmp_dir, "cache.sqlite"))), \
+                    patch("app.services.rag_service.read_document", wraps=read_document) as parse:
+                self.assertEqual(rag_service.read_parsed(file_path), ("Python and Docker engineer", ["python", "docker"]))
+                rag_service.read_parsed(file_path)
+                self.assertEqual(parse.call_count, 1)
+                
+                # A new taxonomy re-extracts skills from the cached text
+                with patch.object(skill_matcher, "fingerprint", "other"):
+                    rag_service.read_parsed(file_path)
+                self.assertEqual(parse.call_count, 1)
+                
+                # A re-uploaded file is parsed again
+                with open(file_path, "w", encoding="utf-8") as file:
+                    file.write("Rust engineer")
+                self.assertEqual(rag_service.read_parsed(file_path), ("Rust engineer", ["rust"]))
+                self.assertEqual(parse.call_count, 2)
+                
+                rag_service.forget_parsed(file_path)
+                rag_service.read_parsed(file_path)
+                self.assertEqual(parse.call_count, 3)
+    
+    def test_job_queue(self):
+        """Test the persistent ingestion queue, its admission control and recovery."""
+        from app.services.job_queue import JobQueue, JobQueueFullError
+        
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "jobs.sqlite")
+            jobs = JobQueue(path, max_pending=2, stale_seconds=60, max_attempts=2)
+            first = jobs.submit("uploads/a.pdf")
+            # A document already waiting is not queued twice
+            self.assertEqual(jobs.submit("uploads/a.pdf")["id"], first["id"])
+            jobs.submit("uploads/b.pdf")
+            self.assertTrue(jobs.is_full())
+            with self.assertRaises(JobQueueFullError):
+                jobs.submit("uploads/c.pdf")
+            
+            job = jobs.claim()
+            self.assertEqual((job["id"], job["status"], job["stage"]), (first["id"], "running", "parsing"))
+            # A re-upload of a document being ingested waits for the running job
+            jobs.submit("uploads/a.pdf")
+            self.assertEqual(jobs.claim()["document_id"], "b.pdf")
+            self.assertIsNone(jobs.claim())
+            
+            self.assertTrue(jobs.update(job["id"], job["attempts"], stage="embedding", chunks=10, stored=4))
+            self.assertEqual(jobs.get(job["id"])["stored"], 4)
+            # Updates need the token of the current claim
+            self.assertFalse(jobs.update(job["id"], job["attempts"] + 1, stored=9))
+            self.assertFalse(jobs.finish(job["id"], job["attempts"] - 1, False))
+            self.assertTrue(jobs.finish(job["id"], job["attempts"], True))
+            self.assertEqual(jobs.get(job["id"])["stage"], "done")
+            self.assertFalse(jobs.update(job["id"], job["attempts"], error="late"))
+            self.assertEqual(jobs.claim()["document_id"], "a.pdf")
+            self.assertEqual(jobs.counts(), {"succeeded": 1, "running": 2})
+            
+            # Jobs of a dead process are retried once silent, then given up
+            restarted = JobQueue(path, max_pending=2, stale_seconds=0, max_attempts=2)
+            reclaimed = restarted.claim()
+            self.assertEqual(reclaimed["attempts"], 2)
+            restarted.claim()
+            self.assertIsNone(restarted.claim())
+            failed = restarted.list_jobs(status="failed")
+            self.assertEqual(len(failed), 2)
+            self.assertIn("Abandoned", failed[0]["error"])
+            
+            # A long-running job keeps its claim through heartbeats alone
+            jobs = JobQueue(os.path.join(tmp_dir, "beats.sqlite"), max_pending=2, stale_seconds=0.4)
+            jobs.submit("uploads/slow.pdf")
+            jobs.start(lambda job, report: time.sleep(1.2) or True, workers=1)
+            try:
+                time.sleep(0.8)
+                # Any other worker would see a live job
+                self.assertIsNone(jobs.claim())
+            finally:
+                jobs.stop(timeout=5)
+            self.assertEqual(jobs.counts(), {"succeeded": 1})
+            
+            # A database error while finishing leaves the job to be reclaimed; the worker carries on
+            jobs = JobQueue(os.path.join(tmp_dir, "locked.sqlite"), max_pending=2, stale_seconds=60)
+            jobs.submit("uploads/locked.pdf")
+            jobs.submit("uploads/next.pdf")
+            finish = jobs.finish
+            errors = [sqlite3.OperationalError("database is locked")]
+            
+            def flaky_finish(*args):
+                if errors:
+                    raise errors.pop()
+                return finish(*args)
+            
+            with patch.object(jobs, "finish", side_effect=flaky_finish):
+                jobs.start(lambda job, report: True, workers=1)
+                try:
+                    deadline = time.time() + 5
+                    while jobs.counts().get("succeeded") != 1 and time.time() < deadline:
+                        time.sleep(0.05)
+                finally:
+                    jobs.stop(timeout=5)
+            self.assertEqual(jobs.counts(), {"running": 1, "succeeded": 1})
+    
+    def test_upload_queueing(self):
+        """Test that an upload replaces the stored document only once its job is queued."""
+        from app.api.routes import queue_upload
+        from app.services.job_queue import JobQueue, JobQueueFullError
+        
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            jobs = JobQueue(os.path.join(tmp_dir, "jobs.sqlite"), max_pending=1)
+            file_path = os.path.join(tmp_dir, "report.txt")
+            
+            def upload(content):
+                temp_path = f"{file_path}.{uuid.uuid4().hex}.part"
+                with open(temp_path, "w", encoding="utf-8") as file:
+                    file.write(content)
+                return queue_upload(temp_path, file_path)
+            
+            with patch.object(rag_service, "job_queue", jobs):
+                job = upload("first version")
+                # A re-upload while waiting replaces the file but keeps the job
+                self.assertEqual(upload("second version")["id"], job["id"])
+                
+                # Queue full: the stored document is left alone
+                self.assertEqual(jobs.claim()["id"], job["id"])
+                jobs.submit(os.path.join(tmp_dir, "other.txt"))
+                with self.assertRaises(JobQueueFullError):
+                    upload("rejected version")
+            
+            with open(file_path, encoding="utf-8") as file:
+                self.assertEqual(file.read(), "second version")
+            self.assertEqual([name for name in os.listdir(tmp_dir) if name.endswith(".part")], [])
+    
+    def test_job_workers(self):
+        """Test that job workers ingest queued documents and report each stage."""
+        from app.services.job_queue import JobQueue
+        
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file_paths = []
+            for name in ("staged", "queued"):
+                file_path = os.path.join(tmp_dir, f"{name}_{uuid.uuid4().hex}.txt")
+                with open(file_path, "w", encoding="utf-8") as file:
+                    file.write(f"Ingestion job test {uuid.uuid4().hex}. " * 20)
+                file_paths.append(file_path)
+            self.addCleanup(lambda: [rag_service.remove_document(os.path.basename(p)) for p in file_paths])
+            
+            stages = []
+            self.assertTrue(rag_service.process_and_store_document(
+                file_paths[0], progress=lambda **update: stages.append(update.get("stage"))
+            ))
+            self.assertEqual(
+                [stage for stage in dict.fromkeys(stages) if stage],
+                ["parsing", "chunking", "embedding", "upserting"]
+            )
+            
+            jobs = JobQueue(os.path.join(tmp_dir, "jobs.sqlite"), max_pending=10)
+            done = jobs.submit(file_paths[1])
+            missing = jobs.submit(os.path.join(tmp_dir, "missing.pdf"))
+            
+            with patch.object(rag_service, "job_queue", jobs):
+                rag_service.start_job_workers(workers=2)
+                try:
+                    deadline = time.time() + 30
+                    while jobs.counts().get("queued") or jobs.counts().get("running"):
+                        self.assertLess(time.time(), deadline)
+                        time.sleep(0.05)
+                finally:
+                    rag_service.stop_job_workers()
+            
+            job = jobs.get(done["id"])
+            self.assertEqual((job["status"], job["stage"]), ("succeeded", "done"))
+            self.assertGreater(job["chunks"], 0)
+            job = jobs.get(missing["id"])
+            self.assertEqual(job["status"], "failed")
+            self.assertIn("no longer exists", job["error"])
+    
+    def test_profile_index(self):
+        """Test vectorized profile ranking with blended keyword scores and sections."""
+        from app.services.profile_index import ProfileIndex
+        
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "profiles.sqlite")
+            index = ProfileIndex(path, "model-a")
+            index.put_many([
+                {"id": "near.pdf", "signature": "1", "skills": ["python"], "embedding": [1, 0, 0], "sections": []},
+                {"id": "skilled.pdf", "signature": "2", "skills": ["python", "aws"], "embedding": [0.6, 0.8, 0], "sections": []},
+                {"id": "section.pdf", "signature": "3", "skills": [], "embedding": [0, 0, 1], "sections": [[0.9, 0.1, 0]]}
+            ])
+            
+            # Semantic only: the best section counts for the whole profile
+            matches = index.rank([1, 0, 0], ["python", "aws"], top_k=3, keyword_weight=0)
+            self.assertEqual([m["name"] for m in matches], ["near.pdf", "section.pdf", "skilled.pdf"])
+            
+            # Keyword matches can overtake semantic similarity
+            matches = index.rank([1, 0, 0], ["python", "aws"], top_k=2, keyword_weight=0.8)
+            self.assertEqual(matches[0]["name"], "skilled.pdf")
+            self.assertEqual(matches[0]["matching_skills"], ["python", "aws"])
+            self.assertAlmostEqual(matches[0]["keyword_score"], 1.0)
+            
+            matches = index.rank([1, 0, 0], [], top_k=5, keyword_weight=0.3, profile_ids=["skilled.pdf", "missing.pdf"])
+            self.assertEqual([m["name"] for m in matches], ["skilled.pdf"])
+            
+            index.delete(["near.pdf"])
+            self.assertEqual(len(ProfileIndex(path, "model-a")), 2)
+            self.assertEqual(ProfileIndex(path, "model-a").signatures()["section.pdf"], "3")
+            # Profiles indexed by another process show up in rankings
+            ProfileIndex(path, "model-a").put_many([
+                {"id": "other.pdf", "signature": "4", "skills": [], "embedding": [1, 0, 0], "sections": []}
+            ])
+            self.assertEqual(index.rank([1, 0, 0], [], top_k=1, keyword_weight=0)[0]["name"], "other.pdf")
+            # Embeddings of another model are not used
+            self.assertEqual(len(ProfileIndex(path, "model-b")), 0)
+    
     def test_profile_matching(self):
         """Test profile matching functionality."""
         # Match profiles to SOW
@@ -133,6 +1213,11 @@ class TestRAG(unittest.TestCase):
         self.assertGreater(len(matches), 0)
         self.assertIn("match_score", matches[0])
         self.assertIn("matching_skills", matches[0])
+        
+        # Indexed profiles are ranked without listing them
+        matches = rag_service.match_profiles_to_sow(None, self.project_sow, top_k=1)
+        self.assertEqual(len(matches), 1)
+        self.assertIn("semantic_score", matches[0])
 
 if __name__ == "__main__":
     unittest.main()